@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# Local stand-in for an NRTM source used to exercise ripedb.nrtm.
+# A journal of ADD/DEL changes is served over NRTMv3 (TCP, -q sources and -g queries)
+# and NRTMv4 (HTTP notification file, snapshots and deltas), every publish() makes a new NRTMv4 version.
+#
+#   python benchmarks/nrtm_server.py --port 4444 --http-port 8081
+#   python benchmarks/nrtm_server.py --fixtures fixtures.db --source TEST
+
+import argparse, hashlib, json, os, re, socketserver, sys, threading, uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ripedb.objects.schema import initial_schemas
+from ripedb.rpsl import format_rpsl, iter_rpsl_objects, open_dump
+
+query_re = re.compile(r'^-g\s+([^:\s]+):3:(\d+)-(\d+|LAST)$', re.IGNORECASE)
+delta_re = re.compile(r'^/nrtm/(snapshot|delta)\.(\d+)\.json$')
+
+
+class NrtmJournal():
+    def __init__(self, source = 'TEST'):
+        self.source = source.upper()
+        self.session_id = str(uuid.uuid4())
+        # (serial, action, object type, key, text), serials start at 1
+        self.changes = []
+        # last serial of every NRTMv4 version
+        self.versions = []
+        self._schemas = initial_schemas(None)
+        self._lock = threading.Lock()
+
+    def _key(self, attributes):
+        object_type = attributes[0][0]
+        schema = self._schemas.get(object_type)
+        names = schema.primary_key if schema is not None and schema.primary_key else [object_type]
+        return object_type, ''.join(next((value for name, value in attributes if name == key_name), '') for key_name in names)
+
+    def _append(self, action, attributes):
+        attributes = [attr[:2] for attr in attributes]
+        object_type, key = self._key(attributes)
+        with self._lock:
+            serial = len(self.changes) + 1
+            self.changes.append((serial, action, object_type, key, format_rpsl(attributes)))
+            return serial
+
+    def add(self, attributes):
+        return self._append('ADD', attributes)
+
+    def delete(self, attributes):
+        return self._append('DEL', attributes)
+
+    def load(self, objects):
+        for attributes in objects:
+            self.add(attributes)
+        return self.publish()
+
+    def publish(self):
+        with self._lock:
+            last = len(self.changes)
+            if not self.versions or self.versions[-1] != last:
+                self.versions.append(last)
+            return len(self.versions)
+
+    def serial_range(self):
+        with self._lock:
+            return 1, len(self.changes)
+
+    def select(self, first, last):
+        with self._lock:
+            return self.changes[first - 1:last]
+
+    def snapshot(self, version):
+        objects = {}
+        for serial, action, object_type, key, text in self.select(1, self.versions[version - 1]):
+            if action == 'ADD':
+                objects[(object_type, key.upper())] = text
+            else:
+                objects.pop((object_type, key.upper()), None)
+        return [objects[key] for key in sorted(objects)]
+
+
+def json_sequence(records):
+    return ''.join('\x1e' + json.dumps(record) + '\n' for record in records).encode()
+
+
+class Nrtm3Handler(socketserver.StreamRequestHandler):
+    def _write(self, text):
+        self.wfile.write(text.encode())
+
+    def handle(self):
+        journal = self.server.journal
+        query = self.rfile.readline().decode(errors = 'replace').strip()
+        first, last = journal.serial_range()
+        if query == '-q sources':
+            return self._write(f'{journal.source}:3:X:{first}-{last}\n\n')
+        match = query_re.match(query)
+        if match is None:
+            return self._write('%ERROR:405: no flags passed\n\n')
+        if match.group(1).upper() != journal.source:
+            return self._write(f'%ERROR:403: unknown source {match.group(1)}\n\n')
+        query_first = int(match.group(2))
+        query_last = last if match.group(3).upper() == 'LAST' else int(match.group(3))
+        if query_first < first or query_last > last or query_first > query_last:
+            return self._write(f'%ERROR:401: invalid range: Not within {first}-{last}\n\n')
+        self._write(f'%START Version: 3 {journal.source} {query_first}-{query_last}\n\n')
+        for serial, action, object_type, key, text in journal.select(query_first, query_last):
+            self._write(f'{action} {serial}\n\n{text}\n\n')
+        self._write(f'%END {journal.source}\n')
+
+
+class Nrtm4Handler(BaseHTTPRequestHandler):
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body = b''):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _file(self, file_type, version):
+        journal = self.server.journal
+        header = {'nrtm_version': 4, 'type': file_type, 'source': journal.source, 'session_id': journal.session_id, 'version': version}
+        if file_type == 'snapshot':
+            return json_sequence([header] + [{'object': text} for text in journal.snapshot(version)])
+        records = [header]
+        for serial, action, object_type, key, text in journal.select(journal.versions[version - 2] + 1, journal.versions[version - 1]):
+            if action == 'ADD':
+                records.append({'action': 'add_modify', 'object': text})
+            else:
+                records.append({'action': 'delete', 'object_class': object_type, 'primary_key': key})
+        return json_sequence(records)
+
+    def _notification(self):
+        journal = self.server.journal
+        version = len(journal.versions)
+        return json.dumps({
+            'nrtm_version': 4,
+            'type': 'notification',
+            'source': journal.source,
+            'session_id': journal.session_id,
+            'version': version,
+            'snapshot': self._info('snapshot', version),
+            'deltas': [self._info('delta', delta_version) for delta_version in range(2, version + 1)],
+        }).encode()
+
+    def _info(self, file_type, version):
+        return {
+            'version': version,
+            'url': f'{file_type}.{version}.json',
+            'hash': hashlib.sha256(self._file(file_type, version)).hexdigest(),
+        }
+
+    def do_GET(self):
+        journal = self.server.journal
+        if self.path == '/nrtm/notification.json':
+            return self._send(200, self._notification())
+        match = delta_re.match(self.path)
+        if match is None or not 1 <= int(match.group(2)) <= len(journal.versions) or match.group(1) == 'delta' and match.group(2) == '1':
+            return self._send(404)
+        self._send(200, self._file(match.group(1), int(match.group(2))))
+
+
+class MockNrtmServer():
+    # NRTMv3 on port, NRTMv4 on http_port, 0 picks free ports
+    def __init__(self, journal, host = '127.0.0.1', port = 0, http_port = 0):
+        self.journal = journal
+        self._nrtm3 = socketserver.ThreadingTCPServer((host, port), Nrtm3Handler)
+        self._nrtm3.daemon_threads = True
+        self._nrtm3.journal = journal
+        self._nrtm4 = ThreadingHTTPServer((host, http_port), Nrtm4Handler)
+        self._nrtm4.daemon_threads = True
+        self._nrtm4.journal = journal
+        self.host = host
+        self.port = self._nrtm3.server_address[1]
+        self.notification_url = f'http://{host}:{self._nrtm4.server_port}/nrtm/notification.json'
+
+    def start(self):
+        for server in (self._nrtm3, self._nrtm4):
+            threading.Thread(target = server.serve_forever, daemon = True).start()
+        return self
+
+    def stop(self):
+        for server in (self._nrtm3, self._nrtm4):
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    from server import synthetic_fixtures
+    parser = argparse.ArgumentParser(description = 'Mock NRTM server')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 4444, help = 'NRTMv3 port')
+    parser.add_argument('--http-port', type = int, default = 8081, help = 'NRTMv4 port')
+    parser.add_argument('--source', default = 'TEST')
+    parser.add_argument('--fixtures', action = 'append', help = 'RPSL dump to serve, may be repeated')
+    args = parser.parse_args()
+
+    journal = NrtmJournal(args.source)
+    if args.fixtures:
+        for path in args.fixtures:
+            with open_dump(path) as f:
+                journal.load(iter_rpsl_objects(f))
+    else:
+        journal.load(synthetic_fixtures(source = args.source))
+    server = MockNrtmServer(journal, args.host, args.port, args.http_port)
+    print(f'Serving NRTMv3 on {args.host}:{server.port}, NRTMv4 on {server.notification_url}', file = sys.stderr)
+    with server:
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    main()
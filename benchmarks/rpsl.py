@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# Throughput of the RPSL parser and serializer on a synthetic dump, results are printed as JSON.
+#
+#   python benchmarks/rpsl.py --objects 200000
+#   python benchmarks/rpsl.py --dump ripe.db.route.gz
+
+import argparse, gzip, io, json, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ripedb.rpsl import open_dump, iter_rpsl_objects, iter_rpsl_json, format_rpsl
+
+def synthetic_dump(count):
+    lines = ['% This is a synthetic RIPE database dump', '']
+    for i in range(count):
+        lines += [
+            f'route:          10.{i >> 16 & 255}.{i >> 8 & 255}.0/24',
+            f'descr:          Synthetic route {i}',
+            '                continued description # with a comment',
+            '+',
+            f'origin:         AS{64512 + i % 1000}',
+            'member-of:      AS-EXAMPLE:RS-ROUTES',
+            'mnt-by:         EXAMPLE-MNT',
+            'created:        2020-01-01T00:00:00Z',
+            'last-modified:  2020-01-01T00:00:00Z',
+            'source:         RIPE',
+            '',
+        ]
+    return '\n'.join(lines).encode()
+
+def measure(name, function, objects, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        'name': name,
+        'objects': count if count is not None else objects,
+        'seconds': round(best, 4),
+        'objects_per_second': round((count if count is not None else objects) / best) if best > 0 else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description = 'RPSL parser benchmark')
+    parser.add_argument('--objects', type = int, default = 100000)
+    parser.add_argument('--repeat', type = int, default = 3)
+    parser.add_argument('--dump', help = 'benchmark a real dump instead of synthetic data')
+    args = parser.parse_args()
+
+    if args.dump is not None:
+        with open_dump(args.dump) as f:
+            data = f.read()
+    else:
+        data = synthetic_dump(args.objects)
+    compressed = gzip.compress(data, compresslevel = 1)
+    parsed = list(iter_rpsl_objects(data))
+
+    results = [
+        measure('parse_bytes', lambda: sum(1 for _ in iter_rpsl_objects(data)), len(parsed), args.repeat),
+        measure('parse_gzip_stream', lambda: sum(1 for _ in iter_rpsl_objects(io.BufferedReader(io.BytesIO(compressed)))), len(parsed), args.repeat),
+        measure('parse_text_stream', lambda: sum(1 for _ in iter_rpsl_objects(io.StringIO(data.decode()))), len(parsed), args.repeat),
+        measure('parse_json', lambda: sum(1 for _ in iter_rpsl_json(data)), len(parsed), args.repeat),
+        measure('serialize', lambda: len([format_rpsl(attributes) for attributes in parsed]), len(parsed), args.repeat),
+    ]
+    print(json.dumps({
+        'benchmark': 'rpsl',
+        'bytes': len(data),
+        'objects': len(parsed),
+        'results': results,
+    }, indent = 1))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# Local stand-in for the RIPE DB REST API used by the benchmarks.
+# Objects are served from an in-memory LocalRipeDBApi loaded with RPSL fixtures,
+# either generated (persons, maintainer, as-set graphs, aut-nums and routes) or recorded dumps.
+#
+#   python benchmarks/server.py --port 8080 --latency 20
+#   python benchmarks/server.py --write-fixtures fixtures.db
+#   python benchmarks/server.py --fixtures fixtures.db --fixtures ripe.db.route.gz
+
+import argparse, itertools, json, os, sys, threading, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, quote, unquote
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ripedb.local import LocalRipeDBApi
+from ripedb.rpsl import format_rpsl
+
+# as-set graphs of the generated fixtures, root -> (depth, width)
+default_graphs = {
+    'AS-DEEP': (32, 1),
+    'AS-WIDE': (1, 256),
+}
+
+def synthetic_fixtures(graphs = default_graphs, aut_nums = 2, routes = 2, payload = 0, source = 'TEST'):
+    # Yields RPSL objects as lists of (name, value), every as-set of a graph has width child as-sets
+    # down to depth and aut_nums aut-nums, each aut-num originates routes routes.
+    # payload adds that many remarks lines to every object to make the responses bigger.
+    remarks = [('remarks', f'Benchmark payload line {i:04d} ' + 'x' * 32) for i in range(payload)]
+    common = [('admin-c', 'BENCH1-TEST'), ('tech-c', 'BENCH1-TEST'), ('mnt-by', 'BENCH-MNT')] + remarks + [
+        ('created', '2024-01-01T00:00:00Z'), ('last-modified', '2024-01-01T00:00:00Z'), ('source', source)
+    ]
+    yield [('mntner', 'BENCH-MNT'), ('admin-c', 'BENCH1-TEST'), ('upd-to', 'bench@example.com'), ('auth', 'MD5-PW $1$bench'), ('mnt-by', 'BENCH-MNT')] + remarks + [('source', source)]
+    yield [('person', 'Benchmark Person'), ('address', 'Nowhere'), ('phone', '+420000000000'), ('nic-hdl', 'BENCH1-TEST'), ('mnt-by', 'BENCH-MNT')] + remarks + [('source', source)]
+    asn = itertools.count(4200000000)
+    network = itertools.count(0)
+    for root, (depth, width) in graphs.items():
+        names = itertools.count(1)
+        level = [root]
+        for current_depth in range(depth + 1):
+            next_level = []
+            for as_set in level:
+                members = []
+                if current_depth < depth:
+                    children = [f'{root}-{next(names)}' for _ in range(width)]
+                    next_level += children
+                    members += children
+                origins = [f'AS{next(asn)}' for _ in range(aut_nums)]
+                members += origins
+                yield [('as-set', as_set), ('descr', f'Benchmark as-set at depth {current_depth}')] + [('members', member) for member in members] + common
+                for origin in origins:
+                    yield [('aut-num', origin), ('as-name', f'BENCH-{origin}')] + common
+                    for _ in range(routes):
+                        n = next(network)
+                        yield [('route', f'10.{n >> 8 & 255}.{n & 255}.0/24'), ('descr', 'Benchmark route'), ('origin', origin), ('mnt-by', 'BENCH-MNT')] + remarks + [('source', source)]
+            level = next_level
+
+def write_fixtures(path, objects):
+    with open(path, 'w') as f:
+        for attributes in objects:
+            f.write(format_rpsl(attributes) + '\n\n')
+
+
+class FixtureStore(LocalRipeDBApi):
+    # Local store rendering links as URLs of the mock server
+    def __init__(self, source = 'TEST'):
+        super().__init__(':memory:', source = source)
+        self._server_url = ''
+        self._auto_keys = itertools.count(1000)
+
+    def _url(self, object_type, key):
+        return f'{self._server_url}/{self._source.lower()}/{object_type}/{quote(key)}'
+
+    def load_objects(self, objects):
+        batch = [[(name, value, None) for name, value in attributes] for attributes in objects]
+        return self._load_batch(batch) if batch else 0
+
+    def write(self, attributes):
+        # AUTO-n keys are replaced by generated ones like the real server does
+        attributes = [
+            (name, f'BENCH{next(self._auto_keys)}-TEST' if value.upper().startswith('AUTO-') else value, None)
+            for name, value in attributes
+        ]
+        self._load_batch([attributes])
+        object_type = attributes[0][0]
+        key = ''.join(value for name, value in self._primary_key(object_type, attributes))
+        return self.get_object_json(object_type, key)
+
+    def remove(self, object_type, key):
+        json_data = self.get_object_json(object_type, key)
+        if json_data is not None:
+            self.apply_changes([('DEL', object_type, key, None)])
+        return json_data
+
+
+class MockRipeServer():
+    # Threaded HTTP server answering templates, searches, object lookups and writes.
+    # latency (seconds) is added to every response.
+    def __init__(self, store, host = '127.0.0.1', port = 0, latency = 0.0):
+        self.store = store
+        self.latency = latency
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), MockRipeHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self.url = f'http://{host}:{self._httpd.server_port}'
+        store._server_url = self.url
+        self._thread = None
+
+    def count(self, name):
+        with self._lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+
+    def request_count(self):
+        with self._lock:
+            return sum(self.requests.values())
+
+    def start(self):
+        self._thread = threading.Thread(target = self._httpd.serve_forever, daemon = True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class MockRipeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, with Nagle every kept-alive request would wait for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def mock(self):
+        return self.server.mock
+
+    def _send(self, status, data = None):
+        if self.mock.latency:
+            time.sleep(self.mock.latency)
+        body = json.dumps(data if data is not None else {}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _objects(self, json_objects):
+        if not json_objects:
+            return self._send(404, {'errormessages': {'errormessage': [{'severity': 'Error', 'text': 'Not found'}]}})
+        return self._send(200, {'objects': {'object': json_objects}})
+
+    def _path(self):
+        url = urlsplit(self.path)
+        return url.path.strip('/').split('/', 2), parse_qs(url.query)
+
+    def _body_attributes(self):
+        data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        return [(attr['name'], attr['value']) for attr in data['objects']['object'][0]['attributes']['attribute']]
+
+    def do_GET(self):
+        parts, query = self._path()
+        store = self.mock.store
+        if parts[0] == 'search':
+            self.mock.count('search')
+            return self._objects(store.search_json(
+                query.get('query-string', [''])[0],
+                type_filter = query.get('type-filter') or None,
+                inverse_attribute = query.get('inverse-attribute') or None,
+                flags = query.get('flags'),
+            ))
+        if parts[0] == 'metadata' and len(parts) == 3:
+            self.mock.count('template')
+            template = store.get_template(parts[2])
+            if template is None:
+                return self._send(404)
+            return self._send(200, {'templates': {'template': [template]}})
+        if len(parts) == 3:
+            self.mock.count('get')
+            json_data = store.get_object_json(parts[1], unquote(parts[2]))
+            return self._objects([json_data] if json_data is not None else [])
+        self._send(404)
+
+    def do_POST(self):
+        parts, query = self._path()
+        self.mock.count('create')
+        return self._objects([self.mock.store.write(self._body_attributes())])
+
+    def do_PUT(self):
+        parts, query = self._path()
+        self.mock.count('update')
+        if len(parts) != 3 or self.mock.store.get_object_json(parts[1], unquote(parts[2])) is None:
+            return self._objects([])
+        return self._objects([self.mock.store.write(self._body_attributes())])
+
+    def do_DELETE(self):
+        parts, query = self._path()
+        self.mock.count('delete')
+        if len(parts) != 3:
+            return self._objects([])
+        json_data = self.mock.store.remove(parts[1], unquote(parts[2]))
+        return self._objects([json_data] if json_data is not None else [])
+
+
+def create_server(fixtures = None, latency = 0.0, host = '127.0.0.1', port = 0, source = 'TEST', **fixture_kwargs):
+    # fixtures are RPSL dump files, synthetic fixtures are generated without them
+    store = FixtureStore(source)
+    if fixtures:
+        store.load_dumps(fixtures)
+    else:
+        store.load_objects(synthetic_fixtures(source = source, **fixture_kwargs))
+    return MockRipeServer(store, host, port, latency)
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Mock RIPE DB REST server')
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--port', type = int, default = 8080)
+    parser.add_argument('--latency', type = float, default = 0.0, help = 'added latency in milliseconds')
+    parser.add_argument('--payload', type = int, default = 0, help = 'extra remarks lines per generated object')
+    parser.add_argument('--fixtures', action = 'append', help = 'RPSL dump to serve, may be repeated')
+    parser.add_argument('--write-fixtures', help = 'write the generated fixtures as RPSL and exit')
+    args = parser.parse_args()
+
+    if args.write_fixtures:
+        write_fixtures(args.write_fixtures, synthetic_fixtures(payload = args.payload))
+        return
+    server = create_server(args.fixtures, args.latency / 1000, args.host, args.port, payload = args.payload)
+    print(f'Serving {server.url}', file = sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# Startup cost of the client, every sample runs in a fresh interpreter: importing the package,
+# constructing an API (eager or deferred) and the first lookup answered from a warm response cache.
+# Results are printed as JSON, times in milliseconds.
+#
+#   python benchmarks/startup.py --repeat 20
+#   python -X importtime benchmarks/startup.py --repeat 1
+
+import argparse, json, os, statistics, subprocess, sys, tempfile, time
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from server import create_server
+
+# runs in the child process, prints the timings of every step since the interpreter started
+child = '''
+import json, sys, time
+started = time.perf_counter()
+import ripedb
+imported = time.perf_counter()
+from ripedb import RipeDBApi
+api_imported = time.perf_counter()
+api = RipeDBApi(base_url = sys.argv[1], source = 'TEST', cache_name = sys.argv[2], rate_limit = None,
+    deferred = sys.argv[3] == 'deferred')
+constructed = time.perf_counter()
+obj = api.mntner.get('BENCH-MNT')
+obj.admin_c
+looked_up = time.perf_counter()
+api.close()
+print(json.dumps({
+    'import': imported - started,
+    'import_api': api_imported - imported,
+    'construct': constructed - api_imported,
+    'first_lookup': looked_up - constructed,
+    'modules': len(sys.modules),
+}))
+'''
+
+def sample(url, cache_name, mode, env):
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', child, url, cache_name, mode],
+        env = env, cwd = root, check = True, capture_output = True, text = True
+    ).stdout
+    result = json.loads(output)
+    result['process'] = time.perf_counter() - started
+    return result
+
+def summarize(mode, samples):
+    steps = ('import', 'import_api', 'construct', 'first_lookup', 'process')
+    result = {'name': mode, 'samples': len(samples)}
+    for step in steps:
+        result[f'{step}_ms'] = round(statistics.median(sample[step] for sample in samples) * 1000, 2)
+    result['startup_ms'] = round(result['import_ms'] + result['import_api_ms'] + result['construct_ms'], 2)
+    result['modules'] = samples[-1]['modules']
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Client startup benchmark')
+    parser.add_argument('--repeat', type = int, default = 10)
+    parser.add_argument('--output', help = 'also write the results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, create_server() as server:
+        # schema and response caches live in the temporary directory, the first run fills them
+        env = dict(os.environ, XDG_CACHE_HOME = directory, PYTHONDONTWRITEBYTECODE = '1')
+        cache_name = os.path.join(directory, 'responses')
+        sample(server.url, cache_name, 'eager', env)
+        results = []
+        for mode in ('eager', 'deferred'):
+            results.append(summarize(mode, [sample(server.url, cache_name, mode, env) for _ in range(args.repeat)]))
+        requests = server.request_count()
+
+    report = {
+        'benchmark': 'startup',
+        'python': sys.version.split()[0],
+        'repeat': args.repeat,
+        # requests reaching the server, only the warm up should hit it
+        'server_requests': requests,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent = 1)
+    print(json.dumps(report, indent = 1))
+
+if __name__ == '__main__':
+    main()
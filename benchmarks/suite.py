@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# Benchmark suite running against the local mock RIPE DB server, results are written as JSON.
+#
+#   python benchmarks/suite.py --output results.json
+#   python benchmarks/suite.py --latency 20 --payload 10 --only resolve
+#   python benchmarks/suite.py --compare baseline.json --threshold 0.2
+#
+# Compared with a baseline the suite exits with status 1 when a benchmark got slower than the threshold.
+
+import argparse, json, os, pickle, platform, statistics, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ripedb import RipeDBApi
+from ripedb.objects import object_from_json, object_from_snapshot
+from ripedb.expand import ExpansionState, IncrementalExpander
+from ripedb.graph import reference_graph
+from ripedb.export import to_columns
+from server import create_server
+
+SUITE_FORMAT = 1
+
+def api_for(server, **kwargs):
+    kwargs.setdefault('cache_timeout', None)
+    # the client is measured, not the limiter
+    kwargs.setdefault('rate_limit', None)
+    return RipeDBApi(base_url = server.url, source = 'TEST', schema_cache = None, **kwargs)
+
+def bench_object_from_json(server, args):
+    api = api_for(server)
+    json_objects = api.search_json('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'aut-num')
+    def run():
+        api._objects.clear()
+        for json_data in json_objects:
+            object_from_json(api, json_data)
+        return len(json_objects)
+    return run
+
+def bench_snapshot_roundtrip(server, args):
+    # objects pickled as snapshots and bound again, as when shipped to worker processes
+    api = api_for(server)
+    objects = list(api.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'aut-num'))
+    def run():
+        api._objects.clear()
+        for snapshot in pickle.loads(pickle.dumps([obj.snapshot() for obj in objects])):
+            object_from_snapshot(api, snapshot)
+        return len(objects)
+    return run
+
+def bench_export_columns(server, args):
+    # columnar export of search results, compare with object_from_json
+    api = api_for(server)
+    json_objects = api.search_json('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'aut-num')
+    def run():
+        return len(to_columns(json_objects))
+    return run
+
+def bench_attribute_access(server, args):
+    api = api_for(server)
+    objects = list(api.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'aut-num'))
+    def run():
+        for obj in objects:
+            obj.as_name
+            obj.mnt_by
+            obj.remarks
+        return len(objects)
+    return run
+
+def bench_get(server, args):
+    api = api_for(server)
+    keys = [obj.id for obj in api.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'aut-num', limit = 100)]
+    def run():
+        for key in keys:
+            api.get_object_json('aut-num', key)
+        return len(keys)
+    return run
+
+def bench_search(server, args):
+    api = api_for(server)
+    def run():
+        return len(api.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = ['aut-num', 'route'], iterator = False))
+    return run
+
+def bench_search_stream(server, args):
+    api = api_for(server)
+    def run():
+        return sum(1 for _ in api.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = ['aut-num', 'route'], stream = True))
+    return run
+
+def bench_search_primary_keys(server, args):
+    api = api_for(server)
+    def run():
+        return len(api.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = ['aut-num', 'route'], attributes = [], iterator = False))
+    return run
+
+def bench_search_projected(server, args):
+    api = api_for(server)
+    def run():
+        return len(api.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = ['aut-num', 'route'], attributes = ['origin'], iterator = False))
+    return run
+
+def bench_search_cached(server, args):
+    api = api_for(server, cache_timeout = 3600, cache_backend = 'memory', cache_name = 'benchmark')
+    api.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'aut-num', iterator = False)
+    def run():
+        return len(api.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'aut-num', iterator = False))
+    return run
+
+def resolve_members(root):
+    def bench(server, args):
+        api = api_for(server)
+        def run():
+            api._objects.clear()
+            return len(api.as_set.get(root).resolve_members(workers = args.workers))
+        return run
+    return bench
+
+def resolve_routes(root):
+    def bench(server, args):
+        api = api_for(server)
+        def run():
+            api._objects.clear()
+            return len(api.as_set.get(root).resolve_routes(workers = args.workers))
+        return run
+    return bench
+
+def refresh_expansion(root):
+    # unchanged refresh against the state of a full expansion
+    def bench(server, args):
+        api = api_for(server)
+        state = ExpansionState()
+        IncrementalExpander(api, state, args.workers).refresh(root)
+        def run():
+            return len(IncrementalExpander(api, state, args.workers).refresh(root))
+        return run
+    return bench
+
+def bench_reference_graph(server, args):
+    # audit of everything maintained by the mntner and what references those objects
+    api = api_for(server)
+    def run():
+        return len(reference_graph(api, ('mntner', 'BENCH-MNT'), direction = 'reverse', max_depth = 2))
+    return run
+
+def bench_create_update_delete(server, args):
+    api = api_for(server, mntner = 'BENCH-MNT', password = 'benchmark')
+    def run():
+        person = api.person.create('AUTO-1', {
+            'person': 'Benchmark Person',
+            'address': 'Nowhere',
+            'phone': '+420000000000',
+        })
+        person.update({'phone': '+420000000001'})
+        person.delete()
+        return 3
+    return run
+
+benchmarks = {
+    'object_from_json': bench_object_from_json,
+    'snapshot_roundtrip': bench_snapshot_roundtrip,
+    'export_columns': bench_export_columns,
+    'attribute_access': bench_attribute_access,
+    'get': bench_get,
+    'search': bench_search,
+    'search_stream': bench_search_stream,
+    'search_primary_keys': bench_search_primary_keys,
+    'search_projected': bench_search_projected,
+    'search_cached': bench_search_cached,
+    'resolve_members_deep': resolve_members('AS-DEEP'),
+    'resolve_members_wide': resolve_members('AS-WIDE'),
+    'resolve_routes_deep': resolve_routes('AS-DEEP'),
+    'resolve_routes_wide': resolve_routes('AS-WIDE'),
+    'refresh_expansion_deep': refresh_expansion('AS-DEEP'),
+    'refresh_expansion_wide': refresh_expansion('AS-WIDE'),
+    'reference_graph': bench_reference_graph,
+    'create_update_delete': bench_create_update_delete,
+}
+
+def measure(name, bench, server, args):
+    run = bench(server, args)
+    # warm up, the first run also fetches missing templates
+    run()
+    times = []
+    requests = None
+    operations = 0
+    for _ in range(args.repeat):
+        before = server.request_count()
+        started = time.perf_counter()
+        operations = run()
+        times.append(time.perf_counter() - started)
+        requests = server.request_count() - before
+    best = min(times)
+    return {
+        'name': name,
+        'operations': operations,
+        'requests': requests,
+        'min': round(best, 6),
+        'median': round(statistics.median(times), 6),
+        'operations_per_second': round(operations / best, 1) if best > 0 else None,
+    }
+
+def compare(results, baseline, threshold):
+    # benchmarks whose best time grew by more than threshold (0.2 = 20 %)
+    previous = {result['name']: result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get(result['name'])
+        if before is None or not before['min']:
+            continue
+        change = result['min'] / before['min'] - 1
+        result['change'] = round(change, 4)
+        if change > threshold:
+            regressions.append(result['name'])
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description = 'pyripedb benchmark suite')
+    parser.add_argument('--latency', type = float, default = 0.0, help = 'mock server latency in milliseconds')
+    parser.add_argument('--payload', type = int, default = 0, help = 'extra remarks lines per object')
+    parser.add_argument('--deep', type = int, default = 32, help = 'depth of the deep as-set graph')
+    parser.add_argument('--wide', type = int, default = 256, help = 'width of the wide as-set graph')
+    parser.add_argument('--aut-nums', type = int, default = 2, help = 'aut-nums per as-set')
+    parser.add_argument('--routes', type = int, default = 2, help = 'routes per aut-num')
+    parser.add_argument('--workers', type = int, default = 8)
+    parser.add_argument('--repeat', type = int, default = 5)
+    parser.add_argument('--only', action = 'append', help = 'run benchmarks whose name contains this, may be repeated')
+    parser.add_argument('--output', help = 'write the results to this file instead of stdout')
+    parser.add_argument('--compare', help = 'results of an earlier run to compare with')
+    parser.add_argument('--threshold', type = float, default = 0.2)
+    args = parser.parse_args()
+
+    server = create_server(
+        latency = args.latency / 1000,
+        graphs = {'AS-DEEP': (args.deep, 1), 'AS-WIDE': (1, args.wide)},
+        aut_nums = args.aut_nums,
+        routes = args.routes,
+        payload = args.payload,
+    )
+    with server:
+        results = []
+        for name, bench in benchmarks.items():
+            if args.only and not any(part in name for part in args.only):
+                continue
+            results.append(measure(name, bench, server, args))
+            print(f'{name}: {results[-1]["min"]:.4f}s', file = sys.stderr)
+
+    report = {
+        'format': SUITE_FORMAT,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {name: value for name, value in vars(args).items() if name not in ('output', 'compare')},
+        'results': results,
+    }
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        report['regressions'] = regressions
+    output = json.dumps(report, indent = 1)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    if regressions:
+        print(f'Regressions: {", ".join(regressions)}', file = sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+import logging
+logging.basicConfig(level=logging.INFO)
+from ripedb import RipeDBApi
+
+api = RipeDBApi(
+    source='TEST',
+    base_url='https://rest-test.db.ripe.net',
+    cache_timeout=3600,
+    mntner='pyripedb-demo-mnt',
+    password='VerySecurePassword'
+)
+
+def provision(batch):
+    john = batch.create('person', 'AUTO-1', {
+        'person': 'John Doe',
+        'address': ['Under the bridge 1', 'Prague', 'CZ'],
+        'phone': '+420601123456'
+    })
+    jane = batch.create('person', 'AUTO-1', {
+        'person': 'Jane Doe',
+        'address': ['Under the bridge 1', 'Prague', 'CZ'],
+        'phone': '+420601123456'
+    })
+    # the role references both persons, it is created once they exist
+    batch.create('role', 'AUTO-1', {
+        'role': 'Demo role',
+        'e-mail': 'abuse@example.com',
+        'address': 'Practically everywhere',
+        'admin-c': [john, jane]
+    })
+
+# validate against the templates first, nothing is sent to the server
+dry_run = api.batch(dry_run = True)
+provision(dry_run)
+for level in dry_run.plan():
+    print([f'{op.action} {op.type}' for op in level])
+dry_run.commit()
+for op in dry_run.errors:
+    print(op, op.error)
+
+if not dry_run.errors:
+    with api.batch() as batch:
+        provision(batch)
+    for op in batch.operations:
+        print(op, op.object.id if op.object is not None else op.error)
@@ -0,0 +1,21 @@
+import logging
+logging.basicConfig(level=logging.INFO)
+from ripedb import LocalRipeDBApi
+
+import pprint
+
+# download the split dumps first from https://ftp.ripe.net/ripe/dbase/split/
+api = LocalRipeDBApi('ripe.sqlite')
+
+api.load_dumps([
+    'ripe.db.as-set.gz',
+    'ripe.db.aut-num.gz',
+    'ripe.db.route.gz',
+    'ripe.db.route6.gz',
+])
+
+as_set = api.as_set.get('AS-IGNUM-OUT')
+
+pprint.pprint(list(map(lambda x: x.id, as_set.resolve_members())))
+
+pprint.pprint(list(map(lambda x: x.id, as_set.resolve_routes())))
@@ -0,0 +1,17 @@
+import logging
+logging.basicConfig(level=logging.INFO)
+from ripedb import LocalRipeDBApi
+from ripedb.nrtm import Nrtm3Client, NrtmMirror
+
+# start from a full dump, its serial is in the RIPE.CURRENTSERIAL file next to the dumps
+# at https://ftp.ripe.net/ripe/dbase/
+api = LocalRipeDBApi('ripe.sqlite')
+mirror = NrtmMirror(api, Nrtm3Client('nrtm.db.ripe.net', 4444, source = 'RIPE'))
+
+if mirror.serial is None:
+    with open('RIPE.CURRENTSERIAL') as f:
+        mirror.load_dump('ripe.db.gz', int(f.read()))
+
+print(mirror.sync(), 'changes applied, serial', mirror.serial)
+
+print(api.aut_num.get('AS3333').as_name)
@@ -1,6 +1,23 @@
 import logging
-__all__ = ['objects']
+__all__ = ['objects', 'RipeDBApi', 'AsyncRipeDBApi', 'LocalRipeDBApi']
 
 logger = logging.getLogger('ripe-db')
 
-from . rest import RestApi as RipeDBApi
\ No newline at end of file
+# the API classes are imported on first access, so importing the package does not load requests,
+# the object model or asyncio before they are used
+lazy_classes = {
+    'RipeDBApi': ('rest', 'RestApi'),
+    'AsyncRipeDBApi': ('aio', 'AsyncRestApi'),
+    'LocalRipeDBApi': ('local', 'LocalRipeDBApi'),
+}
+
+def __getattr__(name):
+    if name not in lazy_classes:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    from importlib import import_module
+    module_name, class_name = lazy_classes[name]
+    value = globals()[name] = getattr(import_module(f'.{module_name}', __name__), class_name)
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(lazy_classes))
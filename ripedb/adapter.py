@@ -0,0 +1,29 @@
+import time
+from requests.adapters import HTTPAdapter
+from . ratelimit import write_methods
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    # Requests actually sent to the server wait for the shared rate limiter,
+    # cached responses never get this far. 429 answers are retried after a backoff.
+    def __init__(self, limiter, *args, **kwargs):
+        self._limiter = limiter
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        write = request.method in write_methods
+        attempt = 0
+        while True:
+            self._limiter.acquire(write)
+            started = time.perf_counter()
+            status = None
+            try:
+                response = super().send(request, **kwargs)
+                status = response.status_code
+            finally:
+                self._limiter.release(write, time.perf_counter() - started, status)
+            if status != 429 or attempt >= self._limiter.retries:
+                return response
+            self._limiter.throttle(attempt, response.headers.get('Retry-After'))
+            response.close()
+            attempt += 1
@@ -0,0 +1,497 @@
+import asyncio, json, time
+from ipaddress import ip_network
+from urllib.parse import quote
+from . import logger as parent_logger
+from . objects import RipeObject, primary_key
+from . objects.schema import compile_template, initial_schemas, default_schema_cache, save_schemas
+from . cache import ObjectCache
+from . ratelimit import RateLimiter, RateLimitError, parse_retry_after, write_methods
+from . rest import search_flags, trimmed_search
+from . stream import JsonArrayParser
+from . expand import ASSetExpander, ExpansionResult, accepts_references, root_name, skipped_names
+
+logger = parent_logger.getChild('aio')
+
+def async_empty_object(api, object_type):
+    if object_type in async_object_types:
+        obj = async_object_types[object_type](api, object_type = object_type)
+    else:
+        obj = AsyncRipeObject(api, object_type = object_type)
+    return obj
+
+async def async_object_from_json(api, json_data):
+    obj = api._objects.get(json_data['type'], primary_key(json_data))
+    if obj is None:
+        obj = async_empty_object(api, json_data['type'])
+        await obj._load_schema()
+        obj._parse_json(json_data)
+        return api._objects.put(obj)
+    obj._parse_json(json_data)
+    return obj
+
+async def async_projected_object(api, json_data):
+    # results trimmed by the server stay out of the identity map, see projected_object
+    obj = api._objects.get(json_data['type'], primary_key(json_data))
+    if obj is not None and obj._loaded and obj._projection is None:
+        return obj
+    obj = async_empty_object(api, json_data['type'])
+    await obj._load_schema()
+    obj._parse_json(json_data)
+    obj._projection = frozenset(attr['name'] for attr in json_data['attributes']['attribute']) | {obj._type}
+    return obj
+
+def async_lazy_object(api, object_type, id):
+    # fetched on the first awaited attribute, see lazy_object
+    obj = api._objects.get(object_type, id)
+    if obj is None:
+        obj = async_empty_object(api, object_type)
+        obj._id = id
+        obj._key = id
+        obj._loaded = False
+        obj = api._objects.add(obj)
+    return obj
+
+async def async_object_from_link(api, attr):
+    obj = api._objects.get(attr.referenced_type, attr.value)
+    if obj is not None:
+        return obj
+    json_data = await api.get_url_json(attr.link)
+    if json_data is None:
+        obj = async_empty_object(api, attr.referenced_type)
+        await obj._load_schema()
+        obj._id = attr.value
+        obj._key = attr.value
+        return api._objects.put(obj)
+    else:
+        return await async_object_from_json(api, json_data)
+
+
+class AsyncRestApi():
+    _base_url = 'https://rest.db.ripe.net'
+    _source = 'RIPE'
+    _mntner = None
+    _password = None
+    _metrics = None
+    _rate_limiter = None
+    _stream_chunk_size = 1 << 16
+
+    def __init__(self, base_url = None, source = None, mntner = None, password = None, pool_size = 10, timeout = 60,
+            object_cache_size = 10000, object_cache_ttl = 300, schema_cache = None, bundled_schemas = True, rate_limit = None):
+        import aiohttp
+        self._aiohttp = aiohttp
+        if base_url is not None:
+            self._base_url = base_url
+        if source is not None:
+            self._source = source
+        self._mntner = mntner
+        self._password = password
+        self._writable = mntner is not None and password is not None
+        self._templates = {}
+        self._schema_cache = default_schema_cache(self._base_url) if schema_cache is True else schema_cache or None
+        self._schemas = initial_schemas(self._schema_cache, bundled_schemas)
+        self._pool_size = pool_size
+        self._timeout = timeout
+        self._session = None
+        # a RateLimiter may be shared with threaded API instances
+        self._rate_limiter = RateLimiter(max_concurrency = pool_size) if rate_limit is True else rate_limit or None
+        self._objects = ObjectCache(object_cache_size, object_cache_ttl)
+
+    def _get_session(self):
+        # aiohttp sessions must be created inside the running event loop
+        if self._session is None or self._session.closed:
+            self._session = self._aiohttp.ClientSession(
+                connector = self._aiohttp.TCPConnector(limit = self._pool_size),
+                timeout = self._aiohttp.ClientTimeout(total = self._timeout),
+                headers = {'Accept': 'application/json'},
+            )
+        return self._session
+
+    def _params(self, params):
+        # aiohttp does not accept None values, lists are sent as repeated parameters
+        out = []
+        for name, value in params.items():
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                out += [(name, str(item)) for item in value]
+            else:
+                out.append((name, str(value)))
+        return out
+
+    async def _send(self, method, url, params = None, json = None):
+        # response with the body still to be read, 429 answers are retried after the shared backoff
+        session = self._get_session()
+        limiter = self._rate_limiter
+        write = method in write_methods
+        attempt = 0
+        while True:
+            if limiter is not None:
+                await limiter.acquire_async(write)
+            started = time.perf_counter()
+            status = None
+            try:
+                q = await session.request(method, url, params = self._params(params or {}), json = json)
+                status = q.status
+            finally:
+                if limiter is not None:
+                    limiter.release(write, time.perf_counter() - started, status)
+            if status != 429:
+                return q
+            retry_after = q.headers.get('Retry-After')
+            q.release()
+            if limiter is None or attempt >= limiter.retries:
+                raise RateLimitError(f'Too many requests: {method} {url}', retry_after = parse_retry_after(retry_after))
+            limiter.throttle(attempt, retry_after)
+            attempt += 1
+
+    async def _request(self, method, url, params = None, json = None):
+        q = await self._send(method, url, params, json)
+        async with q:
+            content = await q.read()
+            return q.status, content
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def object_cache_stats(self):
+        return self._objects.stats()
+
+    def stats(self):
+        stats = {'objects': self.object_cache_stats()}
+        if self._rate_limiter is not None:
+            stats['rate_limit'] = self._rate_limiter.stats()
+        return stats
+
+    def is_writable(self):
+        return self._writable
+
+    async def _write(self, method, url, object_data = None):
+        status, content = await self._request(method, url, params = {'password': self._password}, json = object_data)
+        if status == 200:
+            return self._json(content)['objects']['object'][0]
+        else:
+            logger.debug({'code': status, 'data': content})
+            raise ValueError
+
+    def _json(self, content):
+        return json.loads(content)
+
+    async def _post(self, object_type, object_data):
+        return await self._write('POST', f'{self._base_url}/{self._source}/{object_type}', object_data)
+
+    async def _delete(self, object_type, id):
+        json_data = await self._write('DELETE', f'{self._base_url}/{self._source}/{object_type}/{id}')
+        # there is no response cache, only the identity map may still hold the object
+        self._objects.invalidate(object_type, primary_key(json_data))
+        return json_data
+
+    async def _put(self, object_type, id, object_data):
+        return await self._write('PUT', f'{self._base_url}/{self._source}/{object_type}/{id}', object_data)
+
+    async def get_template(self, object_type):
+        if object_type not in self._templates:
+            status, content = await self._request('GET', f'{self._base_url}/metadata/templates/{object_type}')
+            if status == 404:
+                # not found
+                return None
+            elif status == 200:
+                self._templates[object_type] = self._json(content)['templates']['template'][0]
+            else:
+                logger.debug({'code': status, 'data': content})
+                raise ValueError
+        return self._templates[object_type]
+
+    async def get_schema(self, object_type):
+        if object_type not in self._schemas:
+            template = await self.get_template(object_type)
+            if template is None:
+                return None
+            self._schemas[object_type] = compile_template(object_type, template)
+            self._save_schemas()
+        return self._schemas[object_type]
+
+    async def refresh_schemas(self, object_types = None):
+        if object_types is None:
+            object_types = list(self._schemas)
+        for object_type in object_types:
+            self._templates.pop(object_type, None)
+            template = await self.get_template(object_type)
+            if template is None:
+                self._schemas.pop(object_type, None)
+            else:
+                self._schemas[object_type] = compile_template(object_type, template)
+        self._save_schemas()
+        return dict(self._schemas)
+
+    def _save_schemas(self):
+        if self._schema_cache is None:
+            return
+        try:
+            save_schemas(self._schema_cache, self._schemas, self._base_url)
+        except OSError as e:
+            logger.debug(f'Cannot write schema cache {self._schema_cache}: {e}')
+
+    async def get_url_json(self, url, unfiltered = False):
+        params = None
+        if unfiltered:
+            # the server only drops its filtering for the maintainer's password
+            params = {'unfiltered': '', 'password': self._password}
+        status, content = await self._request('GET', url, params)
+        if status == 404:
+            # not found
+            return None
+        elif status == 200:
+            return self._json(content)['objects']['object'][0]
+        else:
+            logger.debug({'code': status, 'data': content})
+            raise ValueError
+
+    async def get_object_json(self, object_type, id, unfiltered = False):
+        url = f'{self._base_url}/{self._source}/{object_type}/{quote(id)}'
+        return await self.get_url_json(url, unfiltered)
+
+    def __getattr__(self, attrname):
+        if attrname.startswith('_'):
+            raise AttributeError(attrname)
+        object_type = attrname.replace('_','-')
+        return async_empty_object(self, object_type)
+
+    async def search(self, query_string, resource_holder = False, type_filter = None, inverse_attribute = None, limit = None, flags = None):
+        build = async_projected_object if trimmed_search(flags) else async_object_from_json
+        async for json_data in self.search_json(query_string, resource_holder, type_filter, inverse_attribute, limit, flags):
+            yield await build(self, json_data)
+
+    async def search_json(self, query_string, resource_holder = False, type_filter = None, inverse_attribute = None, limit = None, flags = None):
+        # results are decoded from the response as it arrives, flags trim them on the server (see search_flags)
+        params = {
+            'query-string': query_string,
+            'resource-holder': int(resource_holder),
+            'type-filter': type_filter,
+            'inverse-attribute': inverse_attribute,
+            'flags': search_flags(flags),
+            # without it the server searches its default source only
+            'source': self._source,
+        }
+        q = await self._send('GET', f'{self._base_url}/search', params)
+        async with q:
+            if q.status == 404:
+                # not found
+                return
+            elif q.status != 200:
+                content = await q.read()
+                logger.debug({'code': q.status, 'data': content})
+                raise ValueError
+            parser = JsonArrayParser()
+            count = 0
+            async for chunk in q.content.iter_chunked(self._stream_chunk_size):
+                for json_data in parser.feed(chunk):
+                    if limit is not None and count >= limit:
+                        return
+                    yield json_data
+                    count += 1
+                if parser.finished:
+                    return
+            for json_data in parser.feed(b'', final = True):
+                if limit is not None and count >= limit:
+                    return
+                yield json_data
+                count += 1
+
+
+class AsyncRipeObject(RipeObject):
+    # Schema is loaded on first awaited operation, so objects can be created
+    # synchronously through api.<object_type>.
+    __slots__ = ()
+
+    def __init__(self, api, object_type, json_data = None, schema = None):
+        self._init_state(api, object_type)
+        if schema is not None:
+            self._set_schema(object_type, schema)
+        if json_data is not None:
+            self._parse_json(json_data)
+
+    async def _load_schema(self):
+        if self._schema is None:
+            self._set_schema(self._type, await self._api.get_schema(self._type))
+
+    async def _resolve_attribute(self, attr):
+        if attr.link is not None:
+            return await async_object_from_link(self._api, attr)
+        else:
+            return attr.value
+
+    async def _get_attribute(self, attrname):
+        await self._load_schema()
+        if attrname not in self._schema:
+            raise AttributeError(attrname)
+        await self._load_lazy()
+        if self._projection is not None and attrname not in self._projection:
+            await self._load_whole()
+        found_items = await asyncio.gather(*[
+            self._resolve_attribute(item) for item in self._index.get(attrname, ())
+        ])
+        found_items = [item for item in found_items if item is not None]
+        if self._schema.is_multiple(attrname):
+            return found_items
+        elif len(found_items) > 0:
+            return found_items[0]
+        else:
+            return None
+
+    async def _load_lazy(self):
+        if self._loaded:
+            return
+        json_data = await self._api.get_object_json(self._type, self._id)
+        if json_data is None:
+            # keep the unresolved reference with just its id
+            self._loaded = True
+        else:
+            self._parse_json(json_data)
+
+    async def _load_whole(self):
+        json_data = await self._api.get_object_json(self._type, self._id)
+        if json_data is None:
+            raise ValueError('Object not found')
+        self._parse_json(json_data)
+
+    def __getattr__(self, attrname):
+        # every RIPE attribute is awaitable: await obj.admin_c
+        if attrname == 'id':
+            return self._id
+        elif attrname == 'type':
+            return self._type
+        if attrname.startswith('_'):
+            raise AttributeError(attrname)
+        return self._get_attribute(attrname.replace('_','-'))
+
+    async def get(self, id, unfiltered = False):
+        await self._load_schema()
+        json_data = await self._api.get_object_json(self._type, id, unfiltered)
+        if json_data is None:
+            raise ValueError('Object not found')
+        obj = self._api._objects.get(json_data['type'], primary_key(json_data))
+        if obj is None:
+            self._parse_json(json_data)
+            return self._api._objects.put(self)
+        obj._parse_json(json_data)
+        return obj
+
+    async def create(self, id, attributes):
+        await self._load_schema()
+        object_data = self._create_data(id, attributes)
+        json_data = await self._api._post(self._type, object_data)
+        self._parse_json(json_data)
+        return self
+
+    async def delete(self):
+        self._check_delete()
+        return await self._api._delete(self._type, self._id)
+
+    async def update(self, attributes, update_type = 'replace'):
+        await self._load_schema()
+        object_data = self._update_data(attributes, update_type)
+        json_data = await self._api._put(self._type, self._id, object_data)
+        self._parse_json(json_data)
+        return self
+
+
+class AsyncASSetExpander(ASSetExpander):
+    # ASSetExpander on the asyncio client, at most workers requests of a level run at once
+    async def _get_member_of(self, name):
+        return [json_data async for json_data in self._api.search_json(
+            query_string = name,
+            type_filter = ['aut-num', 'as-set'],
+            inverse_attribute = 'member-of'
+        )]
+
+    def _aut_num(self, name):
+        return async_lazy_object(self._api, 'aut-num', name)
+
+    async def expand(self, as_set, seen = None):
+        result = ExpansionResult(root_name(as_set))
+        skip = skipped_names(seen)
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self._workers)
+        async def bounded(coroutine):
+            async with semaphore:
+                return await coroutine
+        async def gather(function, names):
+            return await asyncio.gather(*[bounded(function(name)) for name in names])
+        level = [result.root]
+        while level:
+            level_started = time.monotonic()
+            fetched = await gather(self._get_as_set, level)
+            by_reference = [name for name, json_data in zip(level, fetched) if accepts_references(json_data)]
+            member_of = dict(zip(by_reference, await gather(self._get_member_of, by_reference)))
+            level = self._expand_level(result, level, fetched, member_of, skip, level_started)
+        pending = self._pending_aut_nums(result)
+        self._add_aut_nums(result, pending, await gather(self._get_aut_num, pending))
+        for name, json_data in result.as_sets.items():
+            result.as_sets[name] = await async_object_from_json(self._api, json_data)
+        for name, json_data in result.aut_nums.items():
+            result.aut_nums[name] = await async_object_from_json(self._api, json_data) if json_data is not None else self._aut_num(name)
+        return self._finish(result, seen, started)
+
+
+class AsyncASSet(AsyncRipeObject):
+    __slots__ = ()
+
+    async def expand(self, workers = 8, max_depth = None, max_objects = None, fetch_aut_nums = False, seen = None):
+        expander = AsyncASSetExpander(self._api, workers, max_depth, max_objects, fetch_aut_nums)
+        return await expander.expand(self, seen)
+
+    async def resolve_members(self, seen_ids = None, **kwargs):
+        # seen_ids lists members expanded already, the ones found are added to it
+        return list((await self.expand(seen = seen_ids, **kwargs)).aut_nums.values())
+
+    async def resolve_routes(self, **kwargs):
+        aut_nums = await self.resolve_members(**kwargs)
+        routes = []
+        for aut_num_routes in await asyncio.gather(*[aut_num.resolve_routes() for aut_num in aut_nums]):
+            routes += aut_num_routes
+        return routes
+
+
+class AsyncAutNum(AsyncRipeObject):
+    __slots__ = ('_routes',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._routes = None
+
+    def __int__(self):
+        return int(self._id.replace('AS',''))
+
+    async def resolve_routes(self):
+        if self._routes is None:
+            self._routes = [route async for route in self._api.search(
+                query_string = self._id,
+                inverse_attribute = 'origin',
+                type_filter = ['route','route6']
+            )]
+        return self._routes
+
+
+class AsyncInetNum(AsyncRipeObject):
+    __slots__ = ()
+
+    async def get(self, id = None, prefix = None, **kwargs):
+        if prefix is not None:
+            network = ip_network(prefix, strict = True)
+            id = f'{network.network_address} - {network.broadcast_address}'
+        return await super().get(id, **kwargs)
+
+
+async_object_types = {
+    'as-set': AsyncASSet,
+    'aut-num': AsyncAutNum,
+    'inetnum': AsyncInetNum,
+}
@@ -0,0 +1,223 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from . import logger as parent_logger
+from . objects import empty_object
+
+logger = parent_logger.getChild('batch')
+
+# RPSL list attributes, member-of: AS-A, AS-B references both sets
+list_attributes = ('members', 'member-of', 'mbrs-by-ref')
+
+def reference_value(value):
+    # mnt-routes and friends may carry more than the referenced key
+    value = value.split('#', 1)[0].strip()
+    return value.split()[0].upper() if value != '' else None
+
+def referencing(schema, name):
+    # inverse keys reference other objects, set members are no inverse keys but reference them as well
+    if name == 'members':
+        return True
+    return schema is not None and name in schema and 'INVERSE_KEY' in schema.attributes[name].keys
+
+def reference_values(name, value):
+    items = value.split('#', 1)[0].split(',') if name in list_attributes else [value]
+    return [reference for reference in map(reference_value, items) if reference is not None]
+
+
+class BatchOperation():
+    # One queued write, status is pending, ok, failed, skipped or with dry run valid or invalid.
+    def __init__(self, action, object_type, id, obj = None, attributes = None, update_type = None, depends_on = ()):
+        self.action = action
+        self.type = object_type
+        self.id = id
+        self.object = obj
+        self.attributes = attributes
+        self.update_type = update_type
+        self.dependencies = list(depends_on)
+        self.status = 'pending'
+        self.error = None
+
+    def references(self, schema = None):
+        # keys referenced by the new attributes (only those of attributes referencing objects by the schema),
+        # other operations of the batch are returned as they are
+        references = []
+        for name, value in (self.attributes or {}).items():
+            for item in (value if isinstance(value, list) else [value]):
+                if isinstance(item, BatchOperation):
+                    references.append(item)
+                elif isinstance(item, str) and referencing(schema, name):
+                    references += reference_values(name, item)
+        return references
+
+    def current_references(self):
+        # keys referenced by the object as it is now, only known for objects that are already loaded
+        if self.object is None or not self.object._loaded:
+            return []
+        return [
+            reference for attr in self.object._attributes if referencing(self.object._schema, attr.name)
+            for reference in reference_values(attr.name, attr.value)
+        ]
+
+    def __repr__(self):
+        return f'<BatchOperation {self.action} {self.type} {self.id} {self.status}>'
+
+
+class Batch():
+    # Unit of work collecting creates, updates and deletes and applying them in dependency order.
+    # Operations whose dependencies are done run concurrently, operations depending on a failed one are skipped.
+    def __init__(self, api, workers = 4, dry_run = False):
+        self._api = api
+        self._workers = workers
+        self._dry_run = dry_run
+        self._operations = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+    def __len__(self):
+        return len(self._operations)
+
+    @property
+    def operations(self):
+        return list(self._operations)
+
+    @property
+    def errors(self):
+        return [op for op in self._operations if op.status in ('failed', 'invalid', 'skipped')]
+
+    def _add(self, op):
+        self._operations.append(op)
+        return op
+
+    def create(self, object_type, id, attributes, depends_on = ()):
+        # attribute values may be operations of this batch, they are replaced by the id of the created object
+        return self._add(BatchOperation('create', object_type, id, attributes = dict(attributes), depends_on = depends_on))
+
+    def update(self, obj, attributes, update_type = 'replace', depends_on = ()):
+        return self._add(BatchOperation('update', obj.type, obj.id, obj, dict(attributes), update_type, depends_on))
+
+    def delete(self, obj, depends_on = ()):
+        return self._add(BatchOperation('delete', obj.type, obj.id, obj, depends_on = depends_on))
+
+    def _dependencies(self):
+        # ids of AUTO-n creates are only placeholders, those are referenced through the operation itself
+        created = {}
+        for op in self._operations:
+            if op.action == 'create' and not op.id.upper().startswith('AUTO-'):
+                created[op.id.upper()] = op
+        deleted = {}
+        for op in self._operations:
+            if op.action == 'delete':
+                deleted.setdefault(op.id.upper(), []).append(op)
+        dependencies = {op: list(op.dependencies) for op in self._operations}
+        for op in self._operations:
+            for reference in op.references(self._api.get_schema(op.type)):
+                dependency = reference if isinstance(reference, BatchOperation) else created.get(reference)
+                if dependency is not None and dependency is not op and dependency not in dependencies[op]:
+                    dependencies[op].append(dependency)
+            # an object may only be deleted once nothing in the batch references it any more
+            if op.action in ('update', 'delete'):
+                for reference in op.current_references():
+                    for delete_op in deleted.get(reference, ()):
+                        if delete_op is not op and op not in dependencies[delete_op]:
+                            dependencies[delete_op].append(op)
+        return dependencies
+
+    def plan(self):
+        # operations grouped into levels, each level only depends on the previous ones
+        dependencies = self._dependencies()
+        remaining = {op: set(dependencies[op]) for op in self._operations}
+        levels = []
+        while remaining:
+            level = [op for op in self._operations if op in remaining and not remaining[op]]
+            if not level:
+                raise ValueError(f'Dependency cycle in batch: {", ".join(repr(op) for op in remaining)}')
+            for op in level:
+                del remaining[op]
+            for deps in remaining.values():
+                deps.difference_update(level)
+            levels.append(level)
+        return levels
+
+    def _resolve(self, attributes):
+        resolved = {}
+        for name, value in attributes.items():
+            if isinstance(value, list):
+                resolved[name] = [self._resolve_value(item) for item in value]
+            else:
+                resolved[name] = self._resolve_value(value)
+        return resolved
+
+    def _resolve_value(self, value):
+        if not isinstance(value, BatchOperation):
+            return value
+        if self._dry_run or value.object is None:
+            return value.id
+        return value.object.id
+
+    def _run(self, op):
+        try:
+            if op.action == 'create':
+                obj = empty_object(self._api, op.type)
+                if self._dry_run:
+                    obj._create_data(op.id, self._resolve(op.attributes))
+                else:
+                    op.object = obj.create(op.id, self._resolve(op.attributes))
+            elif op.action == 'update':
+                if self._dry_run and not op.object._loaded:
+                    # a dry run does not fetch lazy objects, only the new attributes are checked
+                    op.object._check_update(self._resolve(op.attributes), op.update_type)
+                elif self._dry_run:
+                    op.object._update_data(self._resolve(op.attributes), op.update_type)
+                else:
+                    op.object.update(self._resolve(op.attributes), op.update_type)
+            elif self._dry_run:
+                op.object._check_delete()
+            else:
+                op.object.delete()
+            op.status = 'valid' if self._dry_run else 'ok'
+        except Exception as e:
+            logger.debug(f'{op!r}: {e!r}')
+            op.status = 'invalid' if self._dry_run else 'failed'
+            op.error = e
+        return op
+
+    def commit(self):
+        # returns the operations in the order they were added
+        dependencies = self._dependencies()
+        # the plan also checks the batch for dependency cycles
+        self.plan()
+        remaining = {op: set(dependencies[op]) for op in self._operations}
+        dependents = {op: [] for op in self._operations}
+        for op, deps in dependencies.items():
+            for dependency in deps:
+                dependents[dependency].append(op)
+        futures = {}
+        with ThreadPoolExecutor(max_workers = self._workers) as pool:
+            def schedule(op):
+                failed = [dependency for dependency in dependencies[op] if dependency.status not in ('ok', 'valid')]
+                if failed:
+                    op.status = 'skipped'
+                    op.error = ValueError(f'Dependency not applied: {", ".join(repr(dependency) for dependency in failed)}')
+                    release(op)
+                else:
+                    futures[pool.submit(self._run, op)] = op
+
+            def release(op):
+                for dependent in dependents[op]:
+                    remaining[dependent].discard(op)
+                    if not remaining[dependent]:
+                        schedule(dependent)
+
+            for op in self._operations:
+                if not remaining[op]:
+                    schedule(op)
+            while futures:
+                done, _ = wait(list(futures), return_when = FIRST_COMPLETED)
+                for future in done:
+                    release(futures.pop(future))
+        logger.debug(f'Batch of {len(self._operations)} operations applied, {len(self.errors)} errors')
+        return self.operations
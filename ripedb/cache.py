@@ -0,0 +1,120 @@
+import threading, time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+class ObjectCache():
+    # Identity map of RipeObjects keyed by (type, primary key) with LRU and TTL eviction.
+    # max_size = 0 disables the cache, ttl = None keeps objects until evicted by size.
+    def __init__(self, max_size = 10000, ttl = 300):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, object_type, id):
+        return (object_type, id.upper())
+
+    def get(self, object_type, id):
+        if self._max_size == 0 or id is None:
+            return None
+        key = self._key(object_type, id)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and (self._ttl is None or item[1] > time.monotonic()):
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, obj):
+        if self._max_size == 0 or obj._key is None:
+            return obj
+        key = self._key(obj._type, obj._key)
+        expires = None if self._ttl is None else time.monotonic() + self._ttl
+        with self._lock:
+            self._items[key] = (obj, expires)
+            self._items.move_to_end(key)
+            if self._max_size is not None:
+                while len(self._items) > self._max_size:
+                    self._items.popitem(last = False)
+        return obj
+
+    def add(self, obj):
+        # put unless another thread already stored a live instance, returns the one in the map
+        if self._max_size == 0 or obj._key is None:
+            return obj
+        key = self._key(obj._type, obj._key)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and (self._ttl is None or item[1] > time.monotonic()):
+                self._items.move_to_end(key)
+                return item[0]
+        return self.put(obj)
+
+    def invalidate(self, object_type, id):
+        with self._lock:
+            self._items.pop(self._key(object_type, id), None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._items),
+                'max_size': self._max_size,
+                'ttl': self._ttl,
+            }
+
+
+class SingleFlight():
+    # Coalesces concurrent calls with the same key, one call runs and every caller
+    # arriving meanwhile gets its result (or exception). Finished calls are not remembered.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, function, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+        try:
+            future.set_result(function(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                # forget() may have replaced the call already
+                if self._calls.get(key) is future:
+                    del self._calls[key]
+        return future.result()
+
+    def forget(self):
+        # callers arriving after a write must not join calls started before it
+        with self._lock:
+            self._calls.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'shared': self.shared,
+                'in_flight': len(self._calls),
+            }
@@ -0,0 +1,473 @@
+import itertools, json, os, re, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+from . import logger as parent_logger
+from . objects import lazy_object, object_from_json, primary_key
+from . prefixes import route_prefix, parse_prefix, build_prefix_list
+
+logger = parent_logger.getChild('expand')
+
+aut_num_re = re.compile(r'^AS\d+$', re.IGNORECASE)
+
+EXPANSION_STATE_FORMAT = 1
+
+def member_names(json_data):
+    # members may hold comma separated lists and trailing comments
+    names = []
+    for attr in json_data['attributes']['attribute']:
+        if attr['name'] != 'members':
+            continue
+        value = attr['value'].split('#', 1)[0]
+        names += [name.strip().upper() for name in value.split(',') if name.strip() != '']
+    return names
+
+def attribute_value(json_data, name):
+    for attr in json_data['attributes']['attribute']:
+        if attr['name'] == name:
+            return attr['value']
+    return None
+
+def root_name(as_set):
+    return (as_set if isinstance(as_set, str) else as_set.id).upper()
+
+def skipped_names(seen):
+    # members already expanded by the caller, they are neither expanded nor returned again
+    return {name.upper() for name in seen} if seen is not None else set()
+
+def accepts_references(json_data):
+    # member-of references count only for as-sets with mbrs-by-ref, others are never searched
+    return json_data is not None and attribute_value(json_data, 'mbrs-by-ref') is not None
+
+
+class ExpansionResult():
+    def __init__(self, root):
+        self.root = root
+        # as-set id -> list of member ids, both direct and member-of
+        self.tree = {}
+        # first discovery of each node, used to walk the path back to the root
+        self.parents = {root: None}
+        self.depths = {root: 0}
+        self.as_sets = {}
+        self.aut_nums = {}
+        # (as-set, member) edges that point back to an as-set on the path to the root
+        self.cycles = []
+        self.missing = []
+        self.truncated = False
+        self.stats = {
+            'levels': [],
+            'requests': 0,
+            'as_sets': 0,
+            'aut_nums': 0,
+            'elapsed': 0.0,
+        }
+
+    def path(self, node_id):
+        path = []
+        while node_id is not None:
+            path.append(node_id)
+            node_id = self.parents.get(node_id)
+        return list(reversed(path))
+
+    def __len__(self):
+        return len(self.as_sets) + len(self.aut_nums)
+
+
+class ASSetExpander():
+    # Breadth-first expansion, one level of as-sets at a time. The levels are expanded on JSON objects by
+    # _expand_level, the requests are sent by expand(), so the asyncio client shares all of it but the I/O.
+    def __init__(self, api, workers = 8, max_depth = None, max_objects = None, fetch_aut_nums = False):
+        self._api = api
+        self._workers = workers
+        self._max_depth = max_depth
+        self._max_objects = max_objects
+        self._fetch_aut_nums = fetch_aut_nums
+
+    def _get_as_set(self, name):
+        return self._api.get_object_json('as-set', name)
+
+    def _get_member_of(self, name):
+        return self._api.search_json(
+            query_string = name,
+            type_filter = ['aut-num', 'as-set'],
+            inverse_attribute = 'member-of'
+        )
+
+    def _get_aut_num(self, name):
+        return self._api.get_object_json('aut-num', name)
+
+    def _aut_num(self, name):
+        return lazy_object(self._api, 'aut-num', name)
+
+    def _over_budget(self, result):
+        return self._max_objects is not None and len(result) >= self._max_objects
+
+    def expand(self, as_set, seen = None):
+        result = ExpansionResult(root_name(as_set))
+        skip = skipped_names(seen)
+        started = time.monotonic()
+        level = [result.root]
+        with ThreadPoolExecutor(max_workers = self._workers) as pool:
+            while level:
+                level_started = time.monotonic()
+                # the as-sets of the whole level are fetched concurrently, then the member-of searches
+                # of those accepting members by reference
+                fetched = list(pool.map(self._get_as_set, level))
+                by_reference = [name for name, json_data in zip(level, fetched) if accepts_references(json_data)]
+                member_of = dict(zip(by_reference, pool.map(self._get_member_of, by_reference)))
+                level = self._expand_level(result, level, fetched, member_of, skip, level_started)
+            pending = self._pending_aut_nums(result)
+            self._add_aut_nums(result, pending, pool.map(self._get_aut_num, pending))
+        result.as_sets = {name: object_from_json(self._api, json_data) for name, json_data in result.as_sets.items()}
+        result.aut_nums = {
+            name: object_from_json(self._api, json_data) if json_data is not None else self._aut_num(name)
+            for name, json_data in result.aut_nums.items()
+        }
+        return self._finish(result, seen, started)
+
+    def _expand_level(self, result, level, fetched, member_of, skip, level_started):
+        # adds a level of as-sets from their JSON objects (None when missing) and the results of their member-of
+        # searches, as-sets and aut-nums are kept as JSON (None when not known yet) until the expansion ends.
+        # Returns the as-sets of the next level.
+        depth = len(result.stats['levels'])
+        result.stats['requests'] += len(level) + len(member_of)
+        next_level = []
+        for name, json_data in zip(level, fetched):
+            if json_data is None:
+                result.missing.append(name)
+                result.as_sets.pop(name, None)
+                continue
+            result.as_sets[name] = json_data
+            members = [(member, None) for member in member_names(json_data)]
+            members += [(primary_key(member).upper(), member) for member in member_of.get(name, ())]
+            result.tree[name] = []
+            for member_id, member in members:
+                if member_id in result.tree[name]:
+                    continue
+                result.tree[name].append(member_id)
+                if member_id in result.parents:
+                    if member_id in result.path(name):
+                        result.cycles.append((name, member_id))
+                    continue
+                if member_id in skip:
+                    continue
+                if self._over_budget(result):
+                    result.truncated = True
+                    continue
+                is_aut_num = member['type'] == 'aut-num' if member is not None else aut_num_re.match(member_id)
+                result.parents[member_id] = name
+                result.depths[member_id] = depth + 1
+                if is_aut_num:
+                    result.aut_nums[member_id] = member
+                elif self._max_depth is not None and depth + 1 > self._max_depth:
+                    result.truncated = True
+                else:
+                    next_level.append(member_id)
+                    # reserve the budget slot until the as-set is fetched on the next level
+                    result.as_sets[member_id] = None
+        result.stats['levels'].append({
+            'depth': depth,
+            'as_sets': len(level),
+            'elapsed': time.monotonic() - level_started,
+        })
+        return next_level
+
+    def _pending_aut_nums(self, result):
+        # aut-nums known only by their name, fetched with fetch_aut_nums
+        if not self._fetch_aut_nums:
+            return []
+        pending = [name for name, json_data in result.aut_nums.items() if json_data is None]
+        result.stats['requests'] += len(pending)
+        return pending
+
+    def _add_aut_nums(self, result, pending, fetched):
+        for name, json_data in zip(pending, fetched):
+            if json_data is None:
+                result.missing.append(name)
+            result.aut_nums[name] = json_data
+
+    def _finish(self, result, seen, started):
+        if seen is not None:
+            # the names found are added to the caller's seen collection, the root is not
+            add = seen.add if isinstance(seen, set) else seen.append
+            for name in itertools.chain(result.as_sets, result.aut_nums):
+                if name != result.root and name not in seen:
+                    add(name)
+        result.stats['as_sets'] = len(result.as_sets)
+        result.stats['aut_nums'] = len(result.aut_nums)
+        result.stats['elapsed'] = time.monotonic() - started
+        logger.debug(result.stats)
+        return result
+
+    def resolve_routes(self, aut_nums):
+        routes = []
+        with ThreadPoolExecutor(max_workers = self._workers) as pool:
+            for aut_num_routes in pool.map(lambda aut_num: list(aut_num.resolve_routes()), aut_nums):
+                routes += aut_num_routes
+        return routes
+
+
+class ExpansionState():
+    # Persistent state of incremental expansions, the last-modified of every visited as-set and aut-num
+    # together with its members or routes, and the last result of every expanded root.
+    def __init__(self, path = None):
+        self.path = path
+        # name -> {'type', 'last_modified', 'members', 'mbrs_by_ref', 'member_of' or 'routes', 'checked'}
+        self.nodes = {}
+        # root -> {'as_sets', 'aut_nums', 'prefixes', 'updated'}
+        self.roots = {}
+        if path is not None:
+            self.load(path)
+
+    def load(self, path):
+        # a missing or foreign state file starts a full expansion
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return self
+        if data.get('format') != EXPANSION_STATE_FORMAT:
+            logger.debug(f'Ignoring expansion state {path} with format {data.get("format")}')
+            return self
+        self.nodes = data['nodes']
+        self.roots = data['roots']
+        return self
+
+    def save(self, path = None):
+        path = path or self.path
+        if path is None:
+            raise ValueError('No path to save the expansion state to')
+        data = {
+            'format': EXPANSION_STATE_FORMAT,
+            'nodes': self.nodes,
+            'roots': self.roots,
+        }
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok = True)
+        fd, tmp_path = tempfile.mkstemp(dir = directory, suffix = '.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def prune(self):
+        # drops nodes no root reaches anymore
+        used = set(self.roots)
+        for root in self.roots.values():
+            used.update(root['as_sets'])
+            used.update(root['aut_nums'])
+        for name in [name for name in self.nodes if name not in used]:
+            del self.nodes[name]
+
+
+class IncrementalResult():
+    def __init__(self, root):
+        self.root = root
+        self.as_sets = []
+        self.aut_nums = []
+        # as-set -> member names, aut-num -> route prefixes
+        self.tree = {}
+        self.routes = {}
+        self.prefixes = []
+        self.missing = []
+        # nodes whose last-modified differs from the state (or that are new)
+        self.changed = []
+        self.truncated = False
+        # no earlier result of the root, everything is added
+        self.initial = True
+        self.diff = {}
+        self.stats = {
+            'requests': 0,
+            'searches': 0,
+            'reused': 0,
+            'elapsed': 0.0,
+        }
+
+    @property
+    def has_changes(self):
+        return any(change['added'] or change['removed'] for change in self.diff.values())
+
+    def prefix_list(self, **kwargs):
+        return build_prefix_list((parse_prefix(prefix) for prefix in self.prefixes), **kwargs)
+
+    def _compare(self, previous):
+        self.initial = previous is None
+        previous = previous or {}
+        for name in ('as_sets', 'aut_nums', 'prefixes'):
+            before = set(previous.get(name, ()))
+            after = set(getattr(self, name))
+            self.diff[name] = {
+                'added': sorted(after - before),
+                'removed': sorted(before - after),
+            }
+
+    def __len__(self):
+        return len(self.as_sets) + len(self.aut_nums)
+
+
+class IncrementalExpander():
+    # Re-expands as-sets against an ExpansionState, fetching only what changed since it was recorded.
+    # Nodes checked less than max_age (seconds) ago are reused without any request. Older ones are looked up
+    # again, their last-modified decides whether their members are read again. Routes and member-of
+    # references are separate objects which do not change the last-modified of the objects they point to,
+    # so the searches of older nodes run again as well; 0 checks everything on every refresh.
+    # With max_age None every node is looked up and searches run only for new and changed objects.
+    # As-sets without mbrs-by-ref cannot gain members by reference and are never searched, like in expand().
+    # With check_aut_nums = False aut-nums are not looked up, their routes are refreshed by max_age only.
+    def __init__(self, api, state, workers = 8, max_age = 3600, max_depth = None, check_aut_nums = True):
+        self._api = api
+        self._state = state
+        self._workers = workers
+        self._max_age = max_age
+        self._max_depth = max_depth
+        self._check_aut_nums = check_aut_nums
+
+    def _node(self, result, name, object_type, json_data):
+        # state node of the object, reset when it changed
+        modified = attribute_value(json_data, 'last-modified') if json_data is not None else None
+        node = self._state.nodes.get(name)
+        if node is not None and node['type'] == object_type and node['last_modified'] == modified:
+            # objects without last-modified cannot be compared, their searches always run
+            return node, modified is None
+        node = self._state.nodes[name] = {'type': object_type, 'last_modified': modified}
+        result.changed.append(name)
+        return node, True
+
+    def _expired(self, node, now):
+        return self._max_age is not None and now - node.get('checked', 0) >= self._max_age
+
+    def _fresh(self, name, object_type, data, now):
+        # whether the node holds data checked within max_age, it is reused without looking it up
+        node = self._state.nodes.get(name)
+        return (self._max_age is not None and node is not None and node['type'] == object_type
+            and data in node and not self._expired(node, now))
+
+    def _member_of(self, name):
+        json_objects = self._api.search_json(
+            query_string = name,
+            type_filter = ['aut-num', 'as-set'],
+            inverse_attribute = 'member-of',
+            refresh = True
+        )
+        return [[primary_key(json_data).upper(), json_data['type']] for json_data in json_objects]
+
+    def _routes(self, name):
+        json_objects = self._api.search_json(
+            query_string = name,
+            inverse_attribute = 'origin',
+            type_filter = ['route', 'route6'],
+            refresh = True
+        )
+        return sorted({prefix for prefix in map(route_prefix, json_objects) if prefix is not None})
+
+    def refresh(self, as_set):
+        root = root_name(as_set)
+        result = IncrementalResult(root)
+        started = time.monotonic()
+        now = time.time()
+        with ThreadPoolExecutor(max_workers = self._workers) as pool:
+            self._refresh_as_sets(result, pool, now)
+            self._refresh_routes(result, pool, now)
+        result.prefixes = sorted({prefix for name in result.aut_nums for prefix in result.routes[name]})
+        result._compare(self._state.roots.get(root))
+        self._state.roots[root] = {
+            'as_sets': result.as_sets,
+            'aut_nums': result.aut_nums,
+            'prefixes': result.prefixes,
+            'updated': now,
+        }
+        self._state.prune()
+        result.stats['elapsed'] = time.monotonic() - started
+        logger.debug(result.stats)
+        return result
+
+    def _refresh_as_sets(self, result, pool, now):
+        level = [result.root]
+        seen = {result.root}
+        depth = 0
+        while level:
+            lookup = [name for name in level if not self._fresh(name, 'as-set', 'member_of', now)]
+            fetched = dict(zip(lookup, pool.map(lambda name: self._api.get_object_json('as-set', name, refresh = True), lookup)))
+            result.stats['requests'] += len(lookup)
+            found = []
+            searches = []
+            for name in level:
+                if name not in fetched:
+                    result.stats['reused'] += 1
+                    found.append(name)
+                    continue
+                json_data = fetched[name]
+                if json_data is None:
+                    result.missing.append(name)
+                    self._state.nodes.pop(name, None)
+                    continue
+                node, changed = self._node(result, name, 'as-set', json_data)
+                if changed:
+                    node['members'] = member_names(json_data)
+                    node['mbrs_by_ref'] = accepts_references(json_data)
+                if not node['mbrs_by_ref']:
+                    node['member_of'] = []
+                    node['checked'] = now
+                elif changed or 'member_of' not in node or self._expired(node, now):
+                    searches.append(name)
+                else:
+                    result.stats['reused'] += 1
+                found.append(name)
+            result.stats['requests'] += len(searches)
+            result.stats['searches'] += len(searches)
+            for name, member_of in zip(searches, pool.map(self._member_of, searches)):
+                self._state.nodes[name]['member_of'] = member_of
+                self._state.nodes[name]['checked'] = now
+            next_level = []
+            for name in found:
+                node = self._state.nodes[name]
+                result.as_sets.append(name)
+                members = [(member, None) for member in node['members']] + [tuple(member) for member in node['member_of']]
+                result.tree[name] = []
+                for member, member_type in members:
+                    if member in result.tree[name]:
+                        continue
+                    result.tree[name].append(member)
+                    if member in seen:
+                        continue
+                    seen.add(member)
+                    if member_type == 'aut-num' or member_type is None and aut_num_re.match(member):
+                        result.aut_nums.append(member)
+                    elif self._max_depth is not None and depth + 1 > self._max_depth:
+                        result.truncated = True
+                    else:
+                        next_level.append(member)
+            level = next_level
+            depth += 1
+
+    def _refresh_routes(self, result, pool, now):
+        lookup = []
+        if self._check_aut_nums:
+            lookup = [name for name in result.aut_nums if not self._fresh(name, 'aut-num', 'routes', now)]
+        fetched = dict(zip(lookup, pool.map(lambda name: self._api.get_object_json('aut-num', name, refresh = True), lookup)))
+        result.stats['requests'] += len(lookup)
+        searches = []
+        for name in result.aut_nums:
+            if name in fetched:
+                if fetched[name] is None:
+                    # routes may name an origin without an aut-num, there is no last-modified to compare
+                    result.missing.append(name)
+                node, changed = self._node(result, name, 'aut-num', fetched[name])
+            else:
+                node = self._state.nodes.get(name)
+                changed = node is None or node['type'] != 'aut-num'
+                if changed:
+                    node = self._state.nodes[name] = {'type': 'aut-num', 'last_modified': None}
+                    result.changed.append(name)
+            if changed or 'routes' not in node or self._expired(node, now):
+                searches.append(name)
+            else:
+                result.stats['reused'] += 1
+        result.stats['requests'] += len(searches)
+        result.stats['searches'] += len(searches)
+        for name, routes in zip(searches, pool.map(self._routes, searches)):
+            self._state.nodes[name]['routes'] = routes
+            self._state.nodes[name]['checked'] = now
+        for name in result.aut_nums:
+            result.routes[name] = self._state.nodes[name]['routes']
@@ -0,0 +1,256 @@
+import csv, json
+from itertools import islice
+from . import logger as parent_logger
+from . objects import RipeObject, primary_key
+from . objects.schema import initial_schemas
+from . prefixes import parse_prefix, address_bits
+from . radix import indexed_types, parse_range
+from . rpsl import open_dump, iter_rpsl_objects
+
+logger = parent_logger.getChild('export')
+
+base_columns = ('type', 'key', 'source')
+# address range of inetnum, inet6num, route and route6 objects as integers
+range_columns = ('version', 'first', 'last')
+
+
+def iter_records(objects, schemas):
+    # (type, key, source, [(name, value)]) of JSON objects, RipeObjects and RPSL attribute lists,
+    # a str is the path of a dump
+    if isinstance(objects, str):
+        with open_dump(objects) as f:
+            yield from iter_records(iter_rpsl_objects(f), schemas)
+        return
+    for obj in objects:
+        if isinstance(obj, dict):
+            attributes = [(attr['name'], attr['value']) for attr in obj['attributes']['attribute']]
+            source = obj.get('source', {}).get('id')
+            yield (obj['type'], primary_key(obj), source.upper() if source else None, attributes)
+            continue
+        if isinstance(obj, RipeObject):
+            # attributes of lazy objects are not fetched
+            attributes = [(attr.name, attr.value) for attr in obj._attributes]
+            object_type, key = obj._type, obj._key
+        else:
+            attributes = [(attr[0], attr[1]) for attr in obj]
+            object_type = attributes[0][0]
+            schema = schemas.get(object_type)
+            names = schema.primary_key if schema is not None and schema.primary_key else (object_type,)
+            key = ''.join(next((value for name, value in attributes if name == key_name), '') for key_name in names)
+        source = next((value for name, value in attributes if name == 'source'), None)
+        yield (object_type, key, source.upper() if source else None, attributes)
+
+
+class ColumnBatch():
+    # Columns of a chunk of objects, name -> list of values. Attributes that may repeat are list columns
+    # (empty lists when absent), the others hold the first value or None.
+    def __init__(self, columns, multiple = ()):
+        self.columns = columns
+        self.multiple = set(multiple)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), ()))
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def rows(self):
+        names = list(self.columns)
+        for values in zip(*self.columns.values()):
+            yield dict(zip(names, values))
+
+    def _integer(self, values):
+        # integer columns without gaps
+        return bool(values) and all(type(value) is int for value in values)
+
+    def to_numpy(self):
+        # name -> array, integer columns without gaps are numeric (addresses when fitting 64 bits),
+        # everything else object arrays
+        import numpy
+        arrays = {}
+        for name, values in self.columns.items():
+            if self._integer(values) and (name not in ('first', 'last') or max(values) < 1 << 64):
+                dtype = numpy.uint8 if name == 'version' else numpy.uint64 if name in range_columns else numpy.int64
+                arrays[name] = numpy.array(values, dtype = dtype)
+                continue
+            array = numpy.empty(len(values), dtype = object)
+            for i, value in enumerate(values):
+                array[i] = value
+            arrays[name] = array
+        return arrays
+
+    def to_pandas(self):
+        import pandas
+        return pandas.DataFrame(self.to_numpy())
+
+    def arrow_schema(self):
+        # the same for batches with the same columns, attributes are always strings; addresses are 16 byte big endian
+        import pyarrow
+        fields = []
+        for name in self.columns:
+            if name == 'version':
+                field_type = pyarrow.uint8()
+            elif name in ('first', 'last'):
+                field_type = pyarrow.binary(16)
+            elif name in self.multiple:
+                field_type = pyarrow.list_(pyarrow.string())
+            elif self._integer([value for value in self.columns[name] if value is not None]):
+                field_type = pyarrow.int64()
+            else:
+                field_type = pyarrow.string()
+            fields.append(pyarrow.field(name, field_type))
+        return pyarrow.schema(fields)
+
+    def to_arrow(self):
+        import pyarrow
+        schema = self.arrow_schema()
+        arrays = []
+        for field in schema:
+            values = self.columns[field.name]
+            if field.name in ('first', 'last'):
+                values = [value.to_bytes(16, 'big') if value is not None else None for value in values]
+            arrays.append(pyarrow.array(values, type = field.type))
+        return pyarrow.RecordBatch.from_arrays(arrays, schema = schema)
+
+
+class ColumnExporter():
+    # Turns JSON objects (e.g. api.search_json(..., stream = True)), RPSL dumps and RipeObjects into ColumnBatches
+    # of batch_size objects without building RipeObjects. columns lists the exported attributes, None takes
+    # every attribute of each batch (so batches may differ, CSV keeps the columns of the first one).
+    def __init__(self, columns = None, batch_size = 10000, ranges = True, schemas = None):
+        self._columns = tuple(columns) if columns is not None else None
+        self._batch_size = batch_size
+        self._ranges = ranges
+        # bundled schemas tell the primary keys of dump objects and which attributes may repeat
+        self._schemas = schemas if schemas is not None else initial_schemas(None)
+        self._multiple = {}
+
+    def _is_multiple(self, name):
+        # stable across types and batches, attributes unknown to every schema are lists
+        multiple = self._multiple.get(name)
+        if multiple is None:
+            known = [schema for schema in self._schemas.values() if name in schema]
+            multiple = self._multiple[name] = not known or any(schema.is_multiple(name) for schema in known)
+        return multiple
+
+    def batches(self, objects):
+        records = iter_records(objects, self._schemas)
+        while True:
+            chunk = list(islice(records, self._batch_size))
+            if not chunk:
+                return
+            yield self._batch(chunk)
+
+    def _batch(self, records):
+        columns = self._columns
+        if columns is None:
+            seen = {}
+            for record in records:
+                for name, value in record[3]:
+                    seen[name] = None
+            columns = tuple(seen)
+        names = base_columns + (range_columns if self._ranges else ()) + tuple(name for name in columns if name not in base_columns)
+        data = {name: [] for name in names}
+        multiple = [name for name in columns if name not in base_columns and self._is_multiple(name)]
+        single = [name for name in columns if name not in multiple and name not in base_columns]
+        for object_type, key, source, attributes in records:
+            data['type'].append(object_type)
+            data['key'].append(key)
+            data['source'].append(source)
+            values = {}
+            for name, value in attributes:
+                values.setdefault(name, []).append(value)
+            if self._ranges:
+                address_range = None
+                if object_type in indexed_types and object_type in values:
+                    try:
+                        address_range = parse_range(values[object_type][0])
+                    except (ValueError, OSError):
+                        logger.debug(f'Invalid address range of {object_type} {key}')
+                for name, value in zip(range_columns, address_range or (None, None, None)):
+                    data[name].append(value)
+            for name in multiple:
+                data[name].append(values.get(name, []))
+            for name in single:
+                data[name].append(values[name][0] if name in values else None)
+        return ColumnBatch(data, multiple)
+
+    def to_columns(self, objects):
+        # everything in one batch
+        columns = None
+        for batch in ColumnExporter(self._columns, None, self._ranges, self._schemas).batches(objects):
+            columns = batch
+        return columns if columns is not None else ColumnBatch({name: [] for name in base_columns})
+
+    def write_csv(self, objects, file, list_separator = '|'):
+        # list columns are joined by list_separator, returns the number of objects
+        if isinstance(file, str):
+            with open(file, 'w', newline = '') as f:
+                return self.write_csv(objects, f, list_separator)
+        writer = None
+        names = None
+        count = 0
+        for batch in self.batches(objects):
+            if writer is None:
+                names = list(batch.columns)
+                writer = csv.writer(file)
+                writer.writerow(names)
+            columns = []
+            for name in names:
+                # columns missing from a later batch stay empty, new ones are dropped
+                values = batch.columns.get(name, [None] * len(batch))
+                if name in batch.multiple:
+                    values = [list_separator.join(value) for value in values]
+                columns.append(values)
+            writer.writerows(zip(*columns))
+            count += len(batch)
+        return count
+
+    def write_jsonl(self, objects, file):
+        # one JSON object per line, returns the number of objects
+        if isinstance(file, str):
+            with open(file, 'w') as f:
+                return self.write_jsonl(objects, f)
+        count = 0
+        for batch in self.batches(objects):
+            file.writelines(json.dumps(row) + '\n' for row in batch.rows())
+            count += len(batch)
+        return count
+
+
+def export_batches(objects, columns = None, batch_size = 10000, **kwargs):
+    return ColumnExporter(columns, batch_size, **kwargs).batches(objects)
+
+def to_columns(objects, columns = None, **kwargs):
+    return ColumnExporter(columns, **kwargs).to_columns(objects)
+
+def write_csv(objects, file, columns = None, batch_size = 10000, list_separator = '|', **kwargs):
+    return ColumnExporter(columns, batch_size, **kwargs).write_csv(objects, file, list_separator)
+
+def write_jsonl(objects, file, columns = None, batch_size = 10000, **kwargs):
+    return ColumnExporter(columns, batch_size, **kwargs).write_jsonl(objects, file)
+
+def expansion_columns(result):
+    # as-sets and aut-nums of an ExpansionResult or IncrementalResult, their direct members and route prefixes
+    depths = getattr(result, 'depths', {})
+    routes = getattr(result, 'routes', {})
+    data = {name: [] for name in ('type', 'key', 'depth', 'members', 'routes')}
+    for object_type, names in (('as-set', result.as_sets), ('aut-num', result.aut_nums)):
+        for name in names:
+            data['type'].append(object_type)
+            data['key'].append(name)
+            data['depth'].append(depths.get(name))
+            data['members'].append(list(result.tree.get(name, ())) if object_type == 'as-set' else [])
+            data['routes'].append(list(routes.get(name, ())))
+    return ColumnBatch(data, ('members', 'routes'))
+
+def prefix_columns(prefixes):
+    # prefixes as strings, e.g. IncrementalResult.prefixes, with their integer ranges
+    data = {name: [] for name in ('prefix',) + range_columns}
+    for prefix in prefixes:
+        version, first, length = parse_prefix(prefix)
+        data['prefix'].append(prefix)
+        data['version'].append(version)
+        data['first'].append(first)
+        data['last'].append(first + (1 << (address_bits[version] - length)) - 1)
+    return ColumnBatch(data)
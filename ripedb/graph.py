@@ -0,0 +1,322 @@
+import re, sys, time
+from concurrent.futures import ThreadPoolExecutor
+from . import logger as parent_logger
+from . objects import lazy_object, primary_key
+from . objects.schema import initial_schemas
+
+logger = parent_logger.getChild('graph')
+
+braces_re = re.compile(r'\{[^}]*\}')
+
+# object types an attribute may reference, the schemas tell which of these attributes the server searches inversely
+referenced_types = {
+    'mnt-by': ('mntner',),
+    'mnt-lower': ('mntner',),
+    'mnt-routes': ('mntner',),
+    'mnt-domains': ('mntner',),
+    'mnt-ref': ('mntner',),
+    'mbrs-by-ref': ('mntner',),
+    'admin-c': ('person', 'role'),
+    'tech-c': ('person', 'role'),
+    'zone-c': ('person', 'role'),
+    'ping-hdl': ('person', 'role'),
+    'abuse-c': ('role',),
+    'org': ('organisation',),
+    'sponsoring-org': ('organisation',),
+    'mnt-irt': ('irt',),
+    'origin': ('aut-num',),
+    'local-as': ('aut-num',),
+    'member-of': ('as-set', 'route-set', 'rtr-set'),
+}
+
+def inverse_attributes_of(schemas):
+    # type -> attributes flagged INVERSE_KEY in any of the schemas which may reference objects of the type
+    inverse_keys = {
+        attr.name for schema in schemas.values() for attr in schema.attributes.values() if 'INVERSE_KEY' in attr.keys
+    }
+    inverse_attributes = {}
+    for name, object_types in referenced_types.items():
+        if name in inverse_keys:
+            for object_type in object_types:
+                inverse_attributes.setdefault(object_type, []).append(name)
+    return {object_type: tuple(names) for object_type, names in inverse_attributes.items()}
+
+directions = ('both', 'forward', 'reverse')
+
+def reference_values(value):
+    # values may hold comma separated lists, trailing comments and, like mnt-routes, a {prefix list} after the key
+    value = braces_re.sub(' ', value.split('#', 1)[0])
+    return [item.split()[0].upper() for item in value.split(',') if item.strip() != '']
+
+def node_of(obj):
+    # (type, key) of a RipeObject, a JSON object or a (type, key) tuple
+    if isinstance(obj, tuple):
+        return (obj[0], obj[1].upper())
+    if isinstance(obj, dict):
+        return (obj['type'], primary_key(obj).upper())
+    return (obj.type, obj._key.upper())
+
+def forward_references(json_data):
+    # [(attribute, (type, key))] of the linked attributes of an object
+    references = []
+    for attr in json_data['attributes']['attribute']:
+        referenced_type = attr.get('referenced-type')
+        if referenced_type is None:
+            continue
+        for value in reference_values(attr['value']):
+            references.append((sys.intern(attr['name']), (sys.intern(referenced_type), value)))
+    return references
+
+
+class ReferenceGraph():
+    # Compact reference graph, nodes are (type, key) tuples numbered in order of discovery,
+    # edges (source, attribute, target) node numbers where the source object references the target.
+    def __init__(self, api):
+        self._api = api
+        self.nodes = []
+        self.index = {}
+        # node number -> hops from the nearest start node
+        self.depths = {}
+        self.edges = []
+        self._edge_set = set()
+        self.missing = []
+        self.truncated = False
+        self.stats = {
+            'hops': [],
+            'requests': 0,
+            'nodes': 0,
+            'edges': 0,
+            'elapsed': 0.0,
+        }
+
+    def add_node(self, node, depth):
+        node_id = self.index.get(node)
+        if node_id is None:
+            node_id = self.index[node] = len(self.nodes)
+            self.nodes.append(node)
+            self.depths[node_id] = depth
+        return node_id
+
+    def add_edge(self, source, attribute, target):
+        edge = (self.index[source], attribute, self.index[target])
+        if edge not in self._edge_set:
+            self._edge_set.add(edge)
+            self.edges.append(edge)
+
+    def adjacency(self, direction = 'forward'):
+        # node number -> [(attribute, node number)], forward lists what a node references,
+        # reverse what references it
+        adjacency = {}
+        for source, attribute, target in self.edges:
+            if direction == 'forward':
+                adjacency.setdefault(source, []).append((attribute, target))
+            else:
+                adjacency.setdefault(target, []).append((attribute, source))
+        return adjacency
+
+    def references(self, node):
+        node_id = self.index[node_of(node)]
+        return [(attribute, self.nodes[target]) for source, attribute, target in self.edges if source == node_id]
+
+    def referenced_by(self, node):
+        node_id = self.index[node_of(node)]
+        return [(attribute, self.nodes[source]) for source, attribute, target in self.edges if target == node_id]
+
+    def object(self, node):
+        return lazy_object(self._api, *self.nodes[node] if isinstance(node, int) else node_of(node))
+
+    def to_json(self):
+        return {
+            'nodes': [list(node) for node in self.nodes],
+            'edges': [list(edge) for edge in self.edges],
+            'missing': [list(node) for node in self.missing],
+            'truncated': self.truncated,
+        }
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+class ReferenceTraversal():
+    # Builds the reference graph around start objects hop by hop. Every node of a hop costs at most one lookup
+    # (forward references, skipped for objects already returned by a search) and one inverse search asking for all
+    # inverse attributes of its type at once; the requests of a hop run concurrently on workers threads.
+    # max_depth bounds the hops (nodes of the last one are not expanded), max_nodes and max_requests the size
+    # and cost, graph.truncated tells when one of them was hit.
+    # Fetched objects and edges are kept by the traversal and reused by later traversals.
+    def __init__(self, api, direction = 'both', max_depth = 2, workers = 8, max_nodes = None, max_requests = None,
+            inverse_attributes = None, follow = None, types = None, schemas = None):
+        if direction not in directions:
+            raise ValueError(f'Unknown direction {direction}, use one of {", ".join(directions)}')
+        self._api = api
+        self._direction = direction
+        self._max_depth = max_depth
+        self._workers = workers
+        self._max_nodes = max_nodes
+        self._max_requests = max_requests
+        # type -> inverse attributes searched for its objects, taken from the schemas (the bundled snapshot
+        # by default), inverse_attributes adds to or replaces them
+        schemas = schemas if schemas is not None else initial_schemas(None)
+        self._inverse_attributes = dict(inverse_attributes_of(schemas), **(inverse_attributes or {}))
+        # forward edges only along these attributes, None follows all
+        self._follow = set(follow) if follow is not None else None
+        # type filter of the inverse searches
+        self._types = types
+        # node -> JSON object (None when missing), forward and reverse edges
+        self._json = {}
+        self._forward = {}
+        self._reverse = {}
+
+    def clear_cache(self):
+        self._json.clear()
+        self._forward.clear()
+        self._reverse.clear()
+
+    def _get(self, node):
+        return self._api.get_object_json(*node)
+
+    def _search(self, node):
+        return self._api.search_json(node[1],
+            inverse_attribute = list(self._inverse_attributes[node[0]]),
+            type_filter = self._types,
+            flags = 'no-referenced'
+        )
+
+    def _edges_to(self, node, json_objects):
+        # [(source node, attribute)] of the search results referencing node
+        attributes = self._inverse_attributes[node[0]]
+        edges = []
+        for json_data in json_objects:
+            source = node_of(json_data)
+            self._json.setdefault(source, json_data)
+            for attr in json_data['attributes']['attribute']:
+                if attr['name'] in attributes and node[1] in reference_values(attr['value']):
+                    edges.append((source, sys.intern(attr['name'])))
+        return edges
+
+    def _over_budget(self, graph):
+        return self._max_nodes is not None and len(graph) >= self._max_nodes
+
+    def _budget(self, graph, count):
+        # how many of count requests may still be sent
+        if self._max_requests is None:
+            return count
+        return max(0, min(count, self._max_requests - graph.stats['requests']))
+
+    def traverse(self, start):
+        # start is a RipeObject, JSON object, (type, key) or a list of them
+        if not isinstance(start, list):
+            start = [start]
+        graph = ReferenceGraph(self._api)
+        started = time.monotonic()
+        level = []
+        for obj in start:
+            node = node_of(obj)
+            if isinstance(obj, dict):
+                self._json.setdefault(node, obj)
+            if node not in graph.index:
+                graph.add_node(node, 0)
+                level.append(node)
+        depth = 0
+        with ThreadPoolExecutor(max_workers = self._workers) as pool:
+            while level:
+                if depth >= self._max_depth:
+                    # the last hop is not expanded, its edges to the graph come from the objects already known
+                    if any(self._expandable(graph, node) for node in level):
+                        graph.truncated = True
+                    break
+                hop_started = time.monotonic()
+                requests = graph.stats['requests']
+                self._hop(graph, level, pool)
+                next_level = []
+                for node in level:
+                    for target in self._neighbours(node):
+                        if target in graph.index:
+                            continue
+                        if self._over_budget(graph):
+                            graph.truncated = True
+                            continue
+                        graph.add_node(target, depth + 1)
+                        next_level.append(target)
+                graph.stats['hops'].append({
+                    'depth': depth,
+                    'nodes': len(level),
+                    'requests': graph.stats['requests'] - requests,
+                    'elapsed': time.monotonic() - hop_started,
+                })
+                level = next_level
+                depth += 1
+        for node in graph.nodes:
+            self._add_edges(graph, node)
+        graph.missing = [node for node in graph.nodes if node in self._json and self._json[node] is None]
+        graph.stats['nodes'] = len(graph.nodes)
+        graph.stats['edges'] = len(graph.edges)
+        graph.stats['elapsed'] = time.monotonic() - started
+        logger.debug(graph.stats)
+        return graph
+
+    def _hop(self, graph, level, pool):
+        # fetches the objects and runs the inverse searches of one hop, cached ones are not asked again
+        fetch = search = []
+        if self._direction != 'reverse':
+            fetch = [node for node in level if node not in self._json]
+        if self._direction != 'forward':
+            search = [node for node in level if node not in self._reverse and node[0] in self._inverse_attributes]
+        allowed = self._budget(graph, len(fetch) + len(search))
+        if allowed < len(fetch) + len(search):
+            graph.truncated = True
+        fetch = fetch[:allowed]
+        search = search[:allowed - len(fetch)]
+        graph.stats['requests'] += len(fetch) + len(search)
+        fetch_futures = [pool.submit(self._get, node) for node in fetch]
+        search_futures = [pool.submit(self._search, node) for node in search]
+        for node, future in zip(fetch, fetch_futures):
+            self._json[node] = future.result()
+        for node, future in zip(search, search_futures):
+            self._reverse[node] = self._edges_to(node, future.result())
+
+    def _forward_edges(self, node):
+        if node not in self._forward:
+            json_data = self._json.get(node)
+            if json_data is None:
+                return []
+            self._forward[node] = forward_references(json_data)
+        edges = self._forward[node]
+        if self._follow is not None:
+            edges = [(attribute, target) for attribute, target in edges if attribute in self._follow]
+        return edges
+
+    def _expandable(self, graph, node):
+        # whether expanding node could add nodes, edges not known yet count as possible
+        if self._direction != 'reverse':
+            if node not in self._json:
+                return True
+            if any(target not in graph.index for attribute, target in self._forward_edges(node)):
+                return True
+        if self._direction != 'forward' and node[0] in self._inverse_attributes:
+            if node not in self._reverse:
+                return True
+            if any(source not in graph.index for source, attribute in self._reverse[node]):
+                return True
+        return False
+
+    def _neighbours(self, node):
+        if self._direction != 'reverse':
+            for attribute, target in self._forward_edges(node):
+                yield target
+        if self._direction != 'forward':
+            for source, attribute in self._reverse.get(node, ()):
+                yield source
+
+    def _add_edges(self, graph, node):
+        # every known edge between nodes in the graph, whatever the direction of the traversal
+        for attribute, target in self._forward_edges(node):
+            if target in graph.index:
+                graph.add_edge(node, attribute, target)
+        for source, attribute in self._reverse.get(node, ()):
+            if source in graph.index:
+                graph.add_edge(source, attribute, node)
+
+
+def reference_graph(api, start, **kwargs):
+    return ReferenceTraversal(api, **kwargs).traverse(start)
@@ -0,0 +1,408 @@
+import json, re, sqlite3, threading
+from ipaddress import ip_network
+from . import logger as parent_logger
+from . objects import object_from_json, empty_object, project_json, projected_object
+from . objects.schema import initial_schemas
+from . cache import ObjectCache
+from . rest import trimmed_search
+from . rpsl import open_dump, iter_rpsl_objects
+
+logger = parent_logger.getChild('local')
+
+aut_num_re = re.compile(r'^AS\d+$', re.IGNORECASE)
+
+# attributes that reference other objects and the types they may point to
+references = {
+    'admin-c': ('person', 'role'),
+    'tech-c': ('person', 'role'),
+    'zone-c': ('person', 'role'),
+    'ping-hdl': ('person', 'role'),
+    'abuse-c': ('role',),
+    'mnt-by': ('mntner',),
+    'mnt-lower': ('mntner',),
+    'mnt-routes': ('mntner',),
+    'mnt-domains': ('mntner',),
+    'mnt-ref': ('mntner',),
+    'mbrs-by-ref': ('mntner',),
+    'mnt-irt': ('irt',),
+    'org': ('organisation',),
+    'sponsoring-org': ('organisation',),
+    'origin': ('aut-num',),
+}
+# RPSL list attributes, member-of: AS-A, AS-B references both sets
+list_attributes = ('members', 'mp-members', 'member-of', 'mbrs-by-ref')
+set_member_of = {
+    'aut-num': 'as-set',
+    'route': 'route-set',
+    'route6': 'route-set',
+    'inet-rtr': 'rtr-set',
+}
+
+schema_sql = '''
+CREATE TABLE IF NOT EXISTS objects (
+    id INTEGER PRIMARY KEY,
+    type TEXT NOT NULL,
+    key TEXT NOT NULL,
+    source TEXT,
+    attributes TEXT NOT NULL,
+    UNIQUE (type, key)
+);
+CREATE TABLE IF NOT EXISTS keys (
+    object_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    inverse INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS keys_value ON keys (value, name);
+CREATE INDEX IF NOT EXISTS keys_object ON keys (object_id);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+def range_key(query):
+    # inetnum/inet6num keys are address ranges, accept prefixes as well
+    try:
+        network = ip_network(query.strip(), strict = False)
+    except ValueError:
+        return None
+    if network.version == 6:
+        return str(network).upper()
+    return f'{network.network_address} - {network.broadcast_address}'
+
+def key_value(name, value):
+    # mnt-routes and friends may carry a prefix list after the maintainer
+    if name in references:
+        value = value.split()[0] if value.strip() != '' else value
+    return value.strip().upper()
+
+def list_items(name, value):
+    # items of list attributes, any other value is one item
+    if name in list_attributes:
+        return [item.strip() for item in value.split(',') if item.strip() != ''] or [value]
+    return [value]
+
+
+class LocalRipeDBApi():
+    # Read-only API backed by a SQLite store loaded from RIPE split database dumps
+    # and kept current by an NRTM mirror (ripedb.nrtm).
+    _base_url = 'local:'
+    _source = 'RIPE'
+    _mntner = None
+    _password = None
+    _metrics = None
+
+    def __init__(self, path, source = None, object_cache_size = 10000, object_cache_ttl = None, schema_cache = None, bundled_schemas = True):
+        if source is not None:
+            self._source = source
+        self._path = path
+        self._connection = sqlite3.connect(path, check_same_thread = False, isolation_level = None)
+        self._connection.execute('PRAGMA journal_mode = WAL')
+        self._connection.executescript(schema_sql)
+        self._lock = threading.RLock()
+        self._templates = {}
+        self._schemas = initial_schemas(schema_cache, bundled_schemas)
+        self._objects = ObjectCache(object_cache_size, object_cache_ttl)
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def is_writable(self):
+        return False
+
+    def object_cache_stats(self):
+        return self._objects.stats()
+
+    def get_schema(self, object_type):
+        return self._schemas.get(object_type)
+
+    def get_template(self, object_type):
+        schema = self.get_schema(object_type)
+        if schema is None:
+            return None
+        return {'type': object_type, 'attributes': {'attribute': [
+            {'name': attr.name, 'requirement': attr.requirement, 'cardinality': attr.cardinality, 'keys': list(attr.keys)}
+            for attr in schema.attributes.values()
+        ]}}
+
+    def _primary_key(self, object_type, attributes):
+        schema = self.get_schema(object_type)
+        if schema is None or not schema.primary_key:
+            return [attributes[0][:2]]
+        primary_key = []
+        for name in schema.primary_key:
+            for attr in attributes:
+                if attr[0] == name:
+                    primary_key.append(attr[:2])
+                    break
+        return primary_key
+
+    def _keys(self, object_type, attributes):
+        # (name, value, inverse) rows of the lookup index
+        schema = self.get_schema(object_type)
+        rows = []
+        for name, value, comment in attributes:
+            if schema is None:
+                keys = ('LOOKUP_KEY',) if name == object_type else ()
+            elif name in schema:
+                keys = schema.attributes[name].keys
+            else:
+                continue
+            if 'INVERSE_KEY' in keys:
+                rows += [(name, key_value(name, item), 1) for item in list_items(name, value)]
+            if 'LOOKUP_KEY' in keys or 'PRIMARY_KEY' in keys:
+                if name in ('inetnum', 'inet6num'):
+                    value = range_key(value) or value
+                rows.append((name, key_value(name, value), 0))
+        return rows
+
+    def load_dump(self, dump, batch_size = 10000):
+        # dump is a file name (plain or .gz), an open file or an iterable of lines
+        if isinstance(dump, str):
+            with open_dump(dump) as f:
+                return self.load_dump(f, batch_size)
+        count = 0
+        batch = []
+        for attributes in iter_rpsl_objects(dump):
+            batch.append(attributes)
+            if len(batch) >= batch_size:
+                count += self._load_batch(batch)
+                batch = []
+        if batch:
+            count += self._load_batch(batch)
+        logger.debug(f'Loaded {count} objects into {self._path}')
+        return count
+
+    def load_dumps(self, dumps, batch_size = 10000):
+        return sum(self.load_dump(dump, batch_size) for dump in dumps)
+
+    def _load_batch(self, batch):
+        return self.apply_changes([('ADD', attributes[0][0], None, attributes) for attributes in batch])
+
+    def apply_changes(self, changes, meta = None):
+        # changes are (action, object type, key, attributes) tuples applied in one transaction,
+        # ADD stores the attributes, DEL removes the object by key (or the key of the attributes).
+        # meta values are written in the same transaction, e.g. the serial of a mirror.
+        touched = []
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute('BEGIN')
+            try:
+                # index rows are written once per batch, a later version of an object replaces earlier ones
+                key_rows = {}
+                for action, object_type, key, attributes in changes:
+                    if key is None:
+                        key = self._object_key(object_type, attributes)
+                    if action == 'ADD':
+                        object_id = self._store(cursor, attributes, key)
+                        key_rows[object_id] = [(object_id,) + row for row in self._keys(object_type, attributes)]
+                    elif action == 'DEL':
+                        key_rows.pop(self._delete(cursor, object_type, key), None)
+                    else:
+                        raise ValueError(f'Unknown change {action}')
+                    touched.append((object_type, key))
+                cursor.executemany(
+                    'INSERT INTO keys (object_id, name, value, inverse) VALUES (?, ?, ?, ?)',
+                    [row for rows in key_rows.values() for row in rows]
+                )
+                for name, value in (meta or {}).items():
+                    self._set_meta(cursor, name, value)
+                cursor.execute('COMMIT')
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+        # objects built before the change must not be served from the identity map
+        for object_type, key in touched:
+            self._objects.invalidate(object_type, key)
+        return len(touched)
+
+    def get_meta(self, name, default = None):
+        with self._lock:
+            row = self._connection.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row is not None else default
+
+    def set_meta(self, name, value):
+        with self._lock:
+            self._set_meta(self._connection.cursor(), name, value)
+
+    def _set_meta(self, cursor, name, value):
+        if value is None:
+            cursor.execute('DELETE FROM meta WHERE name = ?', (name,))
+        else:
+            cursor.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, json.dumps(value)))
+
+    def clear_source(self, source):
+        # removes every object of the source, e.g. before a mirror reloads a snapshot
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute('BEGIN')
+            try:
+                cursor.execute('DELETE FROM keys WHERE object_id IN (SELECT id FROM objects WHERE UPPER(source) = ?)', (source.upper(),))
+                cursor.execute('DELETE FROM objects WHERE UPPER(source) = ?', (source.upper(),))
+                count = cursor.rowcount
+                cursor.execute('COMMIT')
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+        self._objects.clear()
+        return count
+
+    def _object_key(self, object_type, attributes):
+        key = ''.join(value for name, value in self._primary_key(object_type, attributes))
+        return self._normalize_key(object_type, key)
+
+    def _normalize_key(self, object_type, key):
+        if object_type in ('inetnum', 'inet6num'):
+            key = range_key(key) or key
+        return key.upper()
+
+    def _store(self, cursor, attributes, key = None):
+        object_type = attributes[0][0]
+        if key is None:
+            key = self._object_key(object_type, attributes)
+        source = next((value for name, value, comment in attributes if name == 'source'), self._source)
+        data = json.dumps([attr if attr[2] is not None else attr[:2] for attr in attributes], separators = (',', ':'))
+        row = cursor.execute('SELECT id FROM objects WHERE type = ? AND key = ?', (object_type, key)).fetchone()
+        if row is None:
+            cursor.execute('INSERT INTO objects (type, key, source, attributes) VALUES (?, ?, ?, ?)', (object_type, key, source, data))
+            object_id = cursor.lastrowid
+        else:
+            object_id = row[0]
+            cursor.execute('UPDATE objects SET source = ?, attributes = ? WHERE id = ?', (source, data, object_id))
+            cursor.execute('DELETE FROM keys WHERE object_id = ?', (object_id,))
+        return object_id
+
+    def _delete(self, cursor, object_type, key):
+        row = cursor.execute('SELECT id FROM objects WHERE type = ? AND key = ?', (object_type, self._normalize_key(object_type, key))).fetchone()
+        if row is None:
+            return None
+        cursor.execute('DELETE FROM keys WHERE object_id = ?', (row[0],))
+        cursor.execute('DELETE FROM objects WHERE id = ?', (row[0],))
+        return row[0]
+
+    def _url(self, object_type, key):
+        return f'{self._base_url}{object_type}/{key}'
+
+    def _referenced_type(self, object_type, name, value):
+        if name == 'members' and object_type == 'as-set':
+            return 'aut-num' if aut_num_re.match(value) else 'as-set'
+        if name == 'member-of':
+            return set_member_of.get(object_type)
+        candidates = references.get(name)
+        if candidates is None or value.upper() == 'ANY':
+            return None
+        if len(candidates) == 1:
+            return candidates[0]
+        row = self._connection.execute(
+            f'SELECT type FROM objects WHERE key = ? AND type IN ({",".join("?" * len(candidates))})',
+            (key_value(name, value),) + candidates
+        ).fetchone()
+        return row[0] if row is not None else candidates[0]
+
+    def _object_json(self, object_type, key, source, data):
+        attributes = [tuple(attr) + (None,) * (3 - len(attr)) for attr in json.loads(data)]
+        json_attributes = []
+        for name, value, comment in attributes:
+            # like the REST API, list attributes are split into one attribute (and link) per item
+            for i, item in enumerate(list_items(name, value)):
+                json_attr = {'name': name, 'value': item}
+                referenced_type = self._referenced_type(object_type, name, item)
+                if referenced_type is not None:
+                    json_attr['link'] = {'type': 'locator', 'href': self._url(referenced_type, key_value(name, item))}
+                    json_attr['referenced-type'] = referenced_type
+                if comment is not None and i == 0:
+                    json_attr['comment'] = comment
+                json_attributes.append(json_attr)
+        return {
+            'type': object_type,
+            'link': {'type': 'locator', 'href': self._url(object_type, key)},
+            'source': {'id': source.lower()},
+            'primary-key': {'attribute': [
+                {'name': name, 'value': value} for name, value in self._primary_key(object_type, attributes)
+            ]},
+            'attributes': {'attribute': json_attributes},
+        }
+
+    def get_object_json(self, object_type, id, refresh = False, unfiltered = False):
+        # the local store is always current, refresh and unfiltered are accepted for compatibility with RestApi
+        key = id
+        if object_type in ('inetnum', 'inet6num'):
+            key = range_key(key) or key
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT type, key, source, attributes FROM objects WHERE type = ? AND key = ?',
+                (object_type, key.upper())
+            ).fetchone()
+            if row is None:
+                return None
+            return self._object_json(*row)
+
+    def get_url_json(self, url, refresh = False, unfiltered = False):
+        if not url.startswith(self._base_url):
+            return None
+        object_type, _, key = url[len(self._base_url):].partition('/')
+        return self.get_object_json(object_type, key)
+
+    def __getattr__(self, attrname):
+        if attrname.startswith('_'):
+            raise AttributeError(attrname)
+        object_type = attrname.replace('_','-')
+        return empty_object(self, object_type)
+
+    def search_json(self, query_string, resource_holder = False, type_filter = None, inverse_attribute = None, stream = False, limit = None,
+            refresh = False, flags = None, attributes = None):
+        # referenced objects are never returned, of the flags only primary-keys changes the results
+        if isinstance(flags, str):
+            flags = [flags]
+        if isinstance(type_filter, str):
+            type_filter = [type_filter]
+        if isinstance(inverse_attribute, str):
+            inverse_attribute = [inverse_attribute]
+        values = [query_string.strip().upper()]
+        if inverse_attribute is not None:
+            condition = f'k.inverse = 1 AND k.name IN ({",".join("?" * len(inverse_attribute))})'
+            condition_params = list(inverse_attribute)
+        else:
+            condition = 'k.inverse = 0'
+            condition_params = []
+            if range_key(query_string) is not None:
+                values.append(range_key(query_string).upper())
+        sql = f'''SELECT DISTINCT o.type, o.key, o.source, o.attributes FROM keys k JOIN objects o ON o.id = k.object_id
+            WHERE k.value IN ({",".join("?" * len(values))}) AND {condition}'''
+        params = values + condition_params
+        if type_filter:
+            sql += f' AND o.type IN ({",".join("?" * len(type_filter))})'
+            params += list(type_filter)
+        sql += ' ORDER BY o.id'
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+        with self._lock:
+            rows = self._connection.execute(sql, params).fetchall()
+            json_objects = [self._object_json(*row) for row in rows]
+        if flags and 'primary-keys' in flags:
+            json_objects = [
+                project_json(json_data, [attr['name'] for attr in json_data['primary-key']['attribute']])
+                for json_data in json_objects
+            ]
+        if attributes is not None:
+            json_objects = [project_json(json_data, attributes) for json_data in json_objects]
+        return json_objects
+
+    def search(self, query_string, iterator=True, resource_holder = False, type_filter = None, inverse_attribute = None, stream = False, limit = None,
+            flags = None, attributes = None):
+        json_objects = self.search_json(query_string, resource_holder, type_filter, inverse_attribute, stream, limit, flags = flags)
+        if attributes is not None or trimmed_search(flags):
+            itr = map(lambda x: projected_object(self, x, attributes), json_objects)
+        else:
+            itr = map(lambda x: object_from_json(self,x), json_objects)
+        if iterator:
+            return itr
+        else:
+            return list(itr)
@@ -0,0 +1,195 @@
+import bisect, threading, time
+from urllib.parse import urlsplit
+
+# upper bounds of latency histogram buckets in seconds
+default_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def endpoint_name(method, url, base_url = ''):
+    # 'GET person', 'GET search', 'GET templates', 'POST route' ...
+    # keys may contain slashes (routes), so the type is taken right after the source
+    parts = [part for part in urlsplit(url).path.split('/') if part != '']
+    parts = parts[len([part for part in urlsplit(base_url).path.split('/') if part != '']):]
+    if not parts:
+        name = ''
+    elif parts[0] == 'search':
+        name = 'search'
+    else:
+        name = parts[1] if len(parts) > 1 else parts[0]
+    return f'{method} {name}'
+
+
+class Histogram():
+    def __init__(self, buckets = default_buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        # upper bound of the bucket holding the quantile
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': {str(bound): count for bound, count in zip(self.buckets + ('+Inf',), self.counts)},
+        }
+
+
+class Metrics():
+    # Request, decoding and object resolution metrics of an API instance.
+    # Hooks are called as hook(event, data) for every recorded event, e.g. to feed Prometheus or StatsD.
+    def __init__(self, hooks = (), buckets = default_buckets, base_url = ''):
+        self._lock = threading.Lock()
+        self._base_url = base_url
+        self._hooks = list(hooks)
+        self._buckets = buckets
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._started = time.time()
+            # endpoint -> counters and latency histogram
+            self._endpoints = {}
+            # phase (json, object) -> histogram
+            self._timings = {}
+            # object type -> attribute -> [accesses, links, max links]
+            self._links = {}
+            # object type -> number of lazy objects fetched on access
+            self._lazy_loads = {}
+
+    def add_hook(self, hook):
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def _emit(self, event, data):
+        for hook in self._hooks:
+            hook(event, data)
+
+    def _endpoint(self, endpoint):
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = {
+                'requests': 0,
+                'errors': 0,
+                'cache_hits': 0,
+                'cache_misses': 0,
+                'revalidated': 0,
+                'bytes_sent': 0,
+                'bytes_received': 0,
+                'latency': Histogram(self._buckets),
+            }
+        return stats
+
+    def request(self, method, url, status, elapsed, bytes_sent = 0, bytes_received = 0, from_cache = None, revalidated = False):
+        # from_cache is None for requests that never go through a cache
+        endpoint = endpoint_name(method, url, self._base_url)
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats['requests'] += 1
+            if status >= 400 and status != 404:
+                stats['errors'] += 1
+            if from_cache:
+                stats['cache_hits'] += 1
+            else:
+                if from_cache is not None:
+                    stats['cache_misses'] += 1
+                # only requests that reached the server are timed
+                stats['latency'].observe(elapsed)
+            if revalidated:
+                stats['revalidated'] += 1
+            stats['bytes_sent'] += bytes_sent
+            stats['bytes_received'] += bytes_received
+        if self._hooks:
+            self._emit('request', {
+                'endpoint': endpoint,
+                'url': url,
+                'status': status,
+                'elapsed': elapsed,
+                'bytes_sent': bytes_sent,
+                'bytes_received': bytes_received,
+                'from_cache': from_cache,
+            })
+
+    def received(self, method, url, bytes_received):
+        # bytes of streamed responses, counted as they are read
+        endpoint = endpoint_name(method, url, self._base_url)
+        with self._lock:
+            self._endpoint(endpoint)['bytes_received'] += bytes_received
+        if self._hooks:
+            self._emit('received', {'endpoint': endpoint, 'bytes_received': bytes_received})
+
+    def timing(self, phase, elapsed):
+        with self._lock:
+            histogram = self._timings.get(phase)
+            if histogram is None:
+                histogram = self._timings[phase] = Histogram(self._buckets)
+            histogram.observe(elapsed)
+        if self._hooks:
+            self._emit('timing', {'phase': phase, 'elapsed': elapsed})
+
+    def links(self, object_type, attrname, count):
+        with self._lock:
+            stats = self._links.setdefault(object_type, {}).setdefault(attrname, [0, 0, 0])
+            stats[0] += 1
+            stats[1] += count
+            stats[2] = max(stats[2], count)
+        if self._hooks:
+            self._emit('links', {'type': object_type, 'attribute': attrname, 'count': count})
+
+    def lazy_load(self, object_type):
+        with self._lock:
+            self._lazy_loads[object_type] = self._lazy_loads.get(object_type, 0) + 1
+        if self._hooks:
+            self._emit('lazy_load', {'type': object_type})
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {
+                endpoint: dict(stats, latency = stats['latency'].snapshot())
+                for endpoint, stats in self._endpoints.items()
+            }
+            totals = {
+                name: sum(stats[name] for stats in self._endpoints.values())
+                for name in ('requests', 'errors', 'cache_hits', 'cache_misses', 'revalidated', 'bytes_sent', 'bytes_received')
+            }
+            lookups = totals['cache_hits'] + totals['cache_misses']
+            totals['cache_hit_rate'] = totals['cache_hits'] / lookups if lookups else None
+            return {
+                'elapsed': time.time() - self._started,
+                'totals': totals,
+                'endpoints': endpoints,
+                'timings': {phase: histogram.snapshot() for phase, histogram in self._timings.items()},
+                'links': {
+                    object_type: {
+                        attrname: {'accesses': accesses, 'links': links, 'max': max_links, 'mean': links / accesses}
+                        for attrname, (accesses, links, max_links) in attributes.items()
+                    }
+                    for object_type, attributes in self._links.items()
+                },
+                'lazy_loads': dict(self._lazy_loads),
+            }
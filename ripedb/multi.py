@@ -0,0 +1,186 @@
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from . import logger as parent_logger
+from . objects import object_from_json, projected_object, primary_key
+from . rest import trimmed_search
+
+logger = parent_logger.getChild('multi')
+
+modes = ('all', 'first')
+
+# object (or JSON object) found in source, sources lists every source holding the same type and key
+SourcedObject = namedtuple('SourcedObject', ['object', 'source', 'sources'])
+
+
+class MultiResult():
+    def __init__(self):
+        self.items = []
+        # source -> exception raised by its lookup
+        self.errors = {}
+        # sources which did not answer within their timeout
+        self.timed_out = []
+        # source -> seconds, of the sources that answered
+        self.elapsed = {}
+
+    @property
+    def complete(self):
+        return not self.errors and not self.timed_out
+
+    @property
+    def first(self):
+        return self.items[0].object if self.items else None
+
+    def objects(self):
+        return [item.object for item in self.items]
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+
+class MultiSourceApi():
+    # Fans lookups and searches out to several sources at once, every source is served by its own API
+    # (RestApi instances for RIPE, RIPE-NONAUTH or GRS sources, one for the TEST database, a LocalRipeDBApi ...).
+    # mode 'all' waits for every source and merges the results, duplicates (same type and key) are kept
+    # from the first source in order; mode 'first' returns the results of the first source answering with any.
+    # timeout is in seconds per source, or a {source: seconds} dict. Requests of timed out sources
+    # are not interrupted, they finish in the background.
+    def __init__(self, apis, timeout = 10, workers = None):
+        if isinstance(apis, dict):
+            self._apis = {source.upper(): api for source, api in apis.items()}
+        else:
+            self._apis = {api._source.upper(): api for api in apis}
+        if not self._apis:
+            raise ValueError('No sources given')
+        self._timeout = timeout
+        self._owned = False
+        self._pool = ThreadPoolExecutor(max_workers = workers or 4 * len(self._apis))
+
+    @classmethod
+    def from_sources(cls, sources, timeout = 10, workers = None, **api_kwargs):
+        # one RestApi per source, closed together with this instance
+        from . rest import RestApi
+        multi = cls({source: RestApi(source = source, **api_kwargs) for source in sources}, timeout, workers)
+        multi._owned = True
+        return multi
+
+    @property
+    def sources(self):
+        return list(self._apis)
+
+    def api(self, source):
+        return self._apis[source.upper()]
+
+    def close(self):
+        self._pool.shutdown(wait = False)
+        if self._owned:
+            for api in self._apis.values():
+                api.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _source_timeout(self, source, timeout):
+        if timeout is None:
+            timeout = self._timeout
+        if isinstance(timeout, dict):
+            return timeout.get(source)
+        return timeout
+
+    def _timed(self, call, api):
+        started = time.perf_counter()
+        value = call(api)
+        return value, time.perf_counter() - started
+
+    def _fan_out(self, call, mode, timeout, sources):
+        # runs call(api) for every source, returns {source: list of JSON objects} of the sources that answered
+        if mode not in modes:
+            raise ValueError(f'Unknown mode {mode}, use one of {", ".join(modes)}')
+        sources = [source.upper() for source in sources] if sources is not None else list(self._apis)
+        result = MultiResult()
+        started = time.monotonic()
+        futures = {}
+        deadlines = {}
+        for source in sources:
+            future = self._pool.submit(self._timed, call, self._apis[source])
+            futures[future] = source
+            source_timeout = self._source_timeout(source, timeout)
+            deadlines[future] = started + source_timeout if source_timeout is not None else None
+        answers = {}
+        pending = set(futures)
+        while pending:
+            next_deadline = min((deadlines[future] for future in pending if deadlines[future] is not None), default = None)
+            done, _ = wait(pending,
+                timeout = max(0, next_deadline - time.monotonic()) if next_deadline is not None else None,
+                return_when = FIRST_COMPLETED
+            )
+            for future in done:
+                pending.discard(future)
+                source = futures[future]
+                try:
+                    value, elapsed = future.result()
+                except Exception as e:
+                    logger.debug(f'{source} failed: {e!r}')
+                    result.errors[source] = e
+                    continue
+                result.elapsed[source] = elapsed
+                answers[source] = value
+                if mode == 'first' and value:
+                    # the other sources are not waited for
+                    return sources, answers, result
+            now = time.monotonic()
+            for future in [future for future in pending if deadlines[future] is not None and deadlines[future] <= now]:
+                pending.discard(future)
+                result.timed_out.append(futures[future])
+        return sources, answers, result
+
+    def _merge(self, sources, answers, result, dedup):
+        found = {}
+        for source in sources:
+            for json_data in answers.get(source, ()):
+                key = (json_data['type'], primary_key(json_data).upper())
+                if dedup and key in found:
+                    found[key].sources.append(source)
+                    continue
+                found[key] = SourcedObject(json_data, source, [source])
+                result.items.append(found[key])
+        return result
+
+    def _objects(self, result, projected = False, attributes = None):
+        # objects are built by the API of their source, so their links resolve there,
+        # projected and trimmed results stay out of the identity maps
+        build = (lambda api, json_data: projected_object(api, json_data, attributes)) if projected else object_from_json
+        result.items = [
+            SourcedObject(build(self._apis[item.source], item.object), item.source, item.sources)
+            for item in result.items
+        ]
+        return result
+
+    def get_json(self, object_type, id, mode = 'first', timeout = None, sources = None):
+        def call(api):
+            json_data = api.get_object_json(object_type, id)
+            return [json_data] if json_data is not None else []
+        return self._merge(*self._fan_out(call, mode, timeout, sources), dedup = False)
+
+    def get(self, object_type, id, mode = 'first', timeout = None, sources = None):
+        return self._objects(self.get_json(object_type, id, mode, timeout, sources))
+
+    def search_json(self, query_string, mode = 'all', timeout = None, sources = None, dedup = True, **search_kwargs):
+        # search_kwargs are passed to search_json of every API (type_filter, inverse_attribute, limit ...)
+        search_kwargs.pop('stream', None)
+        call = lambda api: list(api.search_json(query_string, **search_kwargs))
+        return self._merge(*self._fan_out(call, mode, timeout, sources), dedup = dedup)
+
+    def search(self, query_string, mode = 'all', timeout = None, sources = None, dedup = True, **search_kwargs):
+        attributes = search_kwargs.get('attributes')
+        projected = attributes is not None or trimmed_search(search_kwargs.get('flags'))
+        return self._objects(self.search_json(query_string, mode, timeout, sources, dedup, **search_kwargs), projected, attributes)
@@ -0,0 +1,257 @@
+import base64, gzip, hashlib, json, re, socket, threading
+from collections import namedtuple
+from urllib.parse import urljoin
+from . import logger as parent_logger
+from . rpsl import gzip_magic, parse_object_text
+
+logger = parent_logger.getChild('nrtm')
+
+start_re = re.compile(r'^%START\s+Version:\s*(\d+)\s+(\S+)\s+(\d+)-(\d+)', re.IGNORECASE)
+error_re = re.compile(r'^%\s*ERROR', re.IGNORECASE)
+operation_re = re.compile(r'^(ADD|DEL)(?:\s+(\d+))?\s*$')
+
+
+class NrtmError(ValueError):
+    pass
+
+# one change of the mirrored source, NRTMv4 deletes carry the key instead of the attributes
+NrtmChange = namedtuple('NrtmChange', ['action', 'serial', 'object_type', 'key', 'attributes'])
+
+def change_from_text(action, serial, text):
+    attributes = parse_object_text(text)
+    if not attributes:
+        raise NrtmError(f'Empty object in {action} {serial}')
+    return NrtmChange(action, serial, attributes[0][0], None, attributes)
+
+def iter_nrtm3(lines):
+    # NRTMv3 answer, %START header, "ADD serial" / "DEL serial" lines each followed by the object, %END
+    action = serial = None
+    object_lines = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if action is not None:
+            if line.strip() == '' or line.upper().startswith('%END'):
+                if object_lines:
+                    yield change_from_text(action, serial, '\n'.join(object_lines))
+                    action = None
+                    object_lines = []
+                if line.upper().startswith('%END'):
+                    return
+                continue
+            object_lines.append(line)
+            continue
+        if line.startswith('%'):
+            if error_re.match(line):
+                raise NrtmError(line.lstrip('% '))
+            if line.upper().startswith('%END'):
+                return
+            continue
+        match = operation_re.match(line)
+        if match:
+            action = match.group(1)
+            serial = int(match.group(2)) if match.group(2) is not None else None
+    # a connection cut before %END may have cut the last object as well, it is never applied
+    raise NrtmError('NRTM stream ended before %END')
+
+
+def increasing_serials(changes, serial):
+    # serials may have gaps (IRRd) but never go back, the batches applied before an error are kept
+    for change in changes:
+        if change.serial is None or change.serial <= serial:
+            raise NrtmError(f'Serial {change.serial} after {serial}')
+        serial = change.serial
+        yield change
+
+
+class Nrtm3Client():
+    # NRTMv3 over TCP (whois port 4444), every query opens its own connection
+    version = 3
+
+    def __init__(self, host, port = 4444, source = 'RIPE', timeout = 60):
+        self.host = host
+        self.port = port
+        self.source = source.upper()
+        self.timeout = timeout
+
+    def _query(self, query):
+        with socket.create_connection((self.host, self.port), timeout = self.timeout) as sock:
+            sock.sendall(query.encode() + b'\n')
+            with sock.makefile('r', encoding = 'utf-8', errors = 'replace', newline = '') as f:
+                yield from f
+
+    def serial_range(self):
+        # (oldest, newest) serial the server keeps, answered as SOURCE:3:X:first-last
+        for line in self._query('-q sources'):
+            if error_re.match(line):
+                raise NrtmError(line.strip().lstrip('% '))
+            parts = line.strip().split(':')
+            if len(parts) == 4 and parts[0].upper() == self.source:
+                first, _, last = parts[3].partition('-')
+                return int(first), int(last)
+        raise NrtmError(f'Source {self.source} is not mirrored by {self.host}')
+
+    def changes(self, first, last = 'LAST'):
+        return iter_nrtm3(self._query(f'-g {self.source}:3:{first}-{last}'))
+
+
+class Nrtm4Client():
+    # NRTMv4 over HTTPS, an update notification file points to a snapshot and deltas (JSON text sequences).
+    # File hashes are checked, the signature of the notification file is not.
+    version = 4
+
+    def __init__(self, notification_url, source = 'RIPE', session = None, timeout = 60):
+        import requests
+        self.notification_url = notification_url
+        self.source = source.upper()
+        self.timeout = timeout
+        self._session = session if session is not None else requests.Session()
+
+    def _get(self, url, hash = None):
+        url = urljoin(self.notification_url, url)
+        q = self._session.get(url, timeout = self.timeout)
+        if q.status_code != 200:
+            raise NrtmError(f'Cannot fetch {url}: {q.status_code}')
+        content = q.content
+        if hash is not None and hashlib.sha256(content).hexdigest() != hash.lower():
+            raise NrtmError(f'Hash mismatch of {url}')
+        if content[:2] == gzip_magic:
+            content = gzip.decompress(content)
+        return content
+
+    def notification(self):
+        text = self._get(self.notification_url).decode().strip()
+        if not text.startswith('{'):
+            # JWS compact serialisation, the payload is the middle part
+            payload = text.split('.')[1]
+            text = base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)).decode()
+        notification = json.loads(text)
+        if notification.get('source', self.source).upper() != self.source:
+            raise NrtmError(f'Notification file of {notification["source"]}, expected {self.source}')
+        return notification
+
+    def _records(self, info, notification, file_type):
+        records = (json.loads(record) for record in self._get(info['url'], info.get('hash')).decode().split('\x1e') if record.strip())
+        header = next(records, None)
+        if header is None or header.get('type') != file_type or header.get('session_id') != notification['session_id']:
+            raise NrtmError(f'Unexpected {file_type} file {info["url"]}')
+        return header, records
+
+    def snapshot(self, notification):
+        header, records = self._records(notification['snapshot'], notification, 'snapshot')
+        for record in records:
+            yield change_from_text('ADD', header['version'], record['object'])
+
+    def deltas(self, notification, version):
+        # changes after version, oldest first
+        for info in sorted(notification.get('deltas', ()), key = lambda info: info['version']):
+            if info['version'] <= version:
+                continue
+            header, records = self._records(info, notification, 'delta')
+            for record in records:
+                if record['action'] == 'add_modify':
+                    yield change_from_text('ADD', header['version'], record['object'])
+                elif record['action'] == 'delete':
+                    yield NrtmChange('DEL', header['version'], record['object_class'], record['primary_key'], None)
+                else:
+                    raise NrtmError(f'Unknown delta action {record["action"]}')
+
+
+class NrtmMirror():
+    # Keeps a LocalRipeDBApi store in sync with an NRTM source. Changes are applied in batches, each in one
+    # transaction together with the serial (NRTMv3) or session and version (NRTMv4) reached, so a restarted
+    # mirror resumes where it stopped. The store stays queryable meanwhile (api.<type>.get, api.search).
+    def __init__(self, store, client, batch_size = 1000):
+        self.store = store
+        self.client = client
+        self.batch_size = batch_size
+        self._meta_prefix = f'nrtm{client.version}:{client.source}:'
+
+    def _meta(self, name):
+        return self.store.get_meta(self._meta_prefix + name)
+
+    @property
+    def serial(self):
+        # NRTMv3 serial or NRTMv4 version of the last applied change
+        return self._meta('serial')
+
+    def load_dump(self, dump, serial, batch_size = 10000):
+        # NRTMv3 starts from a split dump and the serial it was made at (the CURRENTSERIAL file)
+        count = self.store.load_dump(dump, batch_size)
+        self.store.set_meta(self._meta_prefix + 'serial', serial)
+        return count
+
+    def _apply(self, changes, meta):
+        # meta(serial) gives the meta values to store with the batch ending at serial. Every change of an NRTMv4
+        # delta has its version, a batch ending inside a delta keeps the stored one, so a restart replays the delta.
+        count = 0
+        batch = []
+        for change in changes:
+            if len(batch) >= self.batch_size:
+                complete = change.serial != batch[-1].serial
+                count += self._apply_batch(batch, meta(batch[-1].serial) if complete else None)
+                batch = []
+            batch.append(change)
+        if batch:
+            count += self._apply_batch(batch, meta(batch[-1].serial))
+        return count
+
+    def _apply_batch(self, batch, meta):
+        self.store.apply_changes(
+            [(change.action, change.object_type, change.key, change.attributes) for change in batch],
+            meta
+        )
+        logger.debug(f'Applied {len(batch)} changes of {self.client.source} up to {batch[-1].serial}')
+        return len(batch)
+
+    def sync(self):
+        # applies everything new on the server, returns the number of changes
+        if self.client.version == 4:
+            return self._sync_v4()
+        return self._sync_v3()
+
+    def _sync_v3(self):
+        serial = self.serial
+        first, last = self.client.serial_range()
+        if serial is None:
+            if first > 1:
+                raise NrtmError(f'No serial of {self.client.source}, load a dump first')
+            serial = 0
+        if serial < first - 1:
+            raise NrtmError(f'Serial {serial} is older than the history of the server ({first}), reload a dump')
+        if serial >= last:
+            return 0
+        changes = increasing_serials(self.client.changes(serial + 1, last), serial)
+        return self._apply(changes, lambda serial: {self._meta_prefix + 'serial': serial})
+
+    def _sync_v4(self):
+        notification = self.client.notification()
+        session_id = notification['session_id']
+        version = self.serial
+        deltas = [info['version'] for info in notification.get('deltas', ())]
+        count = 0
+        if (version is None or self._meta('session') != session_id or version > notification['version']
+                or version < notification['version'] and (not deltas or min(deltas) > version + 1)):
+            count += self._load_snapshot(notification)
+            version = notification['snapshot']['version']
+        meta = lambda version: {self._meta_prefix + 'serial': version}
+        return count + self._apply(self.client.deltas(notification, version), meta)
+
+    def _load_snapshot(self, notification):
+        # the version is dropped first, a snapshot interrupted by a restart is loaded again
+        self.store.set_meta(self._meta_prefix + 'serial', None)
+        self.store.set_meta(self._meta_prefix + 'session', notification['session_id'])
+        self.store.clear_source(self.client.source)
+        count = self._apply(self.client.snapshot(notification), lambda version: {})
+        self.store.set_meta(self._meta_prefix + 'serial', notification['snapshot']['version'])
+        logger.debug(f'Loaded snapshot {notification["snapshot"]["version"]} of {self.client.source} with {count} objects')
+        return count
+
+    def run(self, interval = 60, stop = None):
+        # syncs every interval seconds until stop (a threading.Event) is set
+        stop = stop if stop is not None else threading.Event()
+        while not stop.is_set():
+            try:
+                self.sync()
+            except (NrtmError, OSError) as e:
+                logger.warning(f'Sync of {self.client.source} failed: {e}')
+            stop.wait(interval)
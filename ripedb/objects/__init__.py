@@ -2,7 +2,9 @@ from .. import logger as base_logger
 
 logger = base_logger.getChild('objects')
 
-from ipaddress import ip_network
+import sys, time
+from collections import namedtuple
+from .. rpsl import iter_rpsl_objects, format_rpsl
 
 def empty_object(api, object_type):
     if object_type in object_types:
@@ -11,75 +13,244 @@ def empty_object(api, object_type):
         obj = RipeObject(api, object_type = object_type)
     return obj
 
+def primary_key(json_data):
+    return ''.join(attr['value'] for attr in json_data['primary-key']['attribute'])
+
 def object_from_json(api, json_data):
-    obj = empty_object(api,json_data['type'])
+    if api._metrics is not None:
+        started = time.perf_counter()
+        obj = _object_from_json(api, json_data)
+        api._metrics.timing('object', time.perf_counter() - started)
+        return obj
+    return _object_from_json(api, json_data)
+
+def _object_from_json(api, json_data):
+    # the identity map makes repeated and shared references the same instance
+    obj = api._objects.get(json_data['type'], primary_key(json_data))
+    if obj is None:
+        obj = empty_object(api,json_data['type'])
+        obj._parse_json(json_data)
+        # another thread may have built the same object meanwhile
+        return api._objects.add(obj)
     obj._parse_json(json_data)
     return obj
 
+def project_json(json_data, attributes):
+    # copy of json_data holding only its type attribute and the given attributes
+    names = set(attributes)
+    names.add(json_data['type'])
+    projected = dict(json_data)
+    projected['attributes'] = {'attribute': [attr for attr in json_data['attributes']['attribute'] if attr['name'] in names]}
+    return projected
+
+def projected_object(api, json_data, attributes = None):
+    # Lightweight object holding only the given attributes, accessing any other one loads the whole object.
+    # It stays out of the identity map, a whole object already there is returned instead.
+    # Without attributes it holds those of json_data, e.g. of a search trimmed by the server.
+    obj = api._objects.get(json_data['type'], primary_key(json_data))
+    if obj is not None and obj._loaded and obj._projection is None:
+        return obj
+    if attributes is None:
+        attributes = [attr['name'] for attr in json_data['attributes']['attribute']]
+    obj = empty_object(api, json_data['type'])
+    obj._parse_json(project_json(json_data, attributes))
+    obj._projection = frozenset(attributes) | {obj._type}
+    return obj
+
+def lazy_object(api, object_type, id, link = None):
+    # the object is only fetched when one of its attributes is accessed
+    obj = api._objects.get(object_type, id)
+    if obj is None:
+        obj = empty_object(api, object_type)
+        obj._id = id
+        obj._key = id
+        obj._link = link
+        obj._loaded = False
+        obj = api._objects.add(obj)
+    return obj
+
 def object_from_link(api, attr):
-    json_data = api.get_url_json(attr['link']['href'])
-    if json_data is None:
-        obj = empty_object(api,attr['referenced-type'])
-        obj._id = attr['value']
+    return lazy_object(api, attr.referenced_type, attr.value, attr.link)
+
+def object_from_snapshot(api, snapshot):
+    # snapshots read back from JSON come as lists
+    snapshot = ObjectSnapshot(*snapshot)
+    if snapshot.format not in (1, OBJECT_SNAPSHOT_FORMAT):
+        raise ValueError(f'Unsupported object snapshot format {snapshot.format}')
+    if snapshot.attributes is None:
+        return lazy_object(api, snapshot.type, snapshot.id, snapshot.link)
+    if snapshot.projection is not None:
+        # projected objects stay out of the identity map
+        obj = empty_object(api, snapshot.type)
+        obj._set_snapshot(snapshot)
         return obj
+    obj = api._objects.get(snapshot.type, snapshot.key)
+    if obj is None:
+        obj = empty_object(api, snapshot.type)
+        obj._set_snapshot(snapshot)
+        return api._objects.add(obj)
+    obj._set_snapshot(snapshot)
+    return obj
+
+def attribute_from_json(attr):
+    link = attr.get('link')
+    if link is not None and link.get('type') == 'locator':
+        link = link['href']
+        referenced_type = sys.intern(attr['referenced-type'])
     else:
-        return object_from_json(api, json_data)
+        link = None
+        referenced_type = None
+    return Attribute(sys.intern(attr['name']), attr['value'], link, referenced_type, attr.get('comment'))
+
+
+# one attribute of an object, link holds the locator href of referenced objects
+Attribute = namedtuple('Attribute', ['name', 'value', 'link', 'referenced_type', 'comment'])
 
+# format 2 added projection, format 1 snapshots are still read
+OBJECT_SNAPSHOT_FORMAT = 2
+
+class ObjectSnapshot(namedtuple('ObjectSnapshot', ['format', 'type', 'id', 'key', 'link', 'attributes', 'projection'], defaults = (None,))):
+    # Compact picklable state of a RipeObject without its API, bind() makes the object again on any API.
+    # attributes are plain (name, value, link, referenced type, comment) tuples, None for a not yet loaded object,
+    # projection the attribute names of a projected object.
+    __slots__ = ()
+
+    def bind(self, api):
+        return object_from_snapshot(api, self)
 
 class RipeObject():
-    _type = None
-    _id = None
-    _id_attr = None
-    _api = None
-    _template = None
-    _template_attributes = {}
-    _link = None
-    attributes = []
-
-    def __init__(self, api, object_type, json_data = None):
-        self._api = api
-        try:
-            self._template = api.get_template(object_type)
-            # get primary key attribute
-            for template_attr in self._template['attributes']['attribute']:
-                self._template_attributes[template_attr['name']] = template_attr
-                if 'keys' in template_attr and 'PRIMARY_KEY' in template_attr['keys']:
-                    self._id_attr = template_attr['name']
-            self._type = object_type
-        except:
-            raise ValueError(f'Invalid object type {object_type}')
+    __slots__ = ('_api', '_type', '_id', '_key', '_schema', '_link', '_loaded', '_attributes', '_index', '_projection', '__weakref__')
+
+    def __init__(self, api, object_type, json_data = None, schema = None):
+        self._init_state(api, object_type)
+        if schema is None:
+            schema = api.get_schema(object_type)
+        self._set_schema(object_type, schema)
         if json_data is not None:
             self._parse_json(json_data)
-        pass
+
+    def _init_state(self, api, object_type):
+        self._api = api
+        self._type = object_type
+        self._id = None
+        self._key = None
+        self._schema = None
+        self._link = None
+        self._loaded = True
+        self._attributes = ()
+        self._index = {}
+        # attribute names held by a projected object, None for a whole object
+        self._projection = None
+
+    def _set_schema(self, object_type, schema):
+        if schema is None:
+            raise ValueError(f'Invalid object type {object_type}')
+        self._schema = schema
+        self._type = object_type
 
     def _parse_json(self, json_data):
         self._type = json_data['type']
         self._id = json_data['primary-key']['attribute'][0]['value']
-        self._link = json_data['link']
-        self.attributes = json_data['attributes']['attribute']
+        self._key = primary_key(json_data)
+        self._link = json_data['link']['href'] if 'link' in json_data else None
+        self._set_attributes(tuple(map(attribute_from_json, json_data['attributes']['attribute'])))
+
+    def _set_snapshot(self, snapshot):
+        self._type = snapshot.type
+        self._id = snapshot.id
+        self._key = snapshot.key
+        self._link = snapshot.link
+        self._set_attributes(tuple(
+            Attribute(sys.intern(name), value, link, sys.intern(referenced_type) if referenced_type is not None else None, comment)
+            for name, value, link, referenced_type, comment in snapshot.attributes
+        ))
+        if snapshot.projection is not None:
+            self._projection = frozenset(snapshot.projection)
+
+    def _set_attributes(self, attributes):
+        # name -> attributes index, built once per parse
+        index = {}
+        for attr in attributes:
+            index.setdefault(attr.name, []).append(attr)
+        self._attributes = attributes
+        self._index = {name: tuple(items) for name, items in index.items()}
+        self._loaded = True
+        self._projection = None
+
+    def snapshot(self):
+        # does not load a lazy object, its snapshot binds to a lazy object again
+        attributes = tuple(map(tuple, self._attributes)) if self._loaded else None
+        projection = tuple(sorted(self._projection)) if self._projection is not None else None
+        return ObjectSnapshot(OBJECT_SNAPSHOT_FORMAT, self._type, self._id, self._key, self._link, attributes, projection)
+
+    @property
+    def attributes(self):
+        # raw attribute list in the RIPE REST JSON form
+        self._ensure_loaded()
+        out_attributes = []
+        for attr in self._attributes:
+            json_attr = {'name': attr.name, 'value': attr.value}
+            if attr.link is not None:
+                json_attr['link'] = {'type': 'locator', 'href': attr.link}
+                json_attr['referenced-type'] = attr.referenced_type
+            if attr.comment is not None:
+                json_attr['comment'] = attr.comment
+            out_attributes.append(json_attr)
+        return out_attributes
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        if self._api._metrics is not None:
+            self._api._metrics.lazy_load(self._type)
+        if self._link is not None:
+            json_data = self._api.get_url_json(self._link)
+        else:
+            json_data = self._api.get_object_json(self._type, self._id)
+        if json_data is None:
+            # keep the unresolved reference with just its id
+            self._loaded = True
+        else:
+            self._parse_json(json_data)
     
+    def _load_whole(self):
+        # a projected object becomes a whole one on access to an attribute it does not hold
+        json_data = self._api.get_object_json(self._type, self._id)
+        if json_data is None:
+            raise ValueError('Object not found')
+        self._parse_json(json_data)
+
     def _resolve_attribute(self,attr):
-        if 'link' in attr and attr['link']['type'] == 'locator':
+        if attr.link is not None:
             return object_from_link(self._api, attr)
         else:
-            return attr['value']
+            return attr.value
 
     def __getattr__(self,attrname):
         if attrname == 'id':
             return self._id
         elif attrname == 'type':
             return self._type
+        elif attrname.startswith('_'):
+            raise AttributeError(attrname)
         found_items = []
         attrname = attrname.replace('_','-')
-        if attrname not in self._template_attributes:
-            raise AttributeError
-        for item in self.attributes:
-            if item['name'] == attrname:
-                item_resolved = self._resolve_attribute(item)
-                if item_resolved is not None:
-                    found_items.append(self._resolve_attribute(item))
-
-        if self._template_attributes[attrname].get('cardinality','SINGLE') == 'MULTIPLE':
+        if attrname not in self._schema:
+            raise AttributeError(attrname)
+        self._ensure_loaded()
+        if self._projection is not None and attrname not in self._projection:
+            self._load_whole()
+        links = 0
+        for item in self._index.get(attrname, ()):
+            item_resolved = self._resolve_attribute(item)
+            if item_resolved is not None:
+                found_items.append(item_resolved)
+            if item.link is not None:
+                links += 1
+        if links and self._api._metrics is not None:
+            self._api._metrics.links(self._type, attrname, links)
+
+        if self._schema.is_multiple(attrname):
             return found_items
         elif len(found_items) > 0:
             return found_items[0]
@@ -87,38 +258,47 @@ class RipeObject():
             return None
     
     def get_attributes(self, format = dict):
+        self._ensure_loaded()
         if format == str:
-            return '\n'.join(map(lambda x: f"{x['name']}:\t{x['value']}", self.attributes))
+            return format_rpsl((attr.name, attr.value, attr.comment) for attr in self._attributes)
         elif format == dict:
             out_attributes = {}
-            for attr in self.attributes:
-                if self._template_attributes[attr['name']].get('cardinality','SINGLE') == 'MULTIPLE':
-                    if attr['name'] not in out_attributes:
-                        out_attributes[attr['name']] = []
-                    out_attributes[attr['name']].append(attr['value'])
+            for attr in self._attributes:
+                if self._schema.is_multiple(attr.name):
+                    if attr.name not in out_attributes:
+                        out_attributes[attr.name] = []
+                    out_attributes[attr.name].append(attr.value)
                 else:
-                    out_attributes[attr['name']] = attr['value']
+                    out_attributes[attr.name] = attr.value
             return out_attributes
         raise ValueError('Format not implemented')
 
-    def get(self,id):
-        json = self._api.get_object_json(self._type,id)
+    def reference_graph(self, **kwargs):
+        # objects around this one and their references, see ReferenceTraversal for kwargs
+        from .. graph import reference_graph
+        return reference_graph(self._api, self, **kwargs)
+
+    def get(self, id, attributes = None, unfiltered = False):
+        # attributes makes a projected object, see projected_object
+        json = self._api.get_object_json(self._type, id, unfiltered = unfiltered)
         if json is None:
             raise ValueError('Object not found')
-        self._parse_json(json)
-        return self
+        if attributes is not None:
+            return projected_object(self._api, json, attributes)
+        # the instance already in the identity map is refreshed, so references handed out earlier stay current
+        obj = self._api._objects.get(json['type'], primary_key(json))
+        if obj is None:
+            self._parse_json(json)
+            return self._api._objects.add(self)
+        obj._parse_json(json)
+        return obj
     
-    def __get_ripe_object(self, attributes):
+    def _get_ripe_object(self, attributes):
         # perform basic validation
         missing_attributes = []
-        possible_attributes = {}
-        for template_attr in self._template['attributes']['attribute']:
-            possible_attributes[template_attr['name']] = template_attr
-            if template_attr['requirement'] == 'MANDATORY' and (
-                    template_attr['name'] not in attributes or
-                    attributes[template_attr['name']] in [None,'',[]]
-            ):
-                missing_attributes.append(template_attr['name'])
+        for attr_name in self._schema.mandatory:
+            if attr_name not in attributes or attributes[attr_name] in [None,'',[]]:
+                missing_attributes.append(attr_name)
         if len(missing_attributes) > 0:
             raise ValueError(f'Missing mandatory attributes: {",".join(missing_attributes)}')
         object_attributes = []
@@ -132,10 +312,10 @@ class RipeObject():
         for attr_name in attributes:
             if attr_name == self._type:
                 continue
-            if attr_name not in possible_attributes:
+            if attr_name not in self._schema:
                 raise ValueError(f'Invalid attribute {attr_name}')
             if isinstance(attributes[attr_name], list):
-                if possible_attributes[attr_name].get('cardinality','SINGLE') != 'MULTIPLE':
+                if not self._schema.is_multiple(attr_name):
                     raise ValueError(f'Attribute {attr_name} may only have one value')
                 for value in attributes[attr_name]:
                     object_attributes.append({'name':attr_name, 'value': value})
@@ -157,11 +337,16 @@ class RipeObject():
         }
         return ripe_object
 
-    def __get_ripe_ojbect_from_string(self, data):
-        object_attributes = [ {'name': name, 'value': value} for (name,value) in map(
-            lambda x: x.split(':', 1),
-            filter(lambda x: x.strip() != '', data.split('\n'))
-        )]
+    def _get_ripe_object_from_string(self, data):
+        rpsl_objects = list(iter_rpsl_objects(data))
+        if len(rpsl_objects) != 1:
+            raise ValueError('Expected exactly one RPSL object')
+        object_attributes = []
+        for name, value, comment in rpsl_objects[0]:
+            object_attribute = {'name': name, 'value': value}
+            if comment is not None:
+                object_attribute['comment'] = comment
+            object_attributes.append(object_attribute)
         ripe_object = {
             "objects": {
                 "object": [
@@ -179,13 +364,19 @@ class RipeObject():
         return ripe_object
 
     def create(self, id, attributes):
+        object_data = self._create_data(id, attributes)
+        json_data = self._api._post(self._type,object_data)
+        self._parse_json(json_data)
+        return self
+
+    def _create_data(self, id, attributes):
         if not self._api.is_writable():
             raise ValueError('API is not writable, please supply maintainer and password')
         if isinstance(attributes, str):
-            object_data = self.__get_ripe_ojbect_from_string(attributes)
+            object_data = self._get_ripe_object_from_string(attributes)
         else:
             # push id and maintainer
-            attributes[self._id_attr] = id
+            attributes[self._schema.id_attr] = id
             attributes['source'] = self._api._source
             if 'mnt-by' in attributes:
                 if not isinstance(attributes['mnt-by'], list):
@@ -195,20 +386,28 @@ class RipeObject():
             else:
                 attributes['mnt-by'] = self._api._mntner
             
-            object_data = self.__get_ripe_object(attributes)
+            object_data = self._get_ripe_object(attributes)
         logger.debug(object_data)
-        json_data = self._api._post(self._type,object_data)
-        self._parse_json(json_data)
-        return self
+        return object_data
     
     def delete(self):
+        self._check_delete()
+        return self._api._delete(self._type, self._id)
+
+    def _check_delete(self):
         if not self._api.is_writable():
             raise ValueError('API is not writable, please supply maintainer and password')
         if self._id is None:
             raise ValueError('Cannot delete non-resolved object template')
-        return self._api._delete(self._type, self._id)
 
     def update(self, attributes, update_type = 'replace'):
+        object_data = self._update_data(attributes, update_type)
+        json_data = self._api._put(self._type, self._id, object_data)
+        self._parse_json(json_data)
+        return self
+
+    def _check_update(self, attributes, update_type = 'replace'):
+        # the checks of an update which do not need the current attributes
         if not self._api.is_writable():
             raise ValueError('API is not writable, please supply maintainer and password')
         if self._id is None:
@@ -216,11 +415,21 @@ class RipeObject():
         if update_type not in ['add', 'replace', 'remove']:
             raise ValueError('update_type must by one of add, replace, remove')
         if isinstance(attributes, str):
-            object_data = self.__get_ripe_ojbect_from_string(attributes)
+            return
+        for attr_name, value in attributes.items():
+            if attr_name not in self._schema:
+                raise ValueError(f'Invalid attribute {attr_name}')
+            if isinstance(value, list) and not self._schema.is_multiple(attr_name):
+                raise ValueError(f'Attribute {attr_name} may only have one value')
+
+    def _update_data(self, attributes, update_type = 'replace'):
+        self._check_update(attributes, update_type)
+        if isinstance(attributes, str):
+            object_data = self._get_ripe_object_from_string(attributes)
         else:
             update_attributes = {}
             original_attributes = self.get_attributes()
-            logger.debug(self.attributes)
+            logger.debug(self._attributes)
 
             if update_type == 'remove':
                 update_attributes = original_attributes
@@ -288,56 +497,68 @@ class RipeObject():
             #         if update_type == 'replace' or (update_type == 'add' and attr_name not in update_attributes):
             #             update_attributes[attr_name] = attributes[attr_name]
             logger.debug(update_attributes)
-            object_data = self.__get_ripe_object(update_attributes)
+            object_data = self._get_ripe_object(update_attributes)
         logger.debug(object_data)
         logger.debug((self._type, self._id))
-        json_data = self._api._put(self._type, self._id, object_data)
-        self._parse_json(json_data)
-        return self
+        return object_data
 
 
 class Maintainer(RipeObject):
+    __slots__ = ()
+
     def __init__(self,*args,**kwargs):
         super().__init__(*args,**kwargs)
 
 class Role(RipeObject):
+    __slots__ = ()
+
     def __init__(self,*args,**kwargs):
         super().__init__(*args,**kwargs)
 
 class Person(RipeObject):
+    __slots__ = ()
+
     def __init__(self,*args,**kwargs):
         super().__init__(*args,**kwargs)
 
 class ASSet(RipeObject):
+    __slots__ = ()
+
     def __init__(self,*args,**kwargs):
         super().__init__(*args,**kwargs)
     
-    def resolve_members(self, seen_ids = None):
-        aut_nums = []
-        if seen_ids is None:
-            seen_ids = []
-        members = self.members
-        if not isinstance(members,list):
-            members = [members]
-        # get indirect members
-        members += self._api.search(query_string = self.id, type_filter = ['aut-num', 'as-set'], inverse_attribute = 'member-of')
-        for member in members:
-            if member.id not in seen_ids:
-                seen_ids.append(member.id)
-                if member.type == 'as-set':
-                    aut_nums += member.resolve_members(seen_ids)
-                elif member.type == 'aut-num':
-                    aut_nums.append(member)
-        return aut_nums
+    def expand(self, workers = 8, max_depth = None, max_objects = None, fetch_aut_nums = False, seen = None):
+        from .. expand import ASSetExpander
+        expander = ASSetExpander(self._api, workers, max_depth, max_objects, fetch_aut_nums)
+        return expander.expand(self, seen)
 
-    def resolve_routes(self):
-        aut_nums = self.resolve_members()
-        routes = []
-        for aut_num in aut_nums:
-            routes += aut_num.resolve_routes()
-        return routes
+    def refresh_expansion(self, state, workers = 8, max_age = 3600, max_depth = None, check_aut_nums = True):
+        # state is an ExpansionState or the path of its file, which is saved afterwards
+        from .. expand import ExpansionState, IncrementalExpander
+        path = state if isinstance(state, str) else None
+        if path is not None:
+            state = ExpansionState(path)
+        result = IncrementalExpander(self._api, state, workers, max_age, max_depth, check_aut_nums).refresh(self)
+        if path is not None:
+            state.save()
+        return result
+
+    def resolve_members(self, seen_ids = None, **kwargs):
+        # seen_ids lists members expanded already, the ones found are added to it
+        return list(self.expand(seen = seen_ids, **kwargs).aut_nums.values())
+
+    def resolve_routes(self, workers = 8, **kwargs):
+        from .. expand import ASSetExpander
+        aut_nums = self.resolve_members(workers = workers, **kwargs)
+        return ASSetExpander(self._api, workers).resolve_routes(aut_nums)
+
+    def prefix_list(self, **kwargs):
+        from .. prefixes import prefix_list
+        return prefix_list(self._api, self.id, **kwargs)
 
 class AutNum(RipeObject):
+    __slots__ = ('_routes',)
+
     def __init__(self,*args,**kwargs):
         super().__init__(*args,**kwargs)
         self._routes = None
@@ -350,22 +571,32 @@ class AutNum(RipeObject):
             self._routes = self._api.search(
                 query_string = self._id,
                 inverse_attribute = 'origin',
-                type_filter = ['route','route6']
+                type_filter = ['route','route6'],
+                iterator = False
             )
         return self._routes
 
+    def prefix_list(self, **kwargs):
+        from .. prefixes import prefix_list
+        return prefix_list(self._api, self.id, **kwargs)
+
 class InetNum(RipeObject):
+    __slots__ = ()
+
     def __init__(self,*args,**kwargs):
         super().__init__(*args,**kwargs)
     
-    def get(self, id = None, prefix = None):
+    def get(self, id = None, prefix = None, **kwargs):
         if prefix is not None:
+            from ipaddress import ip_network
             network = ip_network(prefix, strict = True)
             id = f'{network.network_address} - {network.broadcast_address}'
-        return super().get(id)
+        return super().get(id, **kwargs)
 
 
 class Route(RipeObject):
+    __slots__ = ()
+
     def __init__(self,*args,**kwargs):
         super().__init__(*args,**kwargs)
 
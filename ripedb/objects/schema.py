@@ -0,0 +1,107 @@
+import sys, os, json, hashlib, tempfile
+from datetime import datetime, timezone
+from collections import namedtuple
+from types import MappingProxyType
+from .. import logger as base_logger
+
+logger = base_logger.getChild('schema')
+
+# version of the on-disk schema format, files of other versions are ignored
+SCHEMA_FORMAT = 1
+bundled_schemas_path = os.path.join(os.path.dirname(__file__), 'schemas.json')
+
+TemplateAttribute = namedtuple('TemplateAttribute', ['name', 'requirement', 'cardinality', 'keys'])
+
+class ObjectSchema():
+    # Compiled, read-only view of an object template shared by all objects of the type.
+    __slots__ = ('type', 'attributes', 'primary_key', 'id_attr', 'mandatory', 'multiple')
+
+    def __init__(self, object_type, attributes):
+        attributes = tuple(attributes)
+        self.type = object_type
+        self.attributes = MappingProxyType({attr.name: attr for attr in attributes})
+        self.primary_key = tuple(attr.name for attr in attributes if 'PRIMARY_KEY' in attr.keys)
+        self.id_attr = self.primary_key[0] if self.primary_key else None
+        self.mandatory = tuple(attr.name for attr in attributes if attr.requirement == 'MANDATORY')
+        self.multiple = frozenset(attr.name for attr in attributes if attr.cardinality == 'MULTIPLE')
+
+    def __setattr__(self, name, value):
+        if hasattr(self, 'multiple'):
+            raise AttributeError('ObjectSchema is read-only')
+        super().__setattr__(name, value)
+
+    def __contains__(self, attrname):
+        return attrname in self.attributes
+
+    def is_multiple(self, attrname):
+        return attrname in self.multiple
+
+    def __repr__(self):
+        return f'<ObjectSchema {self.type}>'
+
+def compile_template(object_type, template):
+    attributes = []
+    for template_attr in template['attributes']['attribute']:
+        attributes.append(TemplateAttribute(
+            sys.intern(template_attr['name']),
+            sys.intern(template_attr.get('requirement', 'OPTIONAL')),
+            sys.intern(template_attr.get('cardinality', 'SINGLE')),
+            tuple(sys.intern(key) for key in template_attr.get('keys', [])),
+        ))
+    return ObjectSchema(object_type, attributes)
+
+def schema_to_json(schema):
+    return [[attr.name, attr.requirement, attr.cardinality, list(attr.keys)] for attr in schema.attributes.values()]
+
+def schema_from_json(object_type, data):
+    return ObjectSchema(object_type, [
+        TemplateAttribute(
+            sys.intern(name),
+            sys.intern(requirement),
+            sys.intern(cardinality),
+            tuple(sys.intern(key) for key in keys),
+        ) for name, requirement, cardinality, keys in data
+    ])
+
+def default_schema_cache(base_url):
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_dir, 'ripedb', 'schemas-' + hashlib.sha1(base_url.encode()).hexdigest()[:12] + '.json')
+
+def load_schemas(path):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('format') != SCHEMA_FORMAT:
+        logger.debug(f'Ignoring schema cache {path} with format {data.get("format")}')
+        return {}
+    return {object_type: schema_from_json(object_type, schema) for object_type, schema in data['schemas'].items()}
+
+def save_schemas(path, schemas, source = None):
+    data = {
+        'format': SCHEMA_FORMAT,
+        'source': source,
+        'updated': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'schemas': {object_type: schema_to_json(schema) for object_type, schema in sorted(schemas.items())},
+    }
+    directory = os.path.dirname(path) or '.'
+    # write to a temporary file first so concurrent readers never see a partial cache
+    os.makedirs(directory, exist_ok = True)
+    fd, tmp_path = tempfile.mkstemp(dir = directory, suffix = '.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent = 1)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def initial_schemas(schema_cache, bundled = True):
+    schemas = {}
+    if bundled:
+        schemas.update(load_schemas(bundled_schemas_path))
+    if schema_cache is not None:
+        # schemas fetched from the server take precedence over the bundled snapshot
+        schemas.update(load_schemas(schema_cache))
+    return schemas
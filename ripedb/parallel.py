@@ -0,0 +1,130 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from . import logger as parent_logger
+from . objects import RipeObject, ObjectSnapshot, object_from_json, object_from_snapshot
+
+logger = parent_logger.getChild('parallel')
+
+# API of the worker process, objects sent to the worker are bound to it
+_worker_api = None
+
+
+def detached_api():
+    # offline API with the bundled schemas, links of objects bound to it stay unresolved
+    from . local import LocalRipeDBApi
+    return LocalRipeDBApi(':memory:')
+
+def portable(value):
+    # RipeObjects, also in lists, tuples and dict values, are replaced by their snapshots
+    if isinstance(value, RipeObject):
+        return value.snapshot()
+    if isinstance(value, list):
+        return [portable(item) for item in value]
+    if type(value) is tuple:
+        return tuple(portable(item) for item in value)
+    if isinstance(value, dict):
+        return {key: portable(item) for key, item in value.items()}
+    return value
+
+def rebind(api, value):
+    # reverse of portable, snapshots become objects of api
+    if isinstance(value, ObjectSnapshot):
+        return object_from_snapshot(api, value)
+    if isinstance(value, list):
+        return [rebind(api, item) for item in value]
+    if type(value) is tuple:
+        return tuple(rebind(api, item) for item in value)
+    if isinstance(value, dict):
+        return {key: rebind(api, item) for key, item in value.items()}
+    return value
+
+def _init_worker(api_factory):
+    global _worker_api
+    _worker_api = (api_factory or detached_api)()
+
+def _process_chunk(function, items):
+    results = []
+    for item in items:
+        if isinstance(item, ObjectSnapshot):
+            item = object_from_snapshot(_worker_api, item)
+        elif isinstance(item, dict) and 'primary-key' in item:
+            item = object_from_json(_worker_api, item)
+        results.append(portable(function(item)))
+    return results
+
+def _resolve_chunk(function, keys):
+    results = []
+    for object_type, id in keys:
+        json_data = _worker_api.get_object_json(object_type, id)
+        obj = object_from_json(_worker_api, json_data) if json_data is not None else None
+        results.append(portable(function(obj) if function is not None else obj))
+    return results
+
+
+class ProcessPool():
+    # Spreads CPU heavy per-object work over processes. Objects travel as ObjectSnapshots (JSON objects
+    # of search results as they are) and are bound to the API of the worker, made by api_factory, a picklable
+    # callable like functools.partial(RipeDBApi, source = 'RIPE'), or detached_api when not given.
+    # Every worker has its own API, rate limits of RestApi apply per process.
+    # Objects in the results come back as snapshots, bound to api when given. Results are streamed,
+    # at most max_pending chunks are in flight, so the input is only read as the workers need it.
+    def __init__(self, api = None, api_factory = None, processes = None, chunk_size = 100, max_pending = None, mp_context = None):
+        self._api = api
+        self._api_factory = api_factory
+        self._processes = processes or os.cpu_count() or 1
+        self._chunk_size = chunk_size
+        self._max_pending = max_pending or 2 * self._processes
+        self._executor = ProcessPoolExecutor(self._processes,
+            mp_context = mp_context,
+            initializer = _init_worker,
+            initargs = (api_factory,)
+        )
+
+    def close(self):
+        self._executor.shutdown(cancel_futures = True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def map(self, function, objects, ordered = True):
+        # function(object) runs in the workers, it and its results must be picklable
+        items = (item.snapshot() if isinstance(item, RipeObject) else item for item in objects)
+        return self._stream(_process_chunk, function, items, ordered)
+
+    def resolve(self, keys, function = None, ordered = True):
+        # fetches (type, id) keys through the API of the workers, function runs there on every object
+        # (None when not found), without function the objects themselves are returned
+        if self._api_factory is None:
+            raise ValueError('Resolving objects needs an api_factory')
+        return self._stream(_resolve_chunk, function, iter(keys), ordered)
+
+    def _stream(self, task, function, items, ordered):
+        pending = deque()
+        for chunk in iter(lambda: list(islice(items, self._chunk_size)), []):
+            pending.append(self._executor.submit(task, function, chunk))
+            while len(pending) >= self._max_pending:
+                yield from self._collect(pending, ordered)
+        while pending:
+            yield from self._collect(pending, ordered)
+
+    def _collect(self, pending, ordered):
+        if ordered:
+            done = [pending.popleft()]
+        else:
+            done, _ = wait(pending, return_when = FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+        for future in done:
+            for value in future.result():
+                yield rebind(self._api, value) if self._api is not None else value
+
+
+def parallel_map(function, objects, api = None, api_factory = None, processes = None, chunk_size = 100, ordered = True):
+    # one-off ProcessPool.map, the pool is closed once the results are consumed
+    with ProcessPool(api, api_factory, processes, chunk_size) as pool:
+        yield from pool.map(function, objects, ordered)
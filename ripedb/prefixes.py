@@ -0,0 +1,176 @@
+import json, socket
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from . import logger as parent_logger
+
+logger = parent_logger.getChild('prefixes')
+
+address_bits = {4: 32, 6: 128}
+address_families = {4: socket.AF_INET, 6: socket.AF_INET6}
+
+def parse_prefix(prefix):
+    # returns (version, first address as int, prefix length), host bits are cleared
+    address, _, length = prefix.strip().partition('/')
+    version = 6 if ':' in address else 4
+    bits = address_bits[version]
+    length = int(length) if length != '' else bits
+    first = int.from_bytes(socket.inet_pton(address_families[version], address), 'big')
+    first &= ~((1 << (bits - length)) - 1)
+    return (version, first, length)
+
+def format_address(version, address):
+    return socket.inet_ntop(address_families[version], address.to_bytes(address_bits[version] // 8, 'big'))
+
+def range_to_prefixes(first, last, bits):
+    # split an address range into the smallest list of aligned prefixes
+    while first <= last:
+        size = (first & -first).bit_length() - 1 if first else bits
+        size = min(size, (last - first + 1).bit_length() - 1)
+        yield (first, bits - size)
+        first += 1 << size
+
+
+class PrefixEntry(namedtuple('PrefixEntry', ['version', 'first', 'length', 'max_length', 'min_length'], defaults = (None,))):
+    # min_length is the shortest accepted length of an aggregate (ge), None accepts the prefix itself
+    __slots__ = ()
+
+    @property
+    def last(self):
+        return self.first + (1 << (address_bits[self.version] - self.length)) - 1
+
+    @property
+    def prefix(self):
+        return f'{format_address(self.version, self.first)}/{self.length}'
+
+    @property
+    def greater_equal(self):
+        return self.min_length if self.min_length is not None and self.min_length > self.length else None
+
+    def __str__(self):
+        if self.greater_equal is not None:
+            return f'{self.prefix} ge {self.greater_equal} le {self.max_length}'
+        if self.max_length > self.length:
+            return f'{self.prefix} le {self.max_length}'
+        return self.prefix
+
+    def to_json(self):
+        json_data = {
+            'prefix': self.prefix,
+            'exact': self.max_length == self.length,
+        }
+        if self.greater_equal is not None:
+            json_data['greater-equal'] = self.greater_equal
+        json_data['less-equal'] = self.max_length
+        return json_data
+
+
+def route_prefix(json_data):
+    # read the prefix straight from the search result, no RipeObject is built
+    for attr in json_data['primary-key']['attribute']:
+        if attr['name'] in ('route', 'route6'):
+            return attr['value']
+    return None
+
+def iter_route_prefixes(api, origins, workers = 8):
+    def origin_routes(origin):
+        json_objects = api.search_json(
+            query_string = origin,
+            inverse_attribute = 'origin',
+            type_filter = ['route', 'route6']
+        )
+        return [route_prefix(json_data) for json_data in json_objects]
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        for prefixes in pool.map(origin_routes, origins):
+            for prefix in prefixes:
+                if prefix is not None:
+                    yield parse_prefix(prefix)
+
+def aggregate_prefixes(prefixes, bits):
+    # prefixes is an iterable of (first, length), yields (first, length, merged length).
+    # Only prefixes of the same length are merged, and only into aggregates they fill completely,
+    # so the aggregate with ge and le of the merged length accepts exactly the merged prefixes.
+    by_length = {}
+    for first, length in set(prefixes):
+        by_length.setdefault(length, []).append(first)
+    for length, firsts in by_length.items():
+        size = 1 << (bits - length)
+        firsts.sort()
+        run_first = run_last = None
+        for first in firsts:
+            if run_first is not None and first == run_last + 1:
+                run_last = first + size - 1
+                continue
+            if run_first is not None:
+                yield from ((first, prefix_length, length) for first, prefix_length in range_to_prefixes(run_first, run_last, bits))
+            run_first, run_last = first, first + size - 1
+        if run_first is not None:
+            yield from ((first, prefix_length, length) for first, prefix_length in range_to_prefixes(run_first, run_last, bits))
+
+def drop_covered(entries):
+    # entries are PrefixEntry sharing one max_length, an entry is dropped when a covering entry
+    # accepts all of its lengths as well
+    covering = []
+    for entry in sorted(entries, key = lambda entry: (entry.first, entry.length)):
+        while covering and covering[-1].last < entry.first:
+            covering.pop()
+        if any(other.min_length <= entry.min_length for other in covering):
+            continue
+        covering.append(entry)
+        yield entry
+
+def build_prefix_list(prefixes, aggregate = True, max_length = None, or_longer = False):
+    # prefixes is an iterable of (version, first, length) tuples
+    by_family = {4: set(), 6: set()}
+    for version, first, length in prefixes:
+        by_family[version].add((first, length))
+    prefix_list = {}
+    for version, family_prefixes in by_family.items():
+        bits = address_bits[version]
+        # max_length is either one value for both families or a {version: length} dict
+        family_max_length = max_length.get(version) if isinstance(max_length, dict) else max_length
+        family_max_length = bits if family_max_length is None else min(family_max_length, bits)
+        family_prefixes = [prefix for prefix in family_prefixes if prefix[1] <= family_max_length]
+        if aggregate:
+            merged = aggregate_prefixes(family_prefixes, bits)
+        else:
+            merged = ((first, length, length) for first, length in family_prefixes)
+        entries = [
+            PrefixEntry(version, first, length, family_max_length if or_longer else merged_length, merged_length)
+            for first, length, merged_length in merged
+        ]
+        if aggregate and or_longer:
+            # with a common le, more specifics of an accepted prefix add nothing
+            entries = drop_covered(entries)
+        prefix_list[version] = sorted(entries, key = lambda entry: (entry.first, entry.length))
+    return prefix_list
+
+def origins_of(api, sources, workers = 8, **expand_kwargs):
+    # sources are as-set and aut-num names or objects
+    from . expand import ASSetExpander, aut_num_re
+    origins = {}
+    for source in sources:
+        name = source if isinstance(source, str) else source.id
+        name = name.upper()
+        if aut_num_re.match(name):
+            origins[name] = None
+        else:
+            expansion = ASSetExpander(api, workers, **expand_kwargs).expand(name)
+            for aut_num in expansion.aut_nums:
+                origins[aut_num] = None
+    return list(origins)
+
+def prefix_list(api, sources, aggregate = True, max_length = None, or_longer = False, workers = 8, **expand_kwargs):
+    if isinstance(sources, str) or not hasattr(sources, '__iter__'):
+        sources = [sources]
+    origins = origins_of(api, sources, workers, **expand_kwargs)
+    return build_prefix_list(iter_route_prefixes(api, origins, workers), aggregate, max_length, or_longer)
+
+def format_prefix_list(prefix_list, format = str):
+    if format == str:
+        return '\n'.join(str(entry) for version in sorted(prefix_list) for entry in prefix_list[version])
+    elif format == 'json':
+        return json.dumps({
+            f'ipv{version}': [entry.to_json() for entry in prefix_list[version]]
+            for version in sorted(prefix_list)
+        })
+    raise ValueError('Format not implemented')
@@ -0,0 +1,324 @@
+import gzip, json, os, socket, tempfile
+from collections import namedtuple
+from . import logger as parent_logger
+from . objects import primary_key, lazy_object
+from . prefixes import address_bits, address_families, parse_prefix, format_address, range_to_prefixes
+from . rpsl import open_dump, iter_rpsl_objects
+
+logger = parent_logger.getChild('radix')
+
+# version of the on-disk index snapshot format, files of other versions are rejected
+INDEX_FORMAT = 1
+indexed_types = ('inetnum', 'inet6num', 'route', 'route6')
+
+
+class PrefixRecord(namedtuple('PrefixRecord', ['type', 'key', 'version', 'first', 'last', 'origin', 'netname'])):
+    # Compact form of an indexed object, origin is set for routes, netname for inetnums.
+    __slots__ = ()
+
+    @property
+    def prefixes(self):
+        bits = address_bits[self.version]
+        return [f'{format_address(self.version, first)}/{length}' for first, length in range_to_prefixes(self.first, self.last, bits)]
+
+    @property
+    def range(self):
+        return f'{format_address(self.version, self.first)} - {format_address(self.version, self.last)}'
+
+
+class Node():
+    __slots__ = ('first', 'length', 'records', 'children')
+
+    def __init__(self, first, length):
+        self.first = first
+        self.length = length
+        self.records = None
+        self.children = [None, None]
+
+
+def parse_address(address):
+    # returns (version, address as int)
+    address = str(address).strip()
+    version = 6 if ':' in address else 4
+    return (version, int.from_bytes(socket.inet_pton(address_families[version], address), 'big'))
+
+def parse_range(value):
+    # inetnum ranges 'first - last' or prefixes
+    if '-' in value:
+        first, _, last = value.partition('-')
+        version, first = parse_address(first)
+        last_version, last = parse_address(last)
+        if version != last_version or last < first:
+            raise ValueError(f'Invalid address range {value}')
+        return (version, first, last)
+    version, first, length = parse_prefix(value)
+    return (version, first, first + (1 << (address_bits[version] - length)) - 1)
+
+def record_from_attributes(object_type, key, attributes):
+    # attributes is an iterable of (name, value) pairs, None is returned for types that are not indexed
+    if object_type not in indexed_types:
+        return None
+    values = {}
+    for attr in attributes:
+        if attr[0] not in values:
+            values[attr[0]] = attr[1]
+    version, first, last = parse_range(values[object_type])
+    return PrefixRecord(object_type, key, version, first, last, values.get('origin'), values.get('netname'))
+
+
+class PrefixIndex():
+    # Path compressed binary radix tree over inetnum, inet6num, route and route6 objects.
+    # Address ranges that are not a single prefix are stored under each prefix of the range.
+    # Longest prefix matches use a hash table per prefix length, the tree serves the range queries.
+    def __init__(self, api = None):
+        self._api = api
+        self._roots = {4: Node(0, 0), 6: Node(0, 0)}
+        # version -> prefix length -> first address -> records of the node
+        self._lengths = {4: {}, 6: {}}
+        # version -> [(mask, prefixes)] from the longest prefix length, rebuilt when a length is added
+        self._masks = {4: [], 6: []}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, record):
+        bits = address_bits[record.version]
+        for first, length in range_to_prefixes(record.first, record.last, bits):
+            self._insert(record.version, bits, first, length, record)
+        self._count += 1
+
+    def _set_records(self, version, node, record):
+        node.records = [record]
+        lengths = self._lengths[version]
+        if node.length not in lengths:
+            lengths[node.length] = {}
+            bits = address_bits[version]
+            self._masks[version] = [
+                (~((1 << (bits - length)) - 1) & ((1 << bits) - 1), lengths[length])
+                for length in sorted(lengths, reverse = True)
+            ]
+        lengths[node.length][node.first] = node.records
+
+    def _insert(self, version, bits, first, length, record):
+        node = self._roots[version]
+        while True:
+            if node.length == length and node.first == first:
+                if node.records is None:
+                    self._set_records(version, node, record)
+                elif record not in node.records:
+                    node.records.append(record)
+                return
+            bit = (first >> (bits - node.length - 1)) & 1
+            child = node.children[bit]
+            if child is None:
+                child = node.children[bit] = Node(first, length)
+                self._set_records(version, child, record)
+                return
+            # length of the prefix shared by the child and the new prefix
+            common = min(child.length, length, bits - (child.first ^ first).bit_length())
+            if common == child.length:
+                node = child
+                continue
+            if common == length:
+                # the new prefix sits between the node and the child
+                parent = Node(first, length)
+                self._set_records(version, parent, record)
+            else:
+                parent = Node(first & ~((1 << (bits - common)) - 1), common)
+                leaf = Node(first, length)
+                self._set_records(version, leaf, record)
+                parent.children[(first >> (bits - common - 1)) & 1] = leaf
+            parent.children[(child.first >> (bits - common - 1)) & 1] = child
+            node.children[bit] = parent
+            return
+
+    def add_json(self, json_data):
+        record = record_from_attributes(
+            json_data['type'],
+            primary_key(json_data),
+            ((attr['name'], attr['value']) for attr in json_data['attributes']['attribute'])
+        )
+        if record is not None:
+            self.add(record)
+        return record
+
+    def load_json(self, json_objects):
+        # e.g. api.search_json(..., stream = True)
+        count = 0
+        for json_data in json_objects:
+            if self.add_json(json_data) is not None:
+                count += 1
+        return count
+
+    def load_dump(self, dump):
+        # dump is a file name (plain or .gz), an open file or anything iter_rpsl_objects() reads
+        if isinstance(dump, str):
+            with open_dump(dump) as f:
+                return self.load_dump(f)
+        count = 0
+        for attributes in iter_rpsl_objects(dump):
+            object_type = attributes[0][0]
+            if object_type not in indexed_types:
+                continue
+            key = attributes[0][1]
+            if object_type.startswith('route'):
+                key += next((value for name, value, comment in attributes if name == 'origin'), '')
+            self.add(record_from_attributes(object_type, key, attributes))
+            count += 1
+        logger.debug(f'Indexed {count} objects')
+        return count
+
+    def load_local(self, local_api):
+        # objects stored in a LocalRipeDBApi
+        count = 0
+        with local_api._lock:
+            rows = local_api._connection.execute(
+                f'SELECT type, key, attributes FROM objects WHERE type IN ({",".join("?" * len(indexed_types))})',
+                indexed_types
+            ).fetchall()
+        for object_type, key, data in rows:
+            self.add(record_from_attributes(object_type, key, json.loads(data)))
+            count += 1
+        return count
+
+    def records(self):
+        seen = set()
+        for root in self._roots.values():
+            for node in self._walk(root):
+                for record in node.records or ():
+                    if record not in seen:
+                        seen.add(record)
+                        yield record
+
+    def _walk(self, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            yield node
+            if node.children[1] is not None:
+                stack.append(node.children[1])
+            if node.children[0] is not None:
+                stack.append(node.children[0])
+
+    def _matching(self, records, types):
+        if records is None:
+            return []
+        if types is None:
+            return records
+        return [record for record in records if record.type in types]
+
+    def _results(self, records, objects):
+        if not objects:
+            return records
+        if self._api is None:
+            raise ValueError('Objects can only be returned by an index with an API')
+        return [lazy_object(self._api, record.type, record.key) for record in records]
+
+    def _longest_match(self, version, address, types):
+        for mask, prefixes in self._masks[version]:
+            records = prefixes.get(address & mask)
+            if records is not None:
+                if types is None:
+                    return records
+                records = self._matching(records, types)
+                if records:
+                    return records
+        return []
+
+    def lookup(self, address, types = None, objects = False):
+        # records of the most specific prefix covering the address
+        if isinstance(types, str):
+            types = (types,)
+        version, address = parse_address(address)
+        return self._results(list(self._longest_match(version, address, types)), objects)
+
+    def lookup_many(self, addresses, types = None, objects = False):
+        # results are in the order of addresses, repeated addresses are looked up once
+        if isinstance(types, str):
+            types = (types,)
+        cache = {}
+        results = []
+        for address in addresses:
+            result = cache.get(address)
+            if result is None:
+                version, value = parse_address(address)
+                result = cache[address] = self._results(list(self._longest_match(version, value, types)), objects)
+            results.append(result)
+        return results
+
+    def covering(self, prefix, types = None, objects = False):
+        # records covering the prefix ordered from the least specific, including an exact match
+        if isinstance(types, str):
+            types = (types,)
+        version, first, length = parse_prefix(prefix)
+        bits = address_bits[version]
+        node = self._roots[version]
+        found = []
+        while node is not None and node.length <= length:
+            if (first ^ node.first) >> (bits - node.length) != 0:
+                break
+            for record in self._matching(node.records, types):
+                if record not in found:
+                    found.append(record)
+            if node.length == bits:
+                break
+            node = node.children[(first >> (bits - node.length - 1)) & 1]
+        return self._results(found, objects)
+
+    def more_specifics(self, prefix, types = None, objects = False, exact = False):
+        # records lying wholly inside the prefix, the prefix itself is only included with exact
+        if isinstance(types, str):
+            types = (types,)
+        version, first, length = parse_prefix(prefix)
+        bits = address_bits[version]
+        last = first + (1 << (bits - length)) - 1
+        node = self._roots[version]
+        # descend to the first node inside the prefix
+        while node is not None and node.length < length:
+            if (first ^ node.first) >> (bits - node.length) != 0:
+                return self._results([], objects)
+            node = node.children[(first >> (bits - node.length - 1)) & 1]
+        if node is None or (node.first ^ first) >> (bits - length) != 0:
+            return self._results([], objects)
+        found = {}
+        for subnode in self._walk(node):
+            for record in self._matching(subnode.records, types):
+                # ranges split into several prefixes may reach past the prefix
+                if record.first < first or record.last > last:
+                    continue
+                if not exact and record.first == first and record.last == last:
+                    continue
+                found[record] = None
+        return self._results(list(found), objects)
+
+    def stats(self):
+        nodes = {version: sum(1 for _ in self._walk(root)) for version, root in self._roots.items()}
+        return {'records': self._count, 'nodes': nodes}
+
+    def save(self, path):
+        data = {
+            'format': INDEX_FORMAT,
+            'records': [list(record) for record in self.records()],
+        }
+        directory = os.path.dirname(path) or '.'
+        # write to a temporary file first so readers never see a partial snapshot
+        fd, tmp_path = tempfile.mkstemp(dir = directory, suffix = '.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt') as f:
+                json.dump(data, f, separators = (',', ':'))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path, api = None):
+        with gzip.open(path, 'rt') as f:
+            data = json.load(f)
+        if data.get('format') != INDEX_FORMAT:
+            raise ValueError(f'Unsupported prefix index format {data.get("format")}')
+        index = cls(api)
+        for record in data['records']:
+            index.add(PrefixRecord(*record))
+        return index
@@ -0,0 +1,183 @@
+import random, threading, time
+from datetime import timezone
+from . import logger as parent_logger
+
+logger = parent_logger.getChild('ratelimit')
+
+write_methods = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+# statuses telling the client to slow down
+throttle_statuses = (429, 503)
+
+
+class RateLimitError(ValueError):
+    # the server kept answering 429 Too Many Requests
+    def __init__(self, message, status = 429, retry_after = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+def parse_retry_after(value, now = None):
+    # Retry-After is either seconds or an HTTP date, None when missing or malformed
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo = timezone.utc)
+    return max(0.0, date.timestamp() - (time.time() if now is None else now))
+
+
+class TokenBucket():
+    # rate tokens per second, up to burst tokens saved up
+    def __init__(self, rate, burst = None):
+        if rate <= 0:
+            raise ValueError('Rate must be positive')
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        # takes a token when there is one, otherwise returns the seconds until there is
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class RateLimiter():
+    # Request budget shared by all threads and asyncio tasks using it, it can be shared by several API instances too.
+    # Reads and authenticated writes have separate token buckets (rate None is unlimited).
+    # A throttled answer pauses every caller until Retry-After or a jittered exponential backoff passes.
+    # The number of requests in flight follows the server (AIMD), it grows by one per limit of fast answers
+    # and halves on throttling, errors or latency above latency_tolerance times the fastest answer seen.
+    def __init__(self, read_rate = 20.0, write_rate = 2.0, read_burst = None, write_burst = None,
+            max_concurrency = 10, min_concurrency = 1, initial_concurrency = None, latency_tolerance = 3.0,
+            retries = 5, backoff_factor = 0.5, max_backoff = 60.0):
+        if min_concurrency < 1 or max_concurrency < min_concurrency:
+            raise ValueError('Invalid concurrency bounds')
+        self._buckets = {
+            False: TokenBucket(read_rate, read_burst) if read_rate is not None else None,
+            True: TokenBucket(write_rate, write_burst) if write_rate is not None else None,
+        }
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.latency_tolerance = latency_tolerance
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self._limit = float(initial_concurrency if initial_concurrency is not None else max_concurrency)
+        self._in_flight = 0
+        self._blocked_until = 0.0
+        self._decreased = 0.0
+        self._min_latency = None
+        self._throttled = 0
+        self._condition = threading.Condition()
+
+    @property
+    def concurrency(self):
+        return int(self._limit)
+
+    def _enter(self, write):
+        # called with the condition held, 0 when the request may go,
+        # otherwise seconds to wait or None to wait for a request to finish
+        now = time.monotonic()
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._in_flight >= int(self._limit):
+            return None
+        bucket = self._buckets[write]
+        if bucket is not None:
+            delay = bucket.take()
+            if delay:
+                return delay
+        self._in_flight += 1
+        return 0
+
+    def acquire(self, write = False):
+        with self._condition:
+            while True:
+                delay = self._enter(write)
+                if delay == 0:
+                    return
+                self._condition.wait(delay)
+
+    async def acquire_async(self, write = False, poll_interval = 0.01):
+        # waiting on the condition would block the event loop, the slot is polled instead
+        import asyncio
+        while True:
+            with self._condition:
+                delay = self._enter(write)
+            if delay == 0:
+                return
+            await asyncio.sleep(delay if delay is not None else poll_interval)
+
+    def release(self, write, elapsed, status = None):
+        # status None means the request failed without an answer
+        with self._condition:
+            self._in_flight -= 1
+            self._adjust(elapsed, status)
+            self._condition.notify_all()
+
+    def _adjust(self, elapsed, status):
+        now = time.monotonic()
+        if status is None or status in throttle_statuses or status >= 500:
+            self._decrease(now, elapsed)
+            return
+        if self._min_latency is None or elapsed < self._min_latency:
+            self._min_latency = elapsed
+        else:
+            # let the baseline follow a permanently slower server
+            self._min_latency += (elapsed - self._min_latency) * 0.01
+        if elapsed > self._min_latency * self.latency_tolerance + 0.05:
+            self._decrease(now, elapsed)
+        elif self._limit < self.max_concurrency:
+            self._limit = min(self.max_concurrency, self._limit + 1 / self._limit)
+
+    def _decrease(self, now, elapsed):
+        # requests started before the last decrease saw the old limit, they do not count again
+        if now - elapsed < self._decreased:
+            return
+        self._limit = max(self.min_concurrency, self._limit / 2)
+        self._decreased = now
+        logger.debug(f'Concurrency decreased to {int(self._limit)}')
+
+    def backoff(self, attempt, retry_after = None):
+        # equal jitter keeps throttled clients from retrying all at once
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.backoff_factor)
+        delay = min(self.max_backoff, self.backoff_factor * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def throttle(self, attempt, retry_after = None):
+        # pauses every caller after a 429, returns the pause in seconds
+        delay = self.backoff(attempt, parse_retry_after(retry_after))
+        with self._condition:
+            self._throttled += 1
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        logger.debug(f'Throttled by the server, pausing for {delay:.2f}s')
+        return delay
+
+    def stats(self):
+        with self._condition:
+            return {
+                'concurrency': int(self._limit),
+                'in_flight': self._in_flight,
+                'throttled': self._throttled,
+                'min_latency': self._min_latency,
+                'blocked_for': max(0.0, self._blocked_until - time.monotonic()),
+            }
@@ -1,17 +1,65 @@
-import requests, logging
+import logging, hashlib, contextlib, re, threading, time
+from datetime import timedelta
+from urllib.parse import quote
 from . import logger as parent_logger
-from . objects import object_from_json, empty_object
+from . objects import object_from_json, empty_object, primary_key, project_json, projected_object
+from . objects.schema import compile_template, initial_schemas, default_schema_cache, save_schemas
+from . cache import ObjectCache, SingleFlight
+from . metrics import Metrics
+from . ratelimit import RateLimiter, RateLimitError, parse_retry_after
+from . stream import iter_json_array
+from . batch import Batch
 
 logger = parent_logger.getChild('rest')
 
+# default object_cache_ttl, objects in the identity map live as long as cached responses
+same_as_cache_timeout = object()
+
+# cache timeouts of responses besides objects, types not listed use cache_timeout
+default_cache_timeouts = {
+    'templates': 86400,
+}
+
+def cache_url_pattern(name):
+    if name == 'templates':
+        return re.compile(r'/metadata/templates/')
+    if name == 'search':
+        return re.compile(r'/search\?')
+    return re.compile(f'/{re.escape(name)}/')
+
+
+def search_flags(flags, attributes = None):
+    # query flags by their long names (no-referenced, primary-keys, brief, no-filtering ...),
+    # a projection to no attributes only needs the primary keys
+    flags = [flags] if isinstance(flags, str) else list(flags or ())
+    if attributes is not None and not attributes and 'primary-keys' not in flags:
+        flags.append('primary-keys')
+    return flags or None
+
+# flags making the server return only some attributes of every object
+trimming_flags = ('primary-keys', 'brief')
+
+def trimmed_search(flags):
+    flags = [flags] if isinstance(flags, str) else flags or ()
+    return any(flag in trimming_flags for flag in flags)
+
+
 class RestApi():
     _base_url = 'https://rest.db.ripe.net'
+    _metrics = None
+    _rate_limiter = None
     _source = 'RIPE'
     _mntner = None
     _password = None
-    _templates = {}
+    _stream_chunk_size = 1 << 16
+    _session_instance = None
+    _schemas_instance = None
 
-    def __init__(self, base_url = None, source = None, mntner = None, password = None, cache_timeout = 300):
+    def __init__(self, base_url = None, source = None, mntner = None, password = None, cache_timeout = 300,
+            cache_name = None, cache_backend = 'sqlite', pool_size = 10, timeout = (5, 60), retries = 3, backoff_factor = 0.5,
+            object_cache_size = 10000, object_cache_ttl = same_as_cache_timeout, schema_cache = None, bundled_schemas = True,
+            cache_timeouts = None, cache_control = False, stale_if_error = False, metrics = None, rate_limit = None,
+            coalesce = True, deferred = False):
         if base_url is not None:
             self._base_url = base_url
         if source is not None:
@@ -19,113 +67,436 @@ class RestApi():
         self._mntner = mntner
         self._password = password
         self._writable = mntner is not None and password is not None
+        self._templates = {}
+        # guards _templates, _schemas and the schema cache file against concurrent updates
+        self._schemas_lock = threading.RLock()
+        # compiled templates come from the bundled snapshot and the on-disk cache,
+        # only types missing from both are fetched from the server
+        # schema_cache is None (the default) to keep fetched schemas in memory only, a path or True for the default one
+        self._schema_cache = default_schema_cache(self._base_url) if schema_cache is True else schema_cache or None
+        self._bundled_schemas = bundled_schemas
+        self._timeout = timeout
+        # metrics is True, a shared Metrics instance or None to disable the instrumentation
+        self._metrics = Metrics(base_url = self._base_url) if metrics is True else metrics or None
+        # cache keys of searches made by this instance, dropped on every write
+        self._search_keys = set()
+        self._search_keys_lock = threading.Lock()
+        # identical lookups running concurrently in several threads share one request
+        self._inflight = SingleFlight() if coalesce else None
+        # rate_limit is None (the default) to send requests unthrottled, True for a RateLimiter with the default
+        # budget or a RateLimiter shared with other instances
+        self._rate_limiter = RateLimiter(max_concurrency = pool_size) if rate_limit is True else rate_limit or None
+        self._session_args = (cache_timeout, cache_name, cache_backend, pool_size, retries, backoff_factor,
+            cache_timeouts, cache_control, stale_if_error)
+        self._session_lock = threading.Lock()
+        # deferred instances load requests, the response cache and the schemas on first use
+        if not deferred:
+            self._session
+            self._schemas
+        # linked objects live as long as cached responses unless configured otherwise,
+        # None keeps them until evicted by size, object_cache_size = 0 disables the identity map
+        if object_cache_ttl is same_as_cache_timeout:
+            object_cache_ttl = cache_timeout
+        self._objects = ObjectCache(object_cache_size, object_cache_ttl)
+
+    @property
+    def _session(self):
+        if self._session_instance is None:
+            with self._session_lock:
+                if self._session_instance is None:
+                    self._session_instance = self._create_session(*self._session_args)
+        return self._session_instance
+
+    @property
+    def _schemas(self):
+        if self._schemas_instance is None:
+            with self._schemas_lock:
+                if self._schemas_instance is None:
+                    self._schemas_instance = initial_schemas(self._schema_cache, self._bundled_schemas)
+        return self._schemas_instance
+
+    def _create_session(self, cache_timeout, cache_name, cache_backend, pool_size, retries, backoff_factor,
+            cache_timeouts = None, cache_control = False, stale_if_error = False):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        from . adapter import RateLimitedAdapter
         if cache_timeout is not None:
             import requests_cache
-            from datetime import timedelta
-            expire_after = timedelta(seconds=cache_timeout)
-            requests_cache.install_cache(expire_after=expire_after)
+            if cache_name is None:
+                # every base url / source / maintainer combination gets its own cache
+                # so differently configured instances never serve each other's responses
+                cache_name = self._default_cache_name()
+            # timeouts per object type (and 'templates', 'search'), e.g. {'mntner': 86400, 'route': 60}
+            urls_expire_after = {
+                cache_url_pattern(name): timedelta(seconds = seconds) if seconds is not None else requests_cache.NEVER_EXPIRE
+                for name, seconds in dict(default_cache_timeouts, **(cache_timeouts or {})).items()
+            }
+            # expired responses stay in the cache, when they carry an ETag or Last-Modified
+            # they are revalidated with a conditional request instead of being fetched again
+            session = requests_cache.CachedSession(
+                cache_name = cache_name,
+                backend = cache_backend,
+                expire_after = timedelta(seconds=cache_timeout),
+                urls_expire_after = urls_expire_after,
+                cache_control = cache_control,
+                stale_if_error = stale_if_error,
+                ignored_parameters = ['password'],
+            )
+        else:
+            session = requests.Session()
+        retry = Retry(
+            total = retries,
+            backoff_factor = backoff_factor,
+            status_forcelist = [500, 502, 503, 504],
+            allowed_methods = ['GET', 'HEAD'],
+            raise_on_status = False,
+            # with a rate limiter 429 answers pause every thread instead of only the one retrying
+            respect_retry_after_header = self._rate_limiter is None,
+        )
+        if self._rate_limiter is not None:
+            adapter = RateLimitedAdapter(self._rate_limiter, pool_connections = pool_size, pool_maxsize = pool_size, max_retries = retry)
+        else:
+            adapter = HTTPAdapter(pool_connections = pool_size, pool_maxsize = pool_size, max_retries = retry)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['Accept'] = 'application/json'
+        return session
+
+    def _default_cache_name(self):
+        instance_key = '\0'.join([self._base_url, self._source, self._mntner or ''])
+        return 'ripedb-' + hashlib.sha1(instance_key.encode()).hexdigest()[:12]
+
+    def _request(self, method, url, cache = True, refresh = False, **kwargs):
+        kwargs.setdefault('timeout', self._timeout)
+        if refresh and hasattr(self._session, 'cache'):
+            # fetch again and store the fresh response, a plain refresh only revalidates
+            # responses with an ETag or Last-Modified and would serve the others from the cache
+            kwargs['force_refresh'] = True
+        if not cache and hasattr(self._session, 'cache'):
+            # no-store skips both the cache lookup and the write of the response,
+            # a per-request expire_after = DO_NOT_CACHE would still store it
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **{'Cache-Control': 'no-store'})
+        if self._metrics is None:
+            q = self._session.request(method, url, **kwargs)
+        else:
+            started = time.perf_counter()
+            q = self._session.request(method, url, **kwargs)
+            elapsed = time.perf_counter() - started
+            body = q.request.body if q.request is not None else None
+            self._metrics.request(method, url, q.status_code, elapsed,
+                bytes_sent = len(body) if body is not None else 0,
+                # streamed bodies are counted while they are read
+                bytes_received = 0 if kwargs.get('stream') else len(q.content),
+                from_cache = getattr(q, 'from_cache', False) if cache and hasattr(self._session, 'cache') else None,
+                revalidated = getattr(q, 'revalidated', False),
+            )
+        if q.status_code == 429:
+            # still throttled after the limiter's retries
+            q.close()
+            raise RateLimitError(f'Too many requests: {method} {url}', retry_after = parse_retry_after(q.headers.get('Retry-After')))
+        return q
+
+    def _coalesce(self, key, function, *args):
+        if self._inflight is None:
+            return function(*args)
+        return self._inflight.do(key, function, *args)
+
+    def _json(self, q):
+        if self._metrics is None:
+            return q.json()
+        started = time.perf_counter()
+        json_data = q.json()
+        self._metrics.timing('json', time.perf_counter() - started)
+        return json_data
+
+    def _iter_content(self, q):
+        chunks = q.iter_content(chunk_size = self._stream_chunk_size)
+        if self._metrics is None:
+            return chunks
+        return self._count_received(q, chunks)
+
+    def _count_received(self, q, chunks):
+        for chunk in chunks:
+            self._metrics.received('GET', q.url, len(chunk))
+            yield chunk
+
+    def close(self):
+        # a deferred instance which never sent a request has nothing to close
+        if self._session_instance is not None:
+            self._session_instance.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def object_cache_stats(self):
+        return self._objects.stats()
+
+    def stats(self):
+        # snapshot of the metrics (when enabled) and of the identity map
+        stats = self._metrics.snapshot() if self._metrics is not None else {}
+        stats['objects'] = self.object_cache_stats()
+        if self._rate_limiter is not None:
+            stats['rate_limit'] = self._rate_limiter.stats()
+        if self._inflight is not None:
+            stats['coalesced'] = self._inflight.stats()
+        return stats
     
     def is_writable(self):
         return self._writable
     
     def _post(self, object_type, object_data):
-        q = requests.post(
+        q = self._request('POST',
             url=f'{self._base_url}/{self._source}/{object_type}',
-            headers = {'Accept': 'application/json'},
             params = {'password': self._password},
             json = object_data
         )
         if q.status_code == 200:
-            return q.json()['objects']['object'][0]
+            json_data = self._json(q)['objects']['object'][0]
+            self._invalidate(object_type, primary_key(json_data), json_data)
+            return json_data
         else:
             logger.debug({'code': q.status_code, 'data': q.content})
             raise ValueError
     def _delete(self, object_type, id):
-        q = requests.delete(
+        q = self._request('DELETE',
             url=f'{self._base_url}/{self._source}/{object_type}/{id}',
-            headers = {'Accept': 'application/json'},
             params = {'password': self._password}
         )
         if q.status_code == 200:
-            return q.json()['objects']['object'][0]
+            json_data = self._json(q)['objects']['object'][0]
+            self._invalidate(object_type, id, json_data)
+            self._objects.invalidate(object_type, primary_key(json_data))
+            return json_data
         else:
             logger.debug({'code': q.status_code, 'data': q.content})
             raise ValueError
     
     def _put(self, object_type, id, object_data):
-        q = requests.put(
+        q = self._request('PUT',
             url=f'{self._base_url}/{self._source}/{object_type}/{id}',
-            headers = {'Accept': 'application/json'},
             params = {'password': self._password},
             json = object_data
         )
         if q.status_code == 200:
-            return q.json()['objects']['object'][0]
+            json_data = self._json(q)['objects']['object'][0]
+            self._invalidate(object_type, id, json_data)
+            return json_data
         else:
             logger.debug({'code': q.status_code, 'data': q.content})
             raise ValueError
 
+    def _invalidate(self, object_type, id, json_data = None):
+        # Write-through invalidation, drops the cached lookups of the written object
+        # and every search made by this instance, any of them may list the object.
+        if self._inflight is not None:
+            self._inflight.forget()
+        if not hasattr(self._session, 'cache'):
+            return
+        urls = [
+            f'{self._base_url}/{self._source}/{object_type}/{quote(id)}',
+            f'{self._base_url}/{self._source.lower()}/{object_type}/{quote(id)}',
+        ]
+        if json_data is not None and 'link' in json_data:
+            urls.append(json_data['link']['href'])
+        with self._search_keys_lock:
+            search_keys = list(self._search_keys)
+            self._search_keys.clear()
+        self._session.cache.delete(*search_keys, urls = urls)
+
+    def _track_search(self, q):
+        cache_key = getattr(q, 'cache_key', None)
+        if cache_key:
+            with self._search_keys_lock:
+                self._search_keys.add(cache_key)
+
+    def batch(self, workers = 4, dry_run = False):
+        # with api.batch() as batch: ... applies the collected writes on exit
+        return Batch(self, workers, dry_run)
+
     def get_template(self,object_type):
-        if object_type not in self._templates:
-            q = requests.get(
-                url=f'{self._base_url}/metadata/templates/{object_type}',
-                headers = {'Accept': 'application/json'}
-            )
-            if q.status_code == 404:
-                # not found
+        template = self._templates.get(object_type)
+        if template is None:
+            template = self._coalesce(('template', object_type), self._get_template, object_type)
+        return template
+
+    def _get_template(self, object_type, refresh = False):
+        q = self._request('GET',
+            url=f'{self._base_url}/metadata/templates/{object_type}',
+            refresh = refresh
+        )
+        if q.status_code == 404:
+            # not found
+            return None
+        elif q.status_code == 200:
+            template = self._json(q)['templates']['template'][0]
+            with self._schemas_lock:
+                self._templates[object_type] = template
+            return template
+        else:
+            logger.debug({'code': q.status_code, 'data': q.content})
+            raise ValueError
+
+    def get_schema(self, object_type):
+        # compiled template shared by all objects of the type
+        schema = self._schemas.get(object_type)
+        if schema is None:
+            template = self.get_template(object_type)
+            if template is None:
                 return None
-            elif q.status_code == 200:
-                self._templates[object_type] = q.json()['templates']['template'][0]
-            else:
-                logger.debug({'code': q.status_code, 'data': q.content})
-                raise ValueError
-        return self._templates[object_type]
+            with self._schemas_lock:
+                # a thread compiling the same template meanwhile wins, every object shares one schema
+                schema = self._schemas.setdefault(object_type, compile_template(object_type, template))
+            self._save_schemas()
+        return schema
+
+    def refresh_schemas(self, object_types = None):
+        # re-fetch templates from the server, the fresh responses replace the cached ones
+        if object_types is None:
+            object_types = list(self._schemas)
+        for object_type in object_types:
+            with self._schemas_lock:
+                self._templates.pop(object_type, None)
+            # not coalesced, a lookup in flight may still be served from the cache
+            template = self._get_template(object_type, refresh = True)
+            with self._schemas_lock:
+                if template is None:
+                    self._schemas.pop(object_type, None)
+                else:
+                    self._schemas[object_type] = compile_template(object_type, template)
+        self._save_schemas()
+        with self._schemas_lock:
+            return dict(self._schemas)
+
+    def save_schemas(self, path):
+        with self._schemas_lock:
+            save_schemas(path, dict(self._schemas), self._base_url)
+
+    def _save_schemas(self):
+        if self._schema_cache is None:
+            return
+        try:
+            with self._schemas_lock:
+                save_schemas(self._schema_cache, dict(self._schemas), self._base_url)
+        except OSError as e:
+            logger.debug(f'Cannot write schema cache {self._schema_cache}: {e}')
+
+    def get_url_json(self, url, refresh = False, unfiltered = False):
+        return self._coalesce(('GET', url, refresh, unfiltered), self._get_url_json, url, refresh, unfiltered)
 
-    def get_url_json(self, url):
-        q = requests.get(
+    def _get_url_json(self, url, refresh = False, unfiltered = False):
+        q = self._request('GET',
             url = url,
-            headers = {'Accept': 'application/json'}
+            params = self._unfiltered_params() if unfiltered else None,
+            refresh = refresh
         )
         if q.status_code == 404:
             # not found
             return None
         elif q.status_code == 200:
-            return q.json()['objects']['object'][0]
+            return self._json(q)['objects']['object'][0]
         else:
-            logger.debug({'code': q.status_code, 'data': q.json()})
+            logger.debug({'code': q.status_code, 'data': q.content})
             raise ValueError
         
-    def get_object_json(self, object_type, id):
-        url = f'{self._base_url}/{self._source}/{object_type}/{requests.utils.quote(id)}'
-        return self.get_url_json(url)
+    def get_object_json(self, object_type, id, refresh = False, unfiltered = False):
+        url = f'{self._base_url}/{self._source}/{object_type}/{quote(id)}'
+        return self.get_url_json(url, refresh, unfiltered)
+
+    def _unfiltered_params(self):
+        # the server only drops its filtering (e-mail addresses, auth hashes) for the maintainer's password
+        params = {'unfiltered': ''}
+        if self._password is not None:
+            params['password'] = self._password
+        return params
 
     def __getattr__(self, attrname):
         object_type = attrname.replace('_','-')
         return empty_object(self, object_type)
 
-    def search(self, query_string, iterator=True, resource_holder = False, type_filter = None, inverse_attribute = None):
+    def search_json(self, query_string, resource_holder = False, type_filter = None, inverse_attribute = None, stream = False, limit = None,
+            refresh = False, flags = None, attributes = None):
+        # flags trim the results on the server (see search_flags), attributes projects them to those attributes
         params = {
             'query-string': query_string,
             'resource-holder': int(resource_holder),
             'type-filter': type_filter,
             'inverse-attribute': inverse_attribute,
+            'flags': search_flags(flags, attributes),
+            # without it the server searches its default source only
+            'source': self._source,
         }
-        q = requests.get(
+        if stream:
+            # every streamed search reads its own response
+            json_objects = self._search_json_stream(params, limit)
+            if attributes is not None:
+                return (project_json(json_data, attributes) for json_data in json_objects)
+            return json_objects
+        key = ('search', refresh) + tuple(
+            (name, tuple(value) if isinstance(value, (list, tuple)) else value) for name, value in params.items()
+        )
+        # the slice gives every coalesced caller its own list
+        json_objects = self._coalesce(key, self._search_json, params, refresh)[:limit]
+        if attributes is not None:
+            return [project_json(json_data, attributes) for json_data in json_objects]
+        return json_objects
+
+    def _search_json(self, params, refresh = False):
+        q = self._request('GET',
             url=f'{self._base_url}/search',
             params = params,
-            headers = {'Accept': 'application/json'}
+            refresh = refresh
         )
         if q.status_code == 404:
             # not found
             return []
         elif q.status_code == 200:
             # found
-            json = q.json()
-            itr = map(lambda x: object_from_json(self,x), json['objects']['object'])
-            if iterator:
-                return itr
-            else:
-                return list(itr)
+            self._track_search(q)
+            return self._json(q)['objects']['object']
         else:
-            logger.debug({'code': q.status_code, 'data': q.json()})
+            logger.debug({'code': q.status_code, 'data': q.content})
             raise ValueError
+
+    def _search_json_stream(self, params, limit):
+        # streamed responses bypass the cache, caching would buffer the whole body
+        q = self._request('GET',
+            url=f'{self._base_url}/search',
+            params = params,
+            stream = True,
+            cache = False
+        )
+        with contextlib.closing(q):
+            if q.status_code == 404:
+                # not found
+                return
+            elif q.status_code != 200:
+                logger.debug({'code': q.status_code, 'data': q.content})
+                raise ValueError
+            if limit == 0:
+                return
+            count = 0
+            for json_data in iter_json_array(self._iter_content(q)):
+                yield json_data
+                count += 1
+                if limit is not None and count >= limit:
+                    # closing the response drops the rest of the payload
+                    return
+
+    def search(self, query_string, iterator=True, resource_holder = False, type_filter = None, inverse_attribute = None, stream = False, limit = None,
+            flags = None, attributes = None):
+        # with attributes the results are projected objects holding only those attributes,
+        # results trimmed by the flags are projected to the attributes the server returned
+        json_objects = self.search_json(query_string, resource_holder, type_filter, inverse_attribute, stream, limit,
+            flags = search_flags(flags, attributes))
+        if attributes is not None or trimmed_search(flags):
+            itr = map(lambda x: projected_object(self, x, attributes), json_objects)
+        else:
+            itr = map(lambda x: object_from_json(self,x), json_objects)
+        if iterator:
+            return itr
+        else:
+            return list(itr)
@@ -0,0 +1,138 @@
+import codecs, gzip, re
+
+gzip_magic = b'\x1f\x8b'
+# objects are separated by one or more empty lines
+object_separator_re = re.compile(r'\n(?:[ \t]*\n)+')
+block_size = 1 << 20
+
+def open_dump(path):
+    # RIPE split dumps are gzip'd RPSL text (ripe.db.<type>.gz), compression is detected from the content
+    f = open(path, 'rb')
+    if f.peek(2)[:2] == gzip_magic:
+        return gzip.GzipFile(fileobj = f, mode = 'rb')
+    return f
+
+def iter_chunks(source):
+    # file objects are read in blocks, strings and bytes are one chunk, anything else is an iterable of lines
+    if hasattr(source, 'read'):
+        if hasattr(source, 'peek') and source.peek(2)[:2] == gzip_magic:
+            source = gzip.GzipFile(fileobj = source, mode = 'rb')
+        while True:
+            chunk = source.read(block_size)
+            if not chunk:
+                return
+            yield chunk
+    elif isinstance(source, (str, bytes)):
+        if isinstance(source, bytes) and source[:2] == gzip_magic:
+            source = gzip.decompress(source)
+        yield source
+    else:
+        for line in source:
+            yield line if line[-1:] in ('\n', b'\n') else line + ('\n' if isinstance(line, str) else b'\n')
+
+def iter_object_texts(source, encoding = 'utf-8'):
+    decoder = codecs.getincrementaldecoder(encoding)(errors = 'replace')
+    tail = ''
+    for chunk in iter_chunks(source):
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        if '\r' in chunk:
+            chunk = chunk.replace('\r\n', '\n')
+        texts = object_separator_re.split(tail + chunk)
+        # the last text may continue in the next chunk
+        tail = texts.pop()
+        yield from texts
+    tail += decoder.decode(b'', final = True)
+    if tail.strip() != '':
+        yield tail
+
+def parse_object_text(text):
+    # returns the object as a list of (name, value, comment)
+    attributes = []
+    for line in text.split('\n'):
+        if line == '':
+            continue
+        first = line[0]
+        if first == ' ' or first == '\t' or first == '+':
+            # continuation of the previous attribute value
+            if not attributes:
+                continue
+            line = line[1:]
+            comment = None
+            if '#' in line:
+                line, _, comment = line.partition('#')
+                comment = comment.strip() or None
+            line = line.strip()
+            name, value, previous_comment = attributes[-1]
+            if line != '':
+                value = f'{value} {line}' if value != '' else line
+            if comment is not None:
+                comment = f'{previous_comment} {comment}' if previous_comment is not None else comment
+            else:
+                comment = previous_comment
+            attributes[-1] = (name, value, comment)
+        elif first == '%' or first == '#':
+            # comment or server message
+            continue
+        else:
+            name, separator, value = line.partition(':')
+            if separator == '':
+                continue
+            comment = None
+            if '#' in value:
+                value, _, comment = value.partition('#')
+                comment = comment.strip() or None
+            attributes.append((name.strip().lower(), value.strip(), comment))
+    return attributes
+
+def iter_rpsl_objects(source, encoding = 'utf-8'):
+    # Yields objects as lists of (name, value, comment) from a file, text, bytes or lines.
+    # Continuation lines (leading whitespace or '+'), comments and gzip input are supported.
+    for text in iter_object_texts(source, encoding):
+        attributes = parse_object_text(text)
+        if attributes:
+            yield attributes
+
+def rpsl_object_json(attributes, schema = None):
+    # the JSON structure RipeObject._parse_json consumes
+    object_type = attributes[0][0]
+    primary_key_names = schema.primary_key if schema is not None and schema.primary_key else (object_type,)
+    primary_key = []
+    for primary_key_name in primary_key_names:
+        for name, value, comment in attributes:
+            if name == primary_key_name:
+                primary_key.append({'name': name, 'value': value})
+                break
+    json_attributes = []
+    for name, value, comment in attributes:
+        json_attr = {'name': name, 'value': value}
+        if comment is not None:
+            json_attr['comment'] = comment
+        json_attributes.append(json_attr)
+    return {
+        'type': object_type,
+        'primary-key': {'attribute': primary_key},
+        'attributes': {'attribute': json_attributes},
+    }
+
+def iter_rpsl_json(source, schemas = None, encoding = 'utf-8'):
+    # the schemas give the primary keys, route objects are keyed by prefix and origin
+    if schemas is None:
+        from . objects.schema import initial_schemas
+        schemas = initial_schemas(None)
+    for attributes in iter_rpsl_objects(source, encoding):
+        yield rpsl_object_json(attributes, schemas.get(attributes[0][0]))
+
+def format_attribute(name, value, comment = None, align = 16):
+    name = f'{name}:'.ljust(align - 1) + ' '
+    if comment is not None:
+        value = f'{value} # {comment}' if value != '' else f'# {comment}'
+    if '\n' not in value:
+        return name + value
+    lines = value.split('\n')
+    indent = ' ' * len(name)
+    return '\n'.join([name + lines[0]] + [indent + line if line != '' else '+' for line in lines[1:]])
+
+def format_rpsl(attributes, align = 16):
+    # attributes are (name, value) or (name, value, comment) tuples
+    return '\n'.join([format_attribute(*attr, align = align) if len(attr) > 2 else format_attribute(attr[0], attr[1], align = align) for attr in attributes])
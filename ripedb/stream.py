@@ -0,0 +1,65 @@
+import codecs, json, re
+
+# opening of the "object" list inside "objects" of a RIPE REST response
+objects_start_re = re.compile(r'"objects"\s*:\s*\{\s*"object"\s*:\s*\[')
+separator_re = re.compile(r'[\s,]*')
+
+class JsonArrayParser():
+    # Incremental decoder of the items of one JSON list inside a larger document.
+    # Bytes are fed as they arrive, complete items are returned as soon as they are decoded,
+    # only the undecoded tail is kept in memory.
+    def __init__(self, start_re = objects_start_re, max_buffer = 1 << 16):
+        self._start_re = start_re
+        self._max_buffer = max_buffer
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._position = None
+        self.finished = False
+
+    def feed(self, data, final = False):
+        self._buffer += self._text_decoder.decode(data, final = final)
+        items = []
+        if self.finished:
+            return items
+        if self._position is None:
+            match = self._start_re.search(self._buffer)
+            if match is None:
+                if final:
+                    # the document holds no list at all
+                    self.finished = True
+                return items
+            self._position = match.end()
+        buffer = self._buffer
+        position = self._position
+        while True:
+            position = separator_re.match(buffer, position).end()
+            if position >= len(buffer):
+                if final:
+                    raise ValueError('Unterminated JSON list')
+                break
+            if buffer[position] == ']':
+                self.finished = True
+                break
+            try:
+                item, position = self._decoder.raw_decode(buffer, position)
+            except ValueError:
+                # the item is not complete yet
+                if final:
+                    raise
+                break
+            items.append(item)
+        if position > self._max_buffer:
+            buffer = buffer[position:]
+            position = 0
+        self._buffer = buffer
+        self._position = position
+        return items
+
+def iter_json_array(chunks, start_re = objects_start_re):
+    parser = JsonArrayParser(start_re)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+        if parser.finished:
+            return
+    yield from parser.feed(b'', final = True)
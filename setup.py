@@ -8,4 +8,5 @@ setup(name='pyripedb',
     author='Jiri Lunacek',
     author_email='jiri.lunacek@wygroup.io',
     packages = ['ripedb', 'ripedb.objects'],
+    package_data = {'ripedb.objects': ['schemas.json']},
 )
\ No newline at end of file
@@ -0,0 +1,32 @@
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from ripedb import RipeDBApi
+from server import create_server
+
+# small as-set graphs keep the fixtures quick to load
+test_graphs = {
+    'AS-DEEP': (3, 1),
+    'AS-WIDE': (1, 4),
+}
+
+@pytest.fixture
+def server():
+    with create_server(graphs = test_graphs) as server:
+        yield server
+
+def make_api(server, **kwargs):
+    # no response cache, rate limiter or schema cache file, the identity map stays on
+    kwargs.setdefault('cache_timeout', None)
+    kwargs.setdefault('rate_limit', None)
+    return RipeDBApi(base_url = server.url, source = 'TEST', schema_cache = None, **kwargs)
+
+@pytest.fixture
+def api(server):
+    api = make_api(server)
+    yield api
+    api.close()
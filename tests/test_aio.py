@@ -0,0 +1,57 @@
+import asyncio
+
+from ripedb.aio import AsyncRestApi
+
+
+def run(server, test):
+    # every test gets its own event loop and client
+    async def main():
+        async with AsyncRestApi(base_url = server.url, source = 'TEST', schema_cache = None, rate_limit = None) as api:
+            return await test(api)
+    return asyncio.run(main())
+
+def test_get(server):
+    async def test(api):
+        person = await api.person.get('BENCH1-TEST')
+        assert person.id == 'BENCH1-TEST'
+        assert await person.person == 'Benchmark Person'
+        mntner, = await person.mnt_by
+        assert mntner.id == 'BENCH-MNT'
+        assert await api.mntner.get('BENCH-MNT') is mntner
+    run(server, test)
+
+def test_search(server):
+    async def test(api):
+        results = [obj async for obj in api.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'as-set')]
+        assert sorted(obj.id for obj in results) == ['AS-DEEP', 'AS-DEEP-1', 'AS-DEEP-2', 'AS-DEEP-3', 'AS-WIDE', 'AS-WIDE-1', 'AS-WIDE-2', 'AS-WIDE-3', 'AS-WIDE-4']
+        assert await api.as_set.get('AS-WIDE') in results
+        limited = [obj async for obj in api.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'as-set', limit = 2)]
+        assert limited == results[:2]
+    run(server, test)
+
+def test_resolve_members_matches_the_sync_client(server, api):
+    server.store.write([('as-set', 'AS-REF'), ('descr', 'By reference'), ('members', 'AS-DEEP'), ('mbrs-by-ref', 'ANY'), ('mnt-by', 'BENCH-MNT'), ('source', 'TEST')])
+    server.store.write([('aut-num', 'AS64500'), ('as-name', 'REF'), ('member-of', 'AS-REF'), ('mnt-by', 'BENCH-MNT'), ('source', 'TEST')])
+    expected = sorted(aut_num.id for aut_num in api.as_set.get('AS-REF').resolve_members())
+    expected_tree = api.as_set.get('AS-REF').expand(max_depth = 1).tree
+    async def test(api):
+        as_set = await api.as_set.get('AS-REF')
+        aut_nums = await as_set.resolve_members()
+        assert sorted(aut_num.id for aut_num in aut_nums) == expected
+        assert 'AS64500' in expected
+        # aut-nums listed in members are fetched on first access
+        listed = next(aut_num for aut_num in aut_nums if aut_num.id != 'AS64500')
+        assert await listed.as_name == f'BENCH-{listed.id}'
+        expansion = await as_set.expand(max_depth = 1)
+        assert expansion.truncated and sorted(expansion.as_sets) == ['AS-DEEP', 'AS-REF']
+        assert expansion.tree == expected_tree
+    run(server, test)
+
+def test_resolve_members_skips_seen_ids(server):
+    async def test(api):
+        seen_ids = ['AS-DEEP-1']
+        as_set = await api.as_set.get('AS-DEEP')
+        aut_nums = await as_set.resolve_members(seen_ids = seen_ids)
+        assert len(aut_nums) == 2
+        assert set(seen_ids) == {'AS-DEEP-1'} | {aut_num.id for aut_num in aut_nums}
+    run(server, test)
@@ -0,0 +1,44 @@
+import pytest
+
+from ripedb.objects import lazy_object
+from conftest import make_api
+
+
+@pytest.fixture
+def writable_api(server):
+    api = make_api(server, mntner = 'BENCH-MNT', password = 'bench')
+    yield api
+    api.close()
+
+def person(name, nic_hdl, **attributes):
+    return dict({'person': name, 'address': 'Prague', 'phone': '+420000000000', 'nic-hdl': nic_hdl}, **attributes)
+
+def test_free_text_does_not_create_dependencies(writable_api):
+    batch = writable_api.batch()
+    first = batch.create('person', 'JD1-TEST', person('John Doe', 'JD1-TEST', remarks = 'JD2-TEST'))
+    second = batch.create('person', 'JD2-TEST', person('Jane Doe', 'JD2-TEST', remarks = 'JD1-TEST'))
+    role = batch.create('role', 'FANS1-TEST', {'role': 'JD1-TEST fans', 'address': 'Prague', 'e-mail': 'fans@example.com', 'nic-hdl': 'FANS1-TEST'})
+    assert batch.plan() == [[first, second, role]]
+
+def test_references_order_the_writes(writable_api):
+    batch = writable_api.batch()
+    role = batch.create('role', 'FANS1-TEST', {'role': 'Fans', 'address': 'Prague', 'e-mail': 'fans@example.com',
+        'nic-hdl': 'FANS1-TEST', 'admin-c': 'JD1-TEST'})
+    first = batch.create('person', 'JD1-TEST', person('John Doe', 'JD1-TEST'))
+    assert batch.plan() == [[first], [role]]
+
+def test_list_attributes_reference_every_item(writable_api):
+    batch = writable_api.batch()
+    aut_num = batch.create('aut-num', 'AS64500', {'aut-num': 'AS64500', 'as-name': 'TEST', 'member-of': 'AS-X, AS-Y'})
+    as_sets = [batch.create('as-set', name, {'as-set': name, 'mbrs-by-ref': 'ANY'}) for name in ('AS-X', 'AS-Y')]
+    assert batch.plan() == [as_sets, [aut_num]]
+
+def test_dry_run_does_not_fetch_lazy_objects(server, writable_api):
+    gets = server.requests.get('get', 0)
+    batch = writable_api.batch(dry_run = True)
+    valid = batch.update(lazy_object(writable_api, 'person', 'BENCH1-TEST'), {'phone': '+420111111111'})
+    invalid = batch.update(lazy_object(writable_api, 'person', 'BENCH1-TEST'), {'no-such-attribute': 'x'})
+    batch.commit()
+    assert valid.status == 'valid'
+    assert invalid.status == 'invalid'
+    assert server.requests.get('get', 0) == gets
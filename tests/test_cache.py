@@ -0,0 +1,87 @@
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ripedb.cache import ObjectCache, SingleFlight
+from conftest import make_api, test_graphs
+from server import create_server
+
+class Obj():
+    def __init__(self, object_type, key):
+        self._type = object_type
+        self._key = key
+
+@pytest.fixture
+def slow_server():
+    # requests stay in flight long enough for all threads to join them
+    with create_server(graphs = test_graphs, latency = 0.2) as server:
+        yield server
+
+def concurrently(count, function):
+    barrier = threading.Barrier(count)
+    def call():
+        barrier.wait()
+        return function()
+    with ThreadPoolExecutor(max_workers = count) as pool:
+        return [future.result() for future in [pool.submit(call) for _ in range(count)]]
+
+def test_concurrent_lookups_send_one_request(slow_server):
+    api = make_api(slow_server)
+    results = concurrently(16, lambda: api.get_object_json('person', 'BENCH1-TEST'))
+    assert slow_server.request_count() == 1
+    assert all(result == results[0] for result in results)
+    # finished calls are not remembered
+    api.get_object_json('person', 'BENCH1-TEST')
+    assert slow_server.request_count() == 2
+    api.close()
+
+def test_concurrent_gets_share_one_instance(slow_server):
+    api = make_api(slow_server)
+    objects = concurrently(8, lambda: api.person.get('BENCH1-TEST'))
+    assert slow_server.request_count() == 1
+    assert all(obj is objects[0] for obj in objects)
+    api.close()
+
+def test_without_coalescing_every_lookup_is_sent(slow_server):
+    api = make_api(slow_server, coalesce = False)
+    concurrently(4, lambda: api.get_object_json('person', 'BENCH1-TEST'))
+    assert slow_server.request_count() == 4
+    api.close()
+
+def test_single_flight_shares_exceptions():
+    flight = SingleFlight()
+    started = threading.Event()
+    def fail():
+        started.set()
+        time.sleep(0.1)
+        raise ValueError('failed')
+    with ThreadPoolExecutor(max_workers = 4) as pool:
+        futures = [pool.submit(flight.do, 'key', fail)]
+        started.wait()
+        futures += [pool.submit(flight.do, 'key', fail) for _ in range(3)]
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+    assert flight.stats() == {'calls': 1, 'shared': 3, 'in_flight': 0}
+
+def test_object_cache_ttl():
+    cache = ObjectCache(ttl = 0.05)
+    obj = cache.put(Obj('person', 'ab1-test'))
+    assert cache.get('person', 'AB1-TEST') is obj
+    assert cache.add(Obj('person', 'AB1-TEST')) is obj
+    time.sleep(0.06)
+    assert cache.get('person', 'AB1-TEST') is None
+    replacement = Obj('person', 'AB1-TEST')
+    assert cache.add(replacement) is replacement
+    assert cache.stats()['size'] == 1
+
+def test_object_cache_lru():
+    cache = ObjectCache(max_size = 2, ttl = None)
+    first, second, third = (cache.put(Obj('person', key)) for key in ('A', 'B', 'C'))
+    assert cache.get('person', 'A') is None
+    assert cache.get('person', 'B') is second
+    cache.put(Obj('person', 'D'))
+    # B was used more recently than C
+    assert cache.get('person', 'C') is None and cache.get('person', 'B') is second
+    assert ObjectCache(max_size = 0).put(first) is first and ObjectCache(max_size = 0).get('person', 'A') is None
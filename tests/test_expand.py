@@ -0,0 +1,63 @@
+from ripedb.expand import ASSetExpander, ExpansionState, IncrementalExpander
+
+
+def add_route(server, prefix, origin):
+    server.store.write([('route', prefix), ('descr', 'New route'), ('origin', origin), ('mnt-by', 'BENCH-MNT'), ('source', 'TEST')])
+
+def test_refresh_finds_new_routes_of_unchanged_origins(server, api):
+    state = ExpansionState()
+    first = api.as_set.get('AS-WIDE').refresh_expansion(state, max_age = 0)
+    assert first.initial and first.prefixes
+    add_route(server, '192.0.2.0/24', first.aut_nums[0])
+    result = api.as_set.get('AS-WIDE').refresh_expansion(state, max_age = 0)
+    assert result.diff['prefixes'] == {'added': ['192.0.2.0/24'], 'removed': []}
+    assert result.has_changes
+
+def test_refresh_without_max_age_reuses_route_searches(server, api):
+    state = ExpansionState()
+    first = IncrementalExpander(api, state, max_age = None).refresh('AS-WIDE')
+    add_route(server, '192.0.2.0/24', first.aut_nums[0])
+    result = IncrementalExpander(api, state, max_age = None).refresh('AS-WIDE')
+    assert result.stats['searches'] == 0
+    assert not result.has_changes
+
+def test_refresh_finds_new_member_of_references(server, api):
+    state = ExpansionState()
+    server.store.write([('as-set', 'AS-REF'), ('descr', 'By reference'), ('mbrs-by-ref', 'ANY'), ('mnt-by', 'BENCH-MNT'), ('last-modified', '2024-01-01T00:00:00Z'), ('source', 'TEST')])
+    assert api.as_set.get('AS-REF').refresh_expansion(state, max_age = 0).aut_nums == []
+    server.store.write([('aut-num', 'AS64500'), ('as-name', 'REF'), ('member-of', 'AS-REF'), ('mnt-by', 'BENCH-MNT'), ('source', 'TEST')])
+    result = api.as_set.get('AS-REF').refresh_expansion(state, max_age = 0)
+    assert result.diff['aut_nums'] == {'added': ['AS64500'], 'removed': []}
+
+def test_unchanged_refresh_sends_no_requests(server, api):
+    state = ExpansionState()
+    first = IncrementalExpander(api, state).refresh('AS-DEEP')
+    assert first.stats['requests'] == server.request_count()
+    requests = server.request_count()
+    result = IncrementalExpander(api, state).refresh('AS-DEEP')
+    assert server.request_count() == requests
+    assert result.stats['requests'] == 0 and not result.has_changes
+    assert result.prefixes == first.prefixes
+
+def test_refresh_matches_expand(server, api):
+    # member-of references count only for as-sets with mbrs-by-ref
+    server.store.write([('as-set', 'AS-REF'), ('descr', 'By reference'), ('members', 'AS-WIDE'), ('mbrs-by-ref', 'ANY'), ('mnt-by', 'BENCH-MNT'), ('source', 'TEST')])
+    server.store.write([('aut-num', 'AS64500'), ('as-name', 'REF'), ('member-of', 'AS-REF'), ('mnt-by', 'BENCH-MNT'), ('source', 'TEST')])
+    server.store.write([('aut-num', 'AS64501'), ('as-name', 'NOREF'), ('member-of', 'AS-WIDE-1'), ('mnt-by', 'BENCH-MNT'), ('source', 'TEST')])
+    expansion = ASSetExpander(api).expand('AS-REF')
+    result = IncrementalExpander(api, ExpansionState()).refresh('AS-REF')
+    assert 'AS64500' in expansion.aut_nums and 'AS64501' not in expansion.aut_nums
+    assert sorted(result.aut_nums) == sorted(expansion.aut_nums)
+    assert sorted(result.as_sets) == sorted(expansion.as_sets)
+    assert result.tree == expansion.tree
+
+def test_resolve_members_with_seen_ids(api):
+    seen_ids = ['AS-DEEP-1']
+    aut_nums = api.as_set.get('AS-DEEP').resolve_members(seen_ids = seen_ids)
+    assert len(aut_nums) == 2
+    assert set(seen_ids) == {'AS-DEEP-1'} | {aut_num.id for aut_num in aut_nums}
+    # members found by an earlier call are skipped
+    seen_ids = set()
+    assert len(api.as_set.get('AS-WIDE').resolve_members(seen_ids = seen_ids)) == 10
+    assert 'AS-WIDE-1' in seen_ids and 'AS-WIDE' not in seen_ids
+    assert api.as_set.get('AS-WIDE-1').resolve_members(seen_ids = seen_ids) == []
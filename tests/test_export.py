@@ -0,0 +1,64 @@
+import csv, io, json
+
+from ripedb.export import ColumnExporter, base_columns, range_columns, to_columns, write_csv, write_jsonl
+
+route = [
+    ('route', '192.0.2.0/24'), ('descr', 'Test route'), ('origin', 'AS64500'),
+    ('mnt-by', 'TEST-MNT'), ('mnt-by', 'OTHER-MNT'), ('source', 'test'),
+]
+aut_num = [('aut-num', 'AS64500'), ('as-name', 'TEST'), ('mnt-by', 'TEST-MNT'), ('source', 'TEST')]
+
+def test_selected_columns():
+    batch = to_columns([route, aut_num], columns = ['origin', 'mnt-by'])
+    assert list(batch.columns) == list(base_columns + range_columns) + ['origin', 'mnt-by']
+    assert batch['type'] == ['route', 'aut-num']
+    assert batch['key'] == ['192.0.2.0/24AS64500', 'AS64500']
+    assert batch['source'] == ['TEST', 'TEST']
+    # origin is single valued, mnt-by may repeat
+    assert batch['origin'] == ['AS64500', None]
+    assert batch['mnt-by'] == [['TEST-MNT', 'OTHER-MNT'], ['TEST-MNT']]
+    assert batch.multiple == {'mnt-by'}
+
+def test_address_ranges():
+    batch = to_columns([route, aut_num], columns = ['origin'])
+    assert batch['version'] == [4, None]
+    assert batch['first'] == [0xc0000200, None]
+    assert batch['last'] == [0xc00002ff, None]
+    assert 'first' not in to_columns([route], columns = ['origin'], ranges = False).columns
+
+def test_every_attribute_without_columns():
+    batch = to_columns([aut_num], ranges = False)
+    assert list(batch.columns) == list(base_columns) + ['aut-num', 'as-name', 'mnt-by']
+    assert list(batch.rows()) == [{
+        'type': 'aut-num', 'key': 'AS64500', 'source': 'TEST', 'aut-num': 'AS64500', 'as-name': 'TEST', 'mnt-by': ['TEST-MNT'],
+    }]
+
+def test_batches():
+    batches = list(ColumnExporter(['origin'], batch_size = 2).batches([route, aut_num, route]))
+    assert [len(batch) for batch in batches] == [2, 1]
+
+def test_json_objects_and_ripe_objects(api):
+    json_objects = list(api.search_json('AS-WIDE', type_filter = 'as-set'))
+    objects = list(api.search('AS-WIDE', type_filter = 'as-set'))
+    from_json = to_columns(json_objects, columns = ['members', 'mnt-by'])
+    assert from_json.columns == to_columns(objects, columns = ['members', 'mnt-by']).columns
+    assert from_json['key'] == ['AS-WIDE']
+    assert from_json['members'][0][:4] == ['AS-WIDE-1', 'AS-WIDE-2', 'AS-WIDE-3', 'AS-WIDE-4']
+
+def test_write_csv():
+    f = io.StringIO()
+    assert write_csv([route, aut_num], f, columns = ['mnt-by'], ranges = False) == 2
+    rows = list(csv.reader(io.StringIO(f.getvalue())))
+    assert rows == [
+        ['type', 'key', 'source', 'mnt-by'],
+        ['route', '192.0.2.0/24AS64500', 'TEST', 'TEST-MNT|OTHER-MNT'],
+        ['aut-num', 'AS64500', 'TEST', 'TEST-MNT'],
+    ]
+
+def test_write_jsonl():
+    f = io.StringIO()
+    assert write_jsonl([route], f, columns = ['origin', 'mnt-by']) == 1
+    assert [json.loads(line) for line in f.getvalue().splitlines()] == [{
+        'type': 'route', 'key': '192.0.2.0/24AS64500', 'source': 'TEST', 'version': 4, 'first': 0xc0000200, 'last': 0xc00002ff,
+        'origin': 'AS64500', 'mnt-by': ['TEST-MNT', 'OTHER-MNT'],
+    }]
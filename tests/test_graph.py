@@ -0,0 +1,44 @@
+from ripedb.graph import ReferenceTraversal, inverse_attributes_of, reference_graph, reference_values
+from ripedb.objects.schema import initial_schemas
+
+inetnum = [
+    ('inetnum', '192.0.2.0 - 192.0.2.255'), ('netname', 'NET'), ('country', 'CZ'),
+    ('admin-c', 'BENCH1-TEST'), ('tech-c', 'BENCH1-TEST'), ('status', 'ASSIGNED PA'),
+    ('mnt-by', 'BENCH-MNT'), ('mnt-routes', 'BENCH-MNT {192.0.2.0/24^+}'), ('source', 'TEST'),
+]
+inetnum_node = ('inetnum', '192.0.2.0 - 192.0.2.255')
+
+def edges(graph):
+    return {(graph.nodes[source], attribute, graph.nodes[target]) for source, attribute, target in graph.edges}
+
+def test_inverse_attributes_are_inverse_keys():
+    schemas = initial_schemas(None)
+    inverse_keys = {name for schema in schemas.values() for name, attr in schema.attributes.items() if 'INVERSE_KEY' in attr.keys}
+    inverse_attributes = inverse_attributes_of(schemas)
+    assert inverse_attributes['aut-num'] == ('origin', 'local-as')
+    assert inverse_attributes['as-set'] == ('member-of',)
+    assert all(set(names) <= inverse_keys for names in inverse_attributes.values())
+
+def test_reference_values():
+    assert reference_values('BENCH-MNT {192.0.2.0/24^+, 198.51.100.0/24} # routes') == ['BENCH-MNT']
+    assert reference_values('as-a, AS-B') == ['AS-A', 'AS-B']
+
+def test_searches_ask_for_inverse_keys_only(api, monkeypatch):
+    searched = []
+    search_json = api.search_json
+    def recording_search_json(query_string, inverse_attribute = None, **kwargs):
+        searched.append(tuple(inverse_attribute))
+        return search_json(query_string, inverse_attribute = inverse_attribute, **kwargs)
+    monkeypatch.setattr(api, 'search_json', recording_search_json)
+    graph = reference_graph(api, ('as-set', 'AS-WIDE'), max_depth = 2)
+    inverse_keys = {name for names in inverse_attributes_of(initial_schemas(None)).values() for name in names}
+    assert searched and all(set(names) <= inverse_keys for names in searched)
+    assert (('as-set', 'AS-WIDE'), 'members', ('as-set', 'AS-WIDE-1')) in edges(graph)
+    assert (('as-set', 'AS-WIDE'), 'mnt-by', ('mntner', 'BENCH-MNT')) in edges(graph)
+
+def test_mnt_routes_edges_resolve(server, api):
+    server.store.load_objects([inetnum])
+    forward = reference_graph(api, inetnum_node, direction = 'forward', max_depth = 1)
+    assert (inetnum_node, 'mnt-routes', ('mntner', 'BENCH-MNT')) in edges(forward)
+    reverse = ReferenceTraversal(api, direction = 'reverse', max_depth = 1).traverse(('mntner', 'BENCH-MNT'))
+    assert (inetnum_node, 'mnt-routes', ('mntner', 'BENCH-MNT')) in edges(reverse)
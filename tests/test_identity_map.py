@@ -0,0 +1,37 @@
+from conftest import make_api
+
+
+def test_identity_map_without_response_cache(server, api):
+    assert api.object_cache_stats()['max_size'] > 0
+    as_set = api.as_set.get('AS-WIDE')
+    gets = server.requests.get('get', 0)
+    phones = [as_set.admin_c[0].phone for _ in range(3)]
+    assert phones == [['+420000000000']] * 3
+    # the person is fetched once, later reads are served by the identity map
+    assert server.requests.get('get', 0) == gets + 1
+
+def test_object_cache_ttl_none_keeps_objects(server):
+    with make_api(server, cache_timeout = 300, cache_name = 'unused', cache_backend = 'memory', object_cache_ttl = None) as api:
+        stats = api.object_cache_stats()
+        assert stats['ttl'] is None and stats['max_size'] > 0
+
+def test_object_cache_ttl_follows_cache_timeout(server):
+    with make_api(server, cache_timeout = 60, cache_name = 'unused', cache_backend = 'memory') as api:
+        assert api.object_cache_stats()['ttl'] == 60
+
+def test_object_cache_disabled(server):
+    with make_api(server, object_cache_size = 0) as api:
+        assert api.person.get('BENCH1-TEST') is not api.person.get('BENCH1-TEST')
+
+def test_get_returns_mapped_instance(api):
+    person = api.person.get('BENCH1-TEST')
+    assert api.person.get('BENCH1-TEST') is person
+    # references handed out earlier resolve to the same instance
+    assert api.mntner.get('BENCH-MNT').admin_c[0] is person
+
+def test_get_refreshes_mapped_instance(server, api):
+    person = api.person.get('BENCH1-TEST')
+    server.store.write([('person', 'Benchmark Person'), ('address', 'Elsewhere'), ('phone', '+420111111111'),
+        ('nic-hdl', 'BENCH1-TEST'), ('mnt-by', 'BENCH-MNT'), ('source', 'TEST')])
+    assert api.person.get('BENCH1-TEST') is person
+    assert person.phone == ['+420111111111']
@@ -0,0 +1,32 @@
+import os, subprocess, sys
+
+import pytest
+
+import ripedb
+
+package_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+def loaded_modules(code):
+    # modules loaded by code in a fresh interpreter
+    output = subprocess.run([sys.executable, '-c', code + '\nimport sys\nprint(" ".join(sys.modules))'],
+        cwd = package_root, capture_output = True, text = True, check = True
+    ).stdout
+    return set(output.split())
+
+def test_import_does_not_load_requests():
+    modules = loaded_modules('import ripedb')
+    assert 'ripedb' in modules
+    for name in ('requests', 'requests_cache', 'asyncio', 'ripedb.rest', 'ripedb.objects'):
+        assert name not in modules
+
+def test_api_class_is_loaded_on_access():
+    modules = loaded_modules('from ripedb import RipeDBApi')
+    assert 'ripedb.rest' in modules
+    assert 'ripedb.aio' not in modules
+
+def test_lazy_attributes():
+    from ripedb.rest import RestApi
+    assert ripedb.RipeDBApi is RestApi
+    assert 'AsyncRipeDBApi' in dir(ripedb)
+    with pytest.raises(AttributeError):
+        ripedb.NoSuchApi
@@ -0,0 +1,40 @@
+import pytest
+
+from conftest import make_api
+
+
+@pytest.fixture
+def cached_api(server):
+    # in-memory response cache, writes must drop what they change
+    api = make_api(server, cache_timeout = 3600, cache_backend = 'memory', mntner = 'BENCH-MNT', password = 'bench')
+    yield api
+    api.close()
+
+def search(api):
+    return api.search_json('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'person')
+
+def test_update_invalidates_lookups_and_searches(server, cached_api):
+    person = cached_api.person.get('BENCH1-TEST')
+    search(cached_api)
+    requests = server.request_count()
+    cached_api.person.get('BENCH1-TEST')
+    search(cached_api)
+    assert server.request_count() == requests
+
+    person.update({'address': 'Somewhere else'})
+    requests = server.request_count()
+    assert cached_api.get_object_json('person', 'BENCH1-TEST') is not None
+    assert server.request_count() == requests + 1
+    addresses = [attr['value'] for json_data in search(cached_api) for attr in json_data['attributes']['attribute'] if attr['name'] == 'address']
+    assert server.request_count() == requests + 2
+    assert 'Somewhere else' in addresses
+
+def test_delete_invalidates_lookups_and_the_identity_map(server, cached_api):
+    cached_api.person.create('JD1-TEST', {'person': 'John Doe', 'address': 'Prague', 'phone': '+420000000000', 'nic-hdl': 'JD1-TEST'})
+    person = cached_api.person.get('JD1-TEST')
+    assert cached_api._objects.get('person', 'JD1-TEST') is person
+    search(cached_api)
+    person.delete()
+    assert cached_api._objects.get('person', 'JD1-TEST') is None
+    assert cached_api.get_object_json('person', 'JD1-TEST') is None
+    assert 'JD1-TEST' not in [json_data['primary-key']['attribute'][0]['value'] for json_data in search(cached_api)]
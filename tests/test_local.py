@@ -0,0 +1,33 @@
+from ripedb.local import LocalRipeDBApi
+from ripedb.rpsl import format_rpsl
+
+fixtures = [
+    [('mntner', 'TEST-MNT'), ('upd-to', 'test@example.com'), ('auth', 'MD5-PW $1$test'), ('mnt-by', 'TEST-MNT'), ('source', 'TEST')],
+    [('as-set', 'AS-A'), ('mbrs-by-ref', 'ANY'), ('mnt-by', 'TEST-MNT'), ('source', 'TEST')],
+    [('as-set', 'AS-B'), ('mbrs-by-ref', 'TEST-MNT, OTHER-MNT'), ('mnt-by', 'TEST-MNT'), ('source', 'TEST')],
+    [('aut-num', 'AS1'), ('as-name', 'ONE'), ('member-of', 'AS-A, AS-B'), ('mnt-by', 'TEST-MNT'), ('source', 'TEST')],
+]
+
+def local_api():
+    api = LocalRipeDBApi(':memory:', source = 'TEST')
+    api.load_dump('\n\n'.join(format_rpsl(attributes) for attributes in fixtures).splitlines(True))
+    return api
+
+def test_list_attributes_are_indexed_per_item():
+    api = local_api()
+    for as_set in ('AS-A', 'AS-B'):
+        results = api.search_json(as_set, inverse_attribute = 'member-of')
+        assert [json_data['primary-key']['attribute'][0]['value'] for json_data in results] == ['AS1']
+    assert len(api.search_json('OTHER-MNT', inverse_attribute = 'mbrs-by-ref')) == 1
+
+def test_list_attributes_link_every_item():
+    api = local_api()
+    json_data = api.get_object_json('aut-num', 'AS1')
+    member_of = [attr for attr in json_data['attributes']['attribute'] if attr['name'] == 'member-of']
+    assert [attr['value'] for attr in member_of] == ['AS-A', 'AS-B']
+    assert all(attr['referenced-type'] == 'as-set' and attr['link']['href'].endswith(attr['value']) for attr in member_of)
+    assert [as_set.id for as_set in api.aut_num.get('AS1').member_of] == ['AS-A', 'AS-B']
+
+def test_expansion_through_second_list_item():
+    api = local_api()
+    assert list(api.as_set.get('AS-B').expand().aut_nums) == ['AS1']
@@ -0,0 +1,58 @@
+import pytest
+
+from ripedb.multi import MultiSourceApi
+from conftest import make_api
+from server import create_server
+
+@pytest.fixture
+def servers():
+    # both hold the mntner and the person, AS-DEEP only exists in the first, AS-WIDE in the second
+    with create_server(graphs = {'AS-DEEP': (1, 1)}) as first, create_server(graphs = {'AS-WIDE': (1, 2)}, latency = 0.1) as second:
+        yield first, second
+
+@pytest.fixture
+def multi(servers):
+    first, second = servers
+    apis = {'FIRST': make_api(first), 'SECOND': make_api(second)}
+    with MultiSourceApi(apis) as multi:
+        yield multi
+    for api in apis.values():
+        api.close()
+
+def test_search_merges_sources(multi):
+    result = multi.search_json('BENCH-MNT', type_filter = 'mntner')
+    assert result.complete
+    assert len(result) == 1
+    assert result[0].source == 'FIRST'
+    assert result[0].sources == ['FIRST', 'SECOND']
+    assert len(multi.search_json('BENCH-MNT', type_filter = 'mntner', dedup = False)) == 2
+
+def test_search_keeps_duplicates_from_the_first_source_in_order(multi):
+    result = multi.search_json('BENCH-MNT', type_filter = 'mntner', sources = ['second', 'first'])
+    assert result[0].source == 'SECOND'
+    assert result[0].sources == ['SECOND', 'FIRST']
+
+def test_search_collects_objects_of_every_source(multi):
+    result = multi.search('BENCH1-TEST', type_filter = 'as-set', inverse_attribute = 'admin-c')
+    keys = {(item.object._key, item.source) for item in result}
+    assert ('AS-DEEP', 'FIRST') in keys
+    assert ('AS-WIDE', 'SECOND') in keys
+    # objects are bound to the API of their source
+    assert all(item.object._api is multi.api(item.source) for item in result)
+
+def test_get_returns_the_first_source_with_the_object(multi, servers):
+    assert multi.get('as-set', 'AS-DEEP').first._key == 'AS-DEEP'
+    result = multi.get('as-set', 'AS-WIDE')
+    assert [item.source for item in result] == ['SECOND']
+    assert multi.get('as-set', 'AS-NONE').first is None
+
+def test_slow_source_times_out(multi):
+    result = multi.search_json('BENCH-MNT', type_filter = 'mntner', timeout = {'SECOND': 0.01})
+    assert not result.complete
+    assert result.timed_out == ['SECOND']
+    assert [item.source for item in result] == ['FIRST']
+    assert 'FIRST' in result.elapsed
+
+def test_unknown_mode(multi):
+    with pytest.raises(ValueError):
+        multi.search_json('BENCH-MNT', mode = 'any')
@@ -0,0 +1,105 @@
+import pytest
+
+from ripedb.local import LocalRipeDBApi
+from ripedb.nrtm import Nrtm3Client, Nrtm4Client, NrtmError, NrtmMirror, iter_nrtm3
+from ripedb.rpsl import format_rpsl
+from nrtm_server import NrtmJournal, MockNrtmServer
+
+
+def maintainer(name):
+    return [('mntner', name), ('upd-to', 'test@example.com'), ('auth', 'MD5-PW $1$test'), ('mnt-by', name), ('source', 'TEST')]
+
+class FailingStore(LocalRipeDBApi):
+    # fails the batch number fail_at (counted from 1) like a crash in the middle of a sync
+    fail_at = None
+
+    def __init__(self):
+        super().__init__(':memory:', source = 'TEST')
+        self.batches = 0
+
+    def apply_changes(self, changes, meta = None):
+        self.batches += 1
+        if self.batches == self.fail_at:
+            raise OSError('Simulated crash')
+        return super().apply_changes(changes, meta)
+
+@pytest.fixture
+def journal():
+    journal = NrtmJournal('TEST')
+    journal.load([maintainer('BASE-MNT')])
+    return journal
+
+@pytest.fixture
+def nrtm_server(journal):
+    with MockNrtmServer(journal) as server:
+        yield server
+
+@pytest.mark.parametrize('version', [3, 4])
+def test_resume_after_failure_inside_delta(journal, nrtm_server, version):
+    store = FailingStore()
+    client = Nrtm4Client(nrtm_server.notification_url, source = 'TEST') if version == 4 else Nrtm3Client(nrtm_server.host, nrtm_server.port, source = 'TEST')
+    mirror = NrtmMirror(store, client, batch_size = 2)
+    if version == 3:
+        mirror.load_dump(format_rpsl(maintainer('BASE-MNT')).splitlines(True), 1)
+    mirror.sync()
+    start = mirror.serial
+    for i in range(5):
+        journal.add(maintainer(f'M{i}-MNT'))
+    journal.publish()
+    # the second batch of the delta fails
+    store.batches = 0
+    store.fail_at = 2
+    with pytest.raises(OSError):
+        mirror.sync()
+    if version == 4:
+        # the delta is not complete, its version must not be stored
+        assert mirror.serial == start
+    store.fail_at = None
+    mirror.sync()
+    for i in range(5):
+        assert store.get_object_json('mntner', f'M{i}-MNT') is not None
+    assert mirror.serial == (start + 1 if version == 4 else start + 5)
+
+def test_delta_larger_than_batch_applied_in_full(journal, nrtm_server):
+    store = FailingStore()
+    mirror = NrtmMirror(store, Nrtm4Client(nrtm_server.notification_url, source = 'TEST'), batch_size = 2)
+    mirror.sync()
+    for i in range(5):
+        journal.add(maintainer(f'M{i}-MNT'))
+    journal.delete(maintainer('M0-MNT'))
+    journal.publish()
+    assert mirror.sync() == 6
+    assert mirror.serial == 2
+    assert store.get_object_json('mntner', 'M0-MNT') is None
+    assert store.get_object_json('mntner', 'M4-MNT') is not None
+
+def test_truncated_nrtm3_stream():
+    lines = ['%START Version: 3 TEST 10-11', '', 'ADD 10', ''] + format_rpsl(maintainer('A-MNT')).splitlines() + ['', 'ADD 11', '', 'mntner: B-MNT']
+    changes = iter_nrtm3(line + '\n' for line in lines)
+    assert next(changes).serial == 10
+    with pytest.raises(NrtmError):
+        next(changes)
+
+def test_truncated_nrtm3_stream_keeps_the_serial(journal):
+    class TruncatedClient(Nrtm3Client):
+        # the connection drops in the middle of the last object
+        def _query(self, query):
+            lines = list(super()._query(query))
+            if query.startswith('-g'):
+                lines = lines[:-4]
+            return lines
+    with MockNrtmServer(journal) as server:
+        store = LocalRipeDBApi(':memory:', source = 'TEST')
+        mirror = NrtmMirror(store, TruncatedClient(server.host, server.port, source = 'TEST'), batch_size = 1)
+        mirror.load_dump(format_rpsl(maintainer('BASE-MNT')).splitlines(True), 1)
+        journal.add(maintainer('A-MNT'))
+        journal.add(maintainer('B-MNT'))
+        journal.publish()
+        with pytest.raises(NrtmError):
+            mirror.sync()
+        assert mirror.serial < 3
+        assert store.get_object_json('mntner', 'B-MNT') is None
+        mirror.client = Nrtm3Client(server.host, server.port, source = 'TEST')
+        mirror.sync()
+        assert mirror.serial == 3
+        assert store.get_object_json('mntner', 'B-MNT')['attributes']['attribute'][-1]['value'] == 'TEST'
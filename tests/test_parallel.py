@@ -0,0 +1,53 @@
+import pickle
+from functools import partial
+
+import pytest
+
+from ripedb import RipeDBApi
+from ripedb.parallel import ProcessPool, parallel_map
+
+# worker functions are pickled by reference, so they live at module level
+def same(obj):
+    return obj
+
+def described(obj):
+    return (obj._type, obj._key, obj._api.__class__.__name__, len(obj.snapshot().attributes))
+
+def test_snapshot_pickles(api):
+    obj = api.as_set.get('AS-DEEP')
+    snapshot = pickle.loads(pickle.dumps(obj.snapshot()))
+    assert snapshot == obj.snapshot()
+    assert snapshot.bind(api) is obj
+
+def test_objects_round_trip_through_workers(api):
+    objects = list(api.search('AS-WIDE', type_filter = 'as-set'))
+    with ProcessPool(api, processes = 2, chunk_size = 2) as pool:
+        results = list(pool.map(same, objects))
+    assert [obj.snapshot() for obj in results] == [obj.snapshot() for obj in objects]
+    # bound to api again, so the identity map hands out the same instances
+    assert all(result is obj for result, obj in zip(results, objects))
+
+def test_workers_bind_objects_to_their_api(api):
+    objects = list(api.search('AS-WIDE', type_filter = 'as-set'))
+    results = sorted(parallel_map(described, objects, processes = 2, chunk_size = 1, ordered = False))
+    assert results == sorted((obj._type, obj._key, 'LocalRipeDBApi', len(obj.snapshot().attributes)) for obj in objects)
+
+def test_json_objects_are_bound_in_workers(api):
+    json_objects = list(api.search_json('AS-DEEP', type_filter = 'as-set'))
+    with ProcessPool(processes = 1) as pool:
+        results = list(pool.map(same, json_objects))
+    assert [(obj.type, obj.key) for obj in results] == [(json_data['type'], json_data['primary-key']['attribute'][0]['value']) for json_data in json_objects]
+
+def test_resolve_fetches_in_workers(server, api):
+    factory = partial(RipeDBApi, base_url = server.url, source = 'TEST', schema_cache = None, rate_limit = None, cache_timeout = None)
+    keys = [('as-set', 'AS-DEEP'), ('person', 'BENCH1-TEST'), ('as-set', 'AS-NONE')]
+    with ProcessPool(api, api_factory = factory, processes = 2, chunk_size = 1) as pool:
+        results = list(pool.resolve(keys))
+    assert [(obj._type, obj._key) for obj in results[:2]] == keys[:2]
+    assert results[2] is None
+    assert results[0] is api.as_set.get('AS-DEEP')
+
+def test_resolve_needs_api_factory(api):
+    with ProcessPool(api, processes = 1) as pool:
+        with pytest.raises(ValueError):
+            pool.resolve([('as-set', 'AS-DEEP')])
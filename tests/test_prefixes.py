@@ -0,0 +1,55 @@
+import json
+
+from ripedb.prefixes import build_prefix_list, format_prefix_list, parse_prefix
+
+
+def entries(*prefixes, **kwargs):
+    prefix_list = build_prefix_list((parse_prefix(prefix) for prefix in prefixes), **kwargs)
+    return [str(entry) for version in sorted(prefix_list) for entry in prefix_list[version]]
+
+def test_single_prefix_is_exact():
+    assert entries('10.0.0.0/24') == ['10.0.0.0/24']
+
+def test_adjacent_prefixes_do_not_accept_the_aggregate():
+    assert entries('10.0.0.0/24', '10.0.1.0/24') == ['10.0.0.0/23 ge 24 le 24']
+
+def test_adjacent_prefixes_of_different_lengths():
+    assert entries('10.0.0.0/24', '10.0.1.0/25') == ['10.0.0.0/24', '10.0.1.0/25']
+    assert entries('10.0.0.0/25', '10.0.0.128/25', '10.0.1.0/24') == ['10.0.0.0/24 ge 25 le 25', '10.0.1.0/24']
+
+def test_partly_filled_aggregate_is_split():
+    assert entries('10.0.0.0/24', '10.0.1.0/24', '10.0.2.0/24') == ['10.0.0.0/23 ge 24 le 24', '10.0.2.0/24']
+
+def test_covering_prefix_does_not_accept_unregistered_more_specifics():
+    assert entries('10.0.0.0/16', '10.0.5.0/24') == ['10.0.0.0/16', '10.0.5.0/24']
+
+def test_or_longer_keeps_the_lower_bound():
+    assert entries('10.0.0.0/24', '10.0.1.0/24', or_longer = True, max_length = 26) == ['10.0.0.0/23 ge 24 le 26']
+
+def test_or_longer_drops_covered_prefixes():
+    assert entries('10.0.0.0/16', '10.0.5.0/24', or_longer = True, max_length = 24) == ['10.0.0.0/16 le 24']
+    assert entries('10.0.0.0/23', '10.0.1.0/24', '10.0.2.0/24', '10.0.3.0/24', or_longer = True, max_length = 24) == [
+        '10.0.0.0/23 le 24', '10.0.2.0/23 ge 24 le 24'
+    ]
+
+def test_entries_accept_exactly_the_registered_prefixes():
+    registered = ['10.0.0.0/16', '10.0.5.0/24', '10.0.6.0/24', '10.0.7.0/25', '10.0.7.128/25', '10.1.0.0/24']
+    prefix_list = build_prefix_list(parse_prefix(prefix) for prefix in registered)
+    accepted = set()
+    for entry in prefix_list[4]:
+        for length in range(entry.greater_equal or entry.length, entry.max_length + 1):
+            accepted.update((first, length) for first in range(entry.first, entry.last + 1, 1 << (32 - length)))
+    assert accepted == {parse_prefix(prefix)[1:] for prefix in registered}
+
+def test_without_aggregation():
+    assert entries('10.0.0.0/24', '10.0.1.0/24', aggregate = False) == ['10.0.0.0/24', '10.0.1.0/24']
+
+def test_ipv6():
+    assert entries('2001:db8::/48', '2001:db8:1::/48') == ['2001:db8::/47 ge 48 le 48']
+
+def test_json_format():
+    prefix_list = build_prefix_list(parse_prefix(prefix) for prefix in ('10.0.0.0/24', '10.0.1.0/24', '192.0.2.0/24'))
+    assert json.loads(format_prefix_list(prefix_list, 'json'))['ipv4'] == [
+        {'prefix': '10.0.0.0/23', 'exact': False, 'greater-equal': 24, 'less-equal': 24},
+        {'prefix': '192.0.2.0/24', 'exact': True, 'less-equal': 24},
+    ]
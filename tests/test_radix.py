@@ -0,0 +1,40 @@
+import gc
+
+import pytest
+
+from ripedb.radix import PrefixIndex, record_from_attributes
+
+
+def index_of(*objects):
+    index = PrefixIndex()
+    for object_type, key in objects:
+        index.add(record_from_attributes(object_type, key, [(object_type, key)]))
+    return index
+
+def keys(records):
+    return sorted(record.key for record in records)
+
+def test_more_specifics_lie_inside_the_prefix():
+    index = index_of(
+        ('inetnum', '10.0.0.0 - 10.0.1.255'),
+        ('inetnum', '10.0.1.0 - 10.0.2.255'),
+        ('inetnum', '10.0.0.128 - 10.0.0.255'),
+        ('route', '10.0.0.0/22'),
+    )
+    assert keys(index.more_specifics('10.0.0.0/23')) == ['10.0.0.128 - 10.0.0.255']
+    assert keys(index.more_specifics('10.0.0.0/23', exact = True)) == ['10.0.0.0 - 10.0.1.255', '10.0.0.128 - 10.0.0.255']
+    assert keys(index.more_specifics('10.0.0.0/22')) == ['10.0.0.0 - 10.0.1.255', '10.0.0.128 - 10.0.0.255', '10.0.1.0 - 10.0.2.255']
+
+def test_covering():
+    index = index_of(('route', '10.0.0.0/16'), ('route', '10.0.0.0/24'), ('route', '10.1.0.0/24'))
+    assert keys(index.covering('10.0.0.0/24')) == ['10.0.0.0/16', '10.0.0.0/24']
+
+@pytest.mark.filterwarnings('error::ResourceWarning', 'error::pytest.PytestUnraisableExceptionWarning')
+def test_save_and_load(tmp_path):
+    index = index_of(('inetnum', '10.0.1.0 - 10.0.2.255'), ('route6', '2001:db8::/32'))
+    path = str(tmp_path / 'index.json.gz')
+    index.save(path)
+    # an unclosed file warns when it is collected
+    gc.collect()
+    loaded = PrefixIndex.load(path)
+    assert sorted(loaded.records()) == sorted(index.records())
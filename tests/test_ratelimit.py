@@ -0,0 +1,148 @@
+import json, threading, time
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from ripedb import RipeDBApi
+from ripedb.ratelimit import RateLimiter, RateLimitError, TokenBucket, parse_retry_after
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    now = time.time()
+    assert parse_retry_after(formatdate(now + 10, usegmt = True), now) == pytest.approx(10, abs = 1)
+    assert parse_retry_after(formatdate(now - 10, usegmt = True), now) == 0.0
+
+def test_token_bucket():
+    bucket = TokenBucket(10, burst = 2)
+    assert bucket.take() == 0 and bucket.take() == 0
+    assert 0 < bucket.take() <= 0.1
+
+def test_concurrency_grows_with_fast_answers():
+    limiter = RateLimiter(read_rate = None, max_concurrency = 8, initial_concurrency = 2)
+    # one more request in flight per limit of fast answers
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(False, 0.01, 200)
+    assert limiter.concurrency == 3
+    for _ in range(100):
+        limiter.acquire()
+        limiter.release(False, 0.01, 200)
+    assert limiter.concurrency == 8
+
+def test_concurrency_halves_on_throttling_errors_and_latency():
+    limiter = RateLimiter(read_rate = None, max_concurrency = 8, min_concurrency = 2)
+    limiter.acquire()
+    limiter.release(False, 0.0, 429)
+    assert limiter.concurrency == 4
+    # a request started before the decrease saw the old limit
+    limiter.acquire()
+    limiter.release(False, 10.0, None)
+    assert limiter.concurrency == 4
+    time.sleep(0.01)
+    limiter.acquire()
+    limiter.release(False, 0.001, 503)
+    assert limiter.concurrency == 2
+    time.sleep(0.01)
+    limiter.acquire()
+    limiter.release(False, 0.001, 500)
+    assert limiter.concurrency == 2
+
+    limiter = RateLimiter(read_rate = None, max_concurrency = 8)
+    limiter.acquire()
+    limiter.release(False, 0.01, 200)
+    limiter.acquire()
+    limiter.release(False, 0.5, 200)
+    assert limiter.concurrency == 4
+
+def test_requests_wait_for_a_free_slot():
+    limiter = RateLimiter(read_rate = None, max_concurrency = 1)
+    limiter.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(target = lambda: (limiter.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.05)
+    limiter.release(False, 0.01, 200)
+    assert acquired.wait(1)
+    thread.join()
+
+def test_throttle_pauses_every_caller():
+    limiter = RateLimiter(read_rate = None, backoff_factor = 0.01)
+    assert 0.2 <= limiter.throttle(0, '0.2') <= 0.21
+    assert limiter.stats()['throttled'] == 1
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.15
+    limiter.release(False, 0.01, 200)
+
+def test_backoff_is_exponential_with_jitter():
+    limiter = RateLimiter(backoff_factor = 1, max_backoff = 8)
+    for attempt, delay in ((0, 1), (2, 4), (10, 8)):
+        assert delay / 2 <= limiter.backoff(attempt) <= delay
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    # answers the first throttled requests with 429 and Retry-After, then a mntner
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        if server.requests <= server.throttled:
+            self.send_response(429)
+            self.send_header('Retry-After', '0.1')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps({'objects': {'object': [{'type': 'mntner', 'attributes': {'attribute': [
+            {'name': 'mntner', 'value': 'TEST-MNT'}, {'name': 'source', 'value': 'TEST'},
+        ]}, 'primary-key': {'attribute': [{'name': 'mntner', 'value': 'TEST-MNT'}]}}]}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def throttling_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ThrottlingHandler)
+    server.requests = 0
+    server.throttled = 0
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def throttled_api(server, limiter):
+    return RipeDBApi(base_url = f'http://127.0.0.1:{server.server_port}', source = 'TEST',
+        cache_timeout = None, schema_cache = None, rate_limit = limiter)
+
+def test_retry_after_is_respected(throttling_server):
+    throttling_server.throttled = 2
+    limiter = RateLimiter(retries = 3, backoff_factor = 0.01)
+    api = throttled_api(throttling_server, limiter)
+    started = time.monotonic()
+    assert api.get_object_json('mntner', 'TEST-MNT')['type'] == 'mntner'
+    assert time.monotonic() - started >= 0.2
+    assert throttling_server.requests == 3
+    assert limiter.stats()['throttled'] == 2
+    api.close()
+
+def test_persistent_throttling_raises(throttling_server):
+    throttling_server.throttled = 100
+    api = throttled_api(throttling_server, RateLimiter(retries = 1, backoff_factor = 0.01))
+    with pytest.raises(RateLimitError) as error:
+        api.get_object_json('mntner', 'TEST-MNT')
+    assert error.value.retry_after == 0.1
+    assert throttling_server.requests == 2
+    api.close()
+
+def test_rate_limiting_is_opt_in():
+    api = RipeDBApi(cache_timeout = None, schema_cache = None)
+    assert api._rate_limiter is None
+    assert isinstance(RipeDBApi(cache_timeout = None, schema_cache = None, rate_limit = True)._rate_limiter, RateLimiter)
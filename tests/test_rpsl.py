@@ -0,0 +1,46 @@
+import gzip, io
+
+from ripedb.objects import primary_key
+from ripedb.rpsl import iter_rpsl_objects, iter_rpsl_json, format_rpsl
+
+dump = b'''% This is a dump
+
+route:          10.0.0.0/24 # registered
+descr:          first line
+                continued
+origin:         AS1
+source:         TEST
+
+
+person:         Ji\xc5\x99\xc3\xad
+nic-hdl:        JD1-TEST
+source:         TEST
+'''
+
+expected = [
+    [('route', '10.0.0.0/24', 'registered'), ('descr', 'first line continued', None), ('origin', 'AS1', None), ('source', 'TEST', None)],
+    [('person', 'Jiří', None), ('nic-hdl', 'JD1-TEST', None), ('source', 'TEST', None)],
+]
+
+def test_parse_bytes_text_and_lines():
+    assert list(iter_rpsl_objects(dump)) == expected
+    assert list(iter_rpsl_objects(dump.decode())) == expected
+    assert list(iter_rpsl_objects(dump.decode().splitlines(True))) == expected
+
+def test_parse_streams():
+    assert list(iter_rpsl_objects(io.BytesIO(dump))) == expected
+    assert list(iter_rpsl_objects(io.BufferedReader(io.BytesIO(gzip.compress(dump))))) == expected
+    assert list(iter_rpsl_objects(gzip.compress(dump))) == expected
+
+def test_format_round_trip():
+    text = '\n\n'.join(format_rpsl(attributes) for attributes in expected)
+    assert list(iter_rpsl_objects(text)) == expected
+
+def test_json_primary_keys_follow_the_schemas():
+    routes = b'route: 192.0.2.0/24\norigin: AS1\nsource: TEST\n\nroute: 192.0.2.0/24\norigin: AS2\nsource: TEST\n'
+    keys = [json_data['primary-key']['attribute'] for json_data in iter_rpsl_json(routes)]
+    assert keys == [
+        [{'name': 'route', 'value': '192.0.2.0/24'}, {'name': 'origin', 'value': 'AS1'}],
+        [{'name': 'route', 'value': '192.0.2.0/24'}, {'name': 'origin', 'value': 'AS2'}],
+    ]
+    assert [primary_key(json_data) for json_data in iter_rpsl_json(routes)] == ['192.0.2.0/24AS1', '192.0.2.0/24AS2']
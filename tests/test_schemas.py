@@ -0,0 +1,55 @@
+import json
+
+from ripedb import RipeDBApi
+from ripedb.objects.schema import load_schemas
+
+
+def api_for(server, **kwargs):
+    # without the bundled snapshot every schema comes from the server or the schema cache
+    kwargs.setdefault('cache_timeout', None)
+    return RipeDBApi(base_url = server.url, source = 'TEST', bundled_schemas = False, **kwargs)
+
+def test_no_schema_cache_is_written_by_default(server, tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    monkeypatch.setenv('HOME', str(tmp_path))
+    api = api_for(server)
+    assert api.person.get('BENCH1-TEST').nic_hdl == 'BENCH1-TEST'
+    assert server.requests['template'] == 1
+    assert list(tmp_path.iterdir()) == []
+    api.close()
+
+def test_persisted_schemas_are_loaded(server, tmp_path):
+    path = str(tmp_path / 'schemas.json')
+    api = api_for(server, schema_cache = path)
+    api.person.get('BENCH1-TEST')
+    api.close()
+    assert 'person' in load_schemas(path)
+    api = api_for(server, schema_cache = path)
+    person = api.person.get('BENCH1-TEST')
+    assert server.requests['template'] == 1
+    assert api.get_schema('person') is person._schema
+    assert api.get_schema('person').primary_key == ('nic-hdl',)
+    api.close()
+
+def test_refresh_bypasses_the_response_cache(server, tmp_path):
+    path = str(tmp_path / 'schemas.json')
+    api = api_for(server, schema_cache = path, cache_timeout = 3600, cache_backend = 'memory')
+    api.get_schema('person')
+    with open(path) as f:
+        data = json.load(f)
+    data['schemas']['person'] = [attr for attr in data['schemas']['person'] if attr[0] != 'remarks']
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    api.close()
+
+    api = api_for(server, schema_cache = path, cache_timeout = 3600, cache_backend = 'memory')
+    assert 'remarks' not in api.get_schema('person')
+    api.get_template('person')
+    requests = server.requests['template']
+    # cached template responses are not used, the fresh ones are stored in the cache and the file
+    assert 'remarks' in api.refresh_schemas(['person'])['person']
+    assert server.requests['template'] == requests + 1
+    assert 'remarks' in load_schemas(path)['person']
+    api._get_template('person')
+    assert server.requests['template'] == requests + 1
+    api.close()
@@ -0,0 +1,54 @@
+from ripedb.multi import MultiSourceApi
+
+
+def test_trimmed_search_results_are_projected(api):
+    aut_nums = api.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'aut-num', flags = 'primary-keys', iterator = False)
+    assert aut_nums
+    aut_num = aut_nums[0]
+    assert aut_num._projection == frozenset(['aut-num'])
+    assert api._objects.get('aut-num', aut_num.id) is None
+    # attributes outside the projection load the whole object
+    assert aut_num.as_name == f'BENCH-{aut_num.id}'
+    assert aut_num._projection is None
+
+def test_trimmed_search_does_not_leak_into_links(api):
+    api.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'aut-num', flags = ['no-referenced', 'primary-keys'], iterator = False)
+    as_set = api.as_set.get('AS-WIDE')
+    aut_nums = [member for member in as_set.members if member.type == 'aut-num']
+    assert aut_nums
+    for aut_num in aut_nums:
+        assert aut_num.as_name == f'BENCH-{aut_num.id}'
+    for aut_num in as_set.resolve_members():
+        assert aut_num.as_name == f'BENCH-{aut_num.id}'
+
+def test_trimmed_search_keeps_mapped_object_whole(api):
+    whole = api.aut_num.get('AS4200000000')
+    results = api.search('AS4200000000', type_filter = 'aut-num', flags = 'primary-keys', iterator = False)
+    assert results == [whole]
+    assert whole.as_name == 'BENCH-AS4200000000'
+    assert 'as-name' in whole.get_attributes()
+
+def test_trimmed_local_search(server):
+    store = server.store
+    results = store.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'aut-num', flags = 'primary-keys', iterator = False)
+    assert results and all(obj._projection is not None for obj in results)
+    assert store._objects.get('aut-num', results[0].id) is None
+
+def test_trimmed_multi_source_search(api):
+    with MultiSourceApi([api]) as multi:
+        result = multi.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'aut-num', flags = 'primary-keys')
+    aut_num = result.first
+    assert aut_num._projection is not None
+    assert api._objects.get('aut-num', aut_num.id) is None
+    assert aut_num.as_name == f'BENCH-{aut_num.id}'
+
+def test_trimmed_async_search(server):
+    import asyncio
+    from ripedb import AsyncRipeDBApi
+    async def run():
+        async with AsyncRipeDBApi(base_url = server.url, source = 'TEST', schema_cache = None, rate_limit = None) as api:
+            results = [obj async for obj in api.search('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'aut-num', flags = 'primary-keys')]
+            assert results and results[0]._projection is not None
+            assert api._objects.get('aut-num', results[0].id) is None
+            assert await results[0].as_name == f'BENCH-{results[0].id}'
+    asyncio.run(run())
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from ripedb.stream import JsonArrayParser, iter_json_array
+
+
+def response(objects):
+    return json.dumps({'objects': {'object': objects}, 'terms-and-conditions': {'href': 'x'}}).encode()
+
+objects = [{'type': 'person', 'value': 'Jiří'}, {'type': 'route', 'nested': [1, [2, {'a': ']'}]]}, {'type': 'mntner'}]
+
+@pytest.mark.parametrize('size', [1, 3, 7, 1 << 16])
+def test_items_split_across_chunks(size):
+    data = response(objects)
+    chunks = [data[i:i + size] for i in range(0, len(data), size)]
+    assert list(iter_json_array(chunks)) == objects
+
+def test_items_are_returned_as_soon_as_complete():
+    data = response(objects)
+    parser = JsonArrayParser()
+    first_end = data.index(b'}, {') + 1
+    assert parser.feed(data[:first_end]) == [objects[0]]
+    assert parser.feed(data[first_end:]) == objects[1:]
+    assert parser.finished
+
+def test_empty_and_missing_lists():
+    assert list(iter_json_array([response([])])) == []
+    assert list(iter_json_array([b'{"errormessages": {}}'])) == []
+
+def test_truncated_response():
+    data = response(objects)
+    with pytest.raises(ValueError):
+        list(iter_json_array([data[:len(data) // 2]]))
+
+def test_streamed_search_matches_buffered(api):
+    buffered = api.search_json('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'aut-num')
+    assert list(api.search_json('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'aut-num', stream = True)) == buffered
+    assert list(api.search_json('BENCH-MNT', inverse_attribute = 'mnt-by', type_filter = 'aut-num', stream = True, limit = 2)) == buffered[:2]